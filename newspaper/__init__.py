@@ -15,7 +15,7 @@ else:
 del os
 
 from .api import (build, build_article, fulltext, hot, languages,
-                  popular_urls, Configuration as Config)
+                  popular_urls, read_warc, Configuration as Config)
 from .article import Article, ArticleException
 from .mthreading import NewsPool
 from .source import Source
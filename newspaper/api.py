@@ -68,9 +68,38 @@ def hot():
         return None
 
 
+def read_warc(path, config=None, **kwargs):
+    """Yields an `Article` for every html page archived in the WARC file
+    `path`, or in the WARC files of the directory `path`. Articles are
+    downloaded from the archived body, parse them as usual. With
+    `http_success_only` non 2XX responses are skipped.
+    """
+    from .network import get_http_charset
+    from .warc import iter_records
+
+    config = config or Configuration()
+    config = extend_config(config, kwargs)
+    for record in iter_records(path):
+        if record.type != 'response':
+            continue
+        response = record.http_response()
+        if response is None or not response.content:
+            continue
+        if config.http_success_only and \
+                not 200 <= response.status_code <= 299:
+            continue
+        if 'html' not in response.headers.get('content-type', 'html'):
+            continue
+        article = Article(record.url, config=config)
+        # the charset a live download would trust, not ISO-8859-1
+        article.download(input_html=response.content,
+                         http_charset=get_http_charset(response))
+        yield article
+
+
 def fulltext(html, language='en'):
     """Takes article HTML string input and outputs the fulltext
-    Input string is decoded via UnicodeDammit if needed
+    Input bytes are decoded via charsets.decode_html if needed
     """
     from .cleaners import DocumentCleaner
     from .configuration import Configuration
@@ -10,11 +10,10 @@ import os
 import glob
 from bs4 import BeautifulSoup
 
-from langdetect import detect as langdetect, lang_detect_exception
-
 import requests
 
 from . import images
+from . import langdetection
 from . import network
 from . import nlp
 from . import settings
@@ -41,9 +40,80 @@ class ArticleException(Exception):
     pass
 
 
+# The steps of `Article.parse` in the order it runs them, one per field of
+# the page read from the whole document, then the images of the document
+# and the body, which the document is cleaned for
+EXTRACTION_STEPS = (
+    'title', 'authors', 'meta_lang', 'meta_favicon', 'meta_description',
+    'canonical_link', 'tags', 'meta_keywords', 'meta_data', 'publish_date',
+    'language', 'images', 'body')
+
+# Steps a step needs run before it, the body is scored with the stopwords
+# of the language and falls back to its first image for the top image
+STEP_DEPENDENCIES = {
+    'language': ('meta_lang',),
+    'body': ('language', 'images'),
+}
+
+
+def get_extraction_steps(fields):
+    """Steps `Article.parse` runs to extract `fields`
+    """
+    steps = set(fields) - set(['text', 'movies'])
+    if not fields.isdisjoint(('text', 'movies', 'images')):
+        steps.add('body')
+    return steps
+
+
+class ExtractedAttribute(object):
+    """Attribute of `Article` set by a step of `parse`. When the parse is
+    lazy the pending step is run on the first access of any of its
+    attributes
+    """
+    def __init__(self, name, step):
+        self.name = name
+        self.step = step
+
+    def __get__(self, article, owner=None):
+        if article is None:
+            return self
+        if self.step in article._pending_steps and not article._extracting:
+            article._extract(self.step)
+        return article.__dict__[self.name]
+
+    def __set__(self, article, value):
+        article.__dict__[self.name] = value
+
+
 class Article(object):
     """Article objects abstract an online news article page
     """
+    title = ExtractedAttribute('title', 'title')
+    authors = ExtractedAttribute('authors', 'authors')
+    meta_lang = ExtractedAttribute('meta_lang', 'meta_lang')
+    meta_favicon = ExtractedAttribute('meta_favicon', 'meta_favicon')
+    meta_description = ExtractedAttribute('meta_description', 'meta_description')
+    canonical_link = ExtractedAttribute('canonical_link', 'canonical_link')
+    tags = ExtractedAttribute('tags', 'tags')
+    meta_keywords = ExtractedAttribute('meta_keywords', 'meta_keywords')
+    meta_data = ExtractedAttribute('meta_data', 'meta_data')
+    publish_date = ExtractedAttribute('publish_date', 'publish_date')
+    language = ExtractedAttribute('language', 'language')
+    meta_img = ExtractedAttribute('meta_img', 'images')
+    imgs = ExtractedAttribute('imgs', 'images')
+    images = ExtractedAttribute('images', 'images')
+    top_img = ExtractedAttribute('top_img', 'body')
+    top_image = ExtractedAttribute('top_image', 'body')
+    top_image_width = ExtractedAttribute('top_image_width', 'body')
+    top_image_height = ExtractedAttribute('top_image_height', 'body')
+    top_image_hash = ExtractedAttribute('top_image_hash', 'body')
+    movies = ExtractedAttribute('movies', 'body')
+    text = ExtractedAttribute('text', 'body')
+    article_html = ExtractedAttribute('article_html', 'body')
+    top_node = ExtractedAttribute('top_node', 'body')
+    _meta_type = ExtractedAttribute('_meta_type', 'body')
+    _clean_top_node = ExtractedAttribute('_clean_top_node', 'body')
+
     def __init__(self, url, title='', source_url='', config=None, **kwargs):
         """The **kwargs argument may be filled with config values, which
         is added into the config object
@@ -51,6 +121,11 @@ class Article(object):
         self.config = config or Configuration()
         self.config = extend_config(self.config, kwargs)
 
+        # Steps of `parse` left for the first access of their attributes
+        # with `config.lazy_parse`, and whether one is running
+        self._pending_steps = set()
+        self._extracting = False
+
         self.extractor = ContentExtractor(self.config)
 
         self.document_cleaner = DocumentCleaner(self.config)
@@ -109,7 +184,11 @@ class Article(object):
         # Summary generated from the article's body txt
         self.summary = ''
 
-        # This article's unchanged and raw HTML
+        # This article's unchanged and raw HTML. With `config.parse_bytes`
+        # the downloaded bytes are kept in `raw_html` along with the charset
+        # of the http headers, `html` is only decoded from them on access
+        self.raw_html = None
+        self.html_encoding = None
         self.html = ''
 
         # The HTML of this article's main node (most important part)
@@ -139,17 +218,21 @@ class Article(object):
         # for the main body of the article
         self.top_node = None
 
-        # A deepcopied clone of the above object before heavy parsing
-        # operations, useful for users to query data in the
-        # "most important part of the page"
-        self.clean_top_node = None
+        # The above object before it is formatted into text, useful for
+        # users to query data in the "most important part of the page"
+        self._clean_top_node = None
 
         # lxml DOM object generated from HTML
         self.doc = None
 
-        # A deepcopied clone of the above object before undergoing heavy
-        # cleaning operations, serves as an API if users need to query the DOM
-        self.clean_doc = None
+        # The above object before undergoing heavy cleaning operations,
+        # serves as an API if users need to query the DOM. `parse` cleans
+        # its only tree in place, so the html is parsed again when this is
+        # first accessed
+        self._clean_doc = None
+
+        # og:type of the page, read by `is_valid_body`
+        self._meta_type = None
 
         # A property dict for users to store custom data.
         self.additional_data = {}
@@ -170,16 +253,22 @@ class Article(object):
         self.nlp()
         log.info('Url: {} ending build'.format(self.url))
 
-    def download(self, input_html=None, title=None, recursion_counter=0):
+    def download(self, input_html=None, title=None, recursion_counter=0,
+                 http_charset=None):
         """Downloads the link's HTML content, don't use if you are batch async
         downloading articles
 
         recursion_counter (currently 1) stops refreshes that are potentially
-        infinite
+        infinite. http_charset is the charset the headers of an `input_html`
+        given as bytes were served with.
         """
         if input_html is None:
             try:
-                html = network.get_html_2XX_only(self.url, self.config)
+                if self.config.parse_bytes:
+                    html, http_charset = network.get_html_bytes_2XX_only(
+                        self.url, self.config)
+                else:
+                    html = network.get_html_2XX_only(self.url, self.config)
             except requests.exceptions.RequestException as e:
                 self.download_state = ArticleDownloadState.FAILED_RESPONSE
                 self.download_exception_msg = str(e)
@@ -196,14 +285,55 @@ class Article(object):
                     input_html=network.get_html(meta_refresh_url),
                     recursion_counter=recursion_counter + 1)
 
-        self.set_html(html)
+        self.set_html(html, http_charset)
+        self.set_title(title)
+
+    async def adownload(self, input_html=None, title=None,
+                        recursion_counter=0, client=None, http_charset=None):
+        """Asyncio version of `download`, pass a `network.AsyncClient` to
+        share its connections between many articles
+
+        >>> await article.adownload()
+        """
+        if input_html is None:
+            try:
+                if self.config.parse_bytes:
+                    html, http_charset = \
+                        await network.aget_html_bytes_2XX_only(
+                            self.url, self.config, client=client)
+                else:
+                    html = await network.aget_html_2XX_only(
+                        self.url, self.config, client=client)
+            except requests.exceptions.RequestException as e:
+                self.download_state = ArticleDownloadState.FAILED_RESPONSE
+                self.download_exception_msg = str(e)
+                log.debug('Download failed on URL %s because of %s' %
+                          (self.url, self.download_exception_msg))
+                return
+        else:
+            html = input_html
+
+        if self.config.follow_meta_refresh:
+            meta_refresh_url = extract_meta_refresh(html)
+            if meta_refresh_url and recursion_counter < 1:
+                return await self.adownload(
+                    input_html=await network.aget_html(
+                        meta_refresh_url, client=client),
+                    recursion_counter=recursion_counter + 1)
+
+        self.set_html(html, http_charset)
         self.set_title(title)
 
     def parse(self):
+        """Extracts the fields of the extraction profile. With
+        `config.lazy_parse` the document is only parsed, each field is
+        extracted on the first access of its attributes
+        """
         self.throw_if_not_downloaded_verbose()
 
-        self.doc = self.config.get_parser().fromstring(self.html)
-        self.clean_doc = copy.deepcopy(self.doc)
+        self.doc = self._parse_html()
+        self._clean_doc = self._clean_top_node = None
+        self._pending_steps = set()
 
         if self.doc is None:
             # `parse` call failed, return nothing
@@ -213,42 +343,110 @@ class Article(object):
         parse_candidate = self.get_parse_candidate()
         self.link_hash = parse_candidate.link_hash  # MD5
 
-        base_url = self.extractor.get_base_url(self.url, self.clean_doc)
-        self.set_base_url(base_url)
+        fields = self.config.get_extract_fields()
+        if 'images' in fields:
+            base_url = self.extractor.get_base_url(self.url, self.doc)
+            self.set_base_url(base_url)
 
-        title = self.extractor.get_title(self.url, self.clean_doc)
-        self.set_title(title)
+        # Everything read from the whole page is extracted before the
+        # document is cleaned, it serves as `clean_doc` until then
+        self._clean_doc = self.doc
+        self._pending_steps = get_extraction_steps(fields)
+        self.extractor.index_document(self.doc)
 
-        authors = self.extractor.get_authors(self.clean_doc)
-        self.set_authors(authors)
-
-        meta_lang = self.extractor.get_meta_lang(self.clean_doc)
-        self.set_meta_language(meta_lang)
+        if self.config.lazy_parse:
+            self.is_parsed = True
+            return
 
-        meta_favicon = self.extractor.get_favicon(self.url, self.clean_doc)
-        self.set_meta_favicon(meta_favicon)
+        for step in EXTRACTION_STEPS:
+            self._extract(step)
+        self._clean_doc = None
+        self.extractor.clear_doc_index()
+        self.is_parsed = True
 
-        meta_description = \
-            self.extractor.get_meta_description(self.clean_doc)
-        self.set_meta_description(meta_description)
+    def _extract(self, step):
+        """Runs `step` of `parse` if it is pending, after the pending steps
+        it needs
+        """
+        if step not in self._pending_steps:
+            return
+        self._pending_steps.discard(step)
+        for dependency in STEP_DEPENDENCIES.get(step, ()):
+            self._extract(dependency)
 
-        canonical_link = self.extractor.get_canonical_link(
-            self.url, self.clean_doc)
-        self.set_canonical_link(canonical_link)
+        # The attributes of the other pending steps read meanwhile keep
+        # their defaults
+        extracting, self._extracting = self._extracting, True
+        try:
+            if step == 'body':
+                self._extract_body()
+            elif step == 'images':
+                if self.config.fetch_images:
+                    self.fetch_doc_images(self.config.fetch_top_image_hash)
+            elif step == 'language':
+                self.detect_language()
+            else:
+                self._extract_meta(step)
+        finally:
+            self._extracting = extracting
 
-        tags = self.extractor.extract_tags(self.clean_doc)
-        self.set_tags(tags)
+        if not self._pending_steps:
+            self.extractor.clear_doc_index()
+            self.release_resources()
 
-        meta_keywords = self.extractor.get_meta_keywords(
-            self.clean_doc)
-        self.set_meta_keywords(meta_keywords)
+    def _extract_meta(self, field):
+        """Extracts `field` of the metadata of the uncleaned document
+        """
+        if field == 'title':
+            title = self.extractor.get_title(self.url, self.clean_doc)
+            self.set_title(title)
+        elif field == 'authors':
+            authors = self.extractor.get_authors(self.clean_doc)
+            self.set_authors(authors)
+        elif field == 'meta_lang':
+            meta_lang = self.extractor.get_meta_lang(self.clean_doc)
+            self.set_meta_language(meta_lang)
+        elif field == 'meta_favicon':
+            meta_favicon = self.extractor.get_favicon(
+                self.url, self.clean_doc)
+            self.set_meta_favicon(meta_favicon)
+        elif field == 'meta_description':
+            meta_description = \
+                self.extractor.get_meta_description(self.clean_doc)
+            self.set_meta_description(meta_description)
+        elif field == 'canonical_link':
+            canonical_link = self.extractor.get_canonical_link(
+                self.url, self.clean_doc)
+            self.set_canonical_link(canonical_link)
+        elif field == 'tags':
+            tags = self.extractor.extract_tags(self.clean_doc)
+            self.set_tags(tags)
+        elif field == 'meta_keywords':
+            meta_keywords = self.extractor.get_meta_keywords(
+                self.clean_doc)
+            self.set_meta_keywords(meta_keywords)
+        elif field == 'meta_data':
+            meta_data = self.extractor.get_meta_data(self.clean_doc)
+            self.set_meta_data(meta_data)
+        elif field == 'publish_date':
+            self.publish_date = self.extractor.get_publishing_date(
+                self.url,
+                self.clean_doc)
+
+    def _extract_body(self):
+        """Cleans the document in place and extracts the fields read from
+        its body, the fields of the whole page left are read from a fresh
+        parse afterwards
+        """
+        fields = self.config.get_extract_fields()
+        fetch_images = self.config.fetch_images and 'images' in fields
 
-        meta_data = self.extractor.get_meta_data(self.clean_doc)
-        self.set_meta_data(meta_data)
+        if 'text' in fields:
+            self._meta_type = self.extractor.get_meta_type(self.clean_doc)
 
-        self.publish_date = self.extractor.get_publishing_date(
-            self.url,
-            self.clean_doc)
+        if self._clean_doc is self.doc:
+            self._clean_doc = None
+        self.extractor.clear_doc_index()
 
         # check for known node as content body
         # if we find one force the article.doc to be the found node
@@ -260,8 +458,6 @@ class Article(object):
         # Before any computations on the body, clean DOM object
         self.doc = self.document_cleaner.clean(self.doc)
 
-        self.detect_language()
-
         if not self.language and self.config.use_meta_language:
             self.language = self.meta_lang
         self.extractor.update_language(self.language)
@@ -269,22 +465,51 @@ class Article(object):
 
         self.top_node = self.extractor.calculate_best_node(self.doc)
         if self.top_node is not None:
-            video_extractor = VideoExtractor(self.config, self.top_node)
-            self.set_movies(video_extractor.get_videos())
+            if 'movies' in fields:
+                video_extractor = VideoExtractor(self.config, self.top_node)
+                self.set_movies(video_extractor.get_videos())
 
             self.top_node = self.extractor.post_cleanup(self.top_node)
-            self.clean_top_node = copy.deepcopy(self.top_node)
-
-            text, article_html = self.output_formatter.get_formatted(
-                self.top_node)
-            self.set_article_html(article_html)
-            self.set_text(text)
-
-        if self.config.fetch_images:
-            self.fetch_images(self.config.fetch_top_image_hash)
-
-        self.is_parsed = True
-        self.release_resources()
+            self._clean_top_node = copy.deepcopy(self.top_node)
+            if fetch_images:
+                self.fetch_top_node_image(
+                    self.top_node, self.config.fetch_top_image_hash)
+
+            if 'text' in fields:
+                text, article_html = self.output_formatter.get_formatted(
+                    self.top_node)
+                self.set_article_html(article_html)
+                self.set_text(text)
+
+        if fetch_images and not self.has_top_image():
+            self.set_reddit_top_img(self.config.fetch_top_image_hash)
+
+    def _parse_html(self):
+        if self.raw_html is not None:
+            return self.config.get_parser().fromstring_bytes(
+                self.raw_html, self.html_encoding)
+        return self.config.get_parser().fromstring(self.html)
+
+    @property
+    def clean_doc(self):
+        if self._clean_doc is None and self.is_parsed:
+            self._clean_doc = self._parse_html()
+            if self._pending_steps:
+                # only read by the pending steps
+                self.extractor.index_document(self._clean_doc)
+        return self._clean_doc
+
+    @clean_doc.setter
+    def clean_doc(self, doc):
+        self._clean_doc = doc
+
+    @property
+    def clean_top_node(self):
+        return self._clean_top_node
+
+    @clean_top_node.setter
+    def clean_top_node(self, top_node):
+        self._clean_top_node = top_node
 
     def detect_language(self, text=None):
         """
@@ -302,40 +527,49 @@ class Article(object):
         if text is None:
             text = self.text
 
-        if not text:
+        if text:
+            sample = langdetection.get_text_sample(text)
+        else:
             parser = self.config.get_parser()
-            doc = copy.deepcopy(self.clean_doc)
-            body_nodes = parser.getElementsByTag(doc, 'body')
+            body_nodes = parser.getElementsByTag(self.clean_doc, 'body')
             if not body_nodes:
                 return
-            text = parser.getText(parser.clean_article_html(body_nodes[0]))
+            sample = langdetection.get_node_sample(body_nodes[0])
 
-        language = None
-        try:
-            language = langdetect(text)
-        except lang_detect_exception.LangDetectException:
-            pass
+        language = langdetection.detect_language(
+            sample, self.config, self.meta_lang, urls.get_domain(self.url))
         if language and language in language_dict:
             self.language = language
 
     def fetch_images(self, fetch_hash=False):
         if self.clean_doc is not None:
-            meta_img_url = self.extractor.get_meta_img_url(self.base_url, self.clean_doc)
-            self.set_meta_img(meta_img_url, fetch_hash)
-
-            imgs = self.extractor.get_img_urls(self.base_url, self.clean_doc)
-            if self.meta_img:
-                imgs.add(self.meta_img)
-            self.set_imgs(imgs)
+            self.fetch_doc_images(fetch_hash)
 
-        if self.clean_top_node is not None and not self.has_top_image():
-            first_img = self.extractor.get_first_img_url(
-                self.base_url, self.clean_top_node)
-            self.set_top_img(first_img, fetch_hash)
+        if not self.has_top_image() and self.clean_top_node is not None:
+            self.fetch_top_node_image(self.clean_top_node, fetch_hash)
 
         if not self.has_top_image():
             self.set_reddit_top_img(fetch_hash)
 
+    def fetch_doc_images(self, fetch_hash=False):
+        """Sets the meta image and the images of the uncleaned document
+        """
+        meta_img_url = self.extractor.get_meta_img_url(self.base_url, self.clean_doc)
+        self.set_meta_img(meta_img_url, fetch_hash)
+
+        imgs = self.extractor.get_img_urls(self.base_url, self.clean_doc)
+        if self.meta_img:
+            imgs.add(self.meta_img)
+        self.set_imgs(imgs)
+
+    def fetch_top_node_image(self, top_node, fetch_hash=False):
+        """Falls back to the first image of the unformatted `top_node`
+        """
+        if not self.has_top_image():
+            first_img = self.extractor.get_first_img_url(
+                self.base_url, top_node)
+            self.set_top_img(first_img, fetch_hash)
+
     def has_top_image(self):
         return self.top_img is not None and self.top_img != ''
 
@@ -347,12 +581,17 @@ class Article(object):
 
     def is_valid_body(self):
         """If the article's body text is long enough to meet
-        standard article requirements, keep the article
+        standard article requirements, keep the article. Articles whose
+        text the extraction profile leaves out are kept, and their title
+        is only checked when it is extracted
         """
         if not self.is_parsed:
             raise ArticleException('must parse article before checking \
                                     if it\'s body is valid!')
-        meta_type = self.extractor.get_meta_type(self.clean_doc)
+        fields = self.config.get_extract_fields()
+        if 'text' not in fields:
+            return True
+        meta_type = self._meta_type
         wordcount = self.text.split(' ')
         sentcount = self.text.split('.')
 
@@ -365,7 +604,8 @@ class Article(object):
             log.debug('%s caught for no media no text' % self.url)
             return False
 
-        if self.title is None or len(self.title.split(' ')) < 2:
+        if 'title' in fields and \
+                (self.title is None or len(self.title.split(' ')) < 2):
             log.debug('%s caught for bad title' % self.url)
             return False
 
@@ -377,7 +617,7 @@ class Article(object):
             log.debug('%s caught for sent cnt' % self.url)
             return False
 
-        if self.html is None or self.html == '':
+        if not (self.raw_html or self.html):
             log.debug('%s caught for no html' % self.url)
             return False
 
@@ -417,8 +657,9 @@ class Article(object):
         """A parse candidate is a wrapper object holding a link hash of this
         article and a final_url of the article
         """
-        if self.html:
-            return RawHelper.get_parsing_candidate(self.url, self.html)
+        if self.raw_html or self.html:
+            return RawHelper.get_parsing_candidate(
+                self.url, self.raw_html or self.html)
         return URLHelper.get_parsing_candidate(self.url)
 
     def build_resource_path(self):
@@ -484,13 +725,33 @@ class Article(object):
         if text:
             self.text = text
 
-    def set_html(self, html):
-        """Encode HTML before setting it
+    @property
+    def html(self):
+        if self._html is None:
+            self._html = self.config.get_parser().get_unicode_html(
+                self.raw_html, self.html_encoding) or ''
+        return self._html
+
+    @html.setter
+    def html(self, html):
+        self._html = html
+        self.raw_html = None
+        self.html_encoding = None
+
+    def set_html(self, html, http_charset=None):
+        """Encode HTML before setting it, with `config.parse_bytes` bytes
+        are kept as they are until `html` is accessed
         """
         if html:
-            if isinstance(html, bytes):
-                html = self.config.get_parser().get_unicode_html(html)
-            self.html = html
+            if isinstance(html, bytes) and self.config.parse_bytes:
+                self.html = None
+                self.raw_html = html
+                self.html_encoding = http_charset
+            else:
+                if isinstance(html, bytes):
+                    html = self.config.get_parser().get_unicode_html(
+                        html, http_charset)
+                self.html = html
             self.download_state = ArticleDownloadState.SUCCESS
 
     def set_article_html(self, article_html):
@@ -0,0 +1,31 @@
+//casperjs
+// Render worker of newspaper's casperjs content strategy. Reads one url
+// per line on stdin and answers each with one JSON line on stdout:
+// {"status": <http status>, "html": <page html>}. Exits on end of input.
+var system = require('system');
+var casper = require('casper').create();
+
+function renderNext() {
+    if (system.stdin.atEnd()) {
+        return;
+    }
+    var url = system.stdin.readLine().trim();
+    if (!url) {
+        casper.then(renderNext);
+        return;
+    }
+    casper.thenOpen(url, function() {
+        system.stdout.writeLine(JSON.stringify({
+            status: this.currentHTTPStatus || 0,
+            html: this.getHTML()
+        }));
+        system.stdout.flush();
+    });
+    casper.then(renderNext);
+}
+
+casper.start();
+casper.then(renderNext);
+casper.run(function() {
+    this.exit(0);
+});
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""
+Decoding of html bytes whose encoding the http layer could not tell.
+Cheap and reliable hints are tried first, BeautifulSoup's UnicodeDammit
+which tries many encodings in turn is only the last resort.
+"""
+__title__ = 'newspaper'
+__author__ = 'Lucas Ou-Yang'
+__license__ = 'MIT'
+__copyright__ = 'Copyright 2014, Lucas Ou-Yang'
+
+import codecs
+import logging
+import re
+
+from bs4 import UnicodeDammit
+
+log = logging.getLogger(__name__)
+
+# Only this many leading bytes are scanned for an encoding declaration and
+# fed to the statistical detector
+META_SCAN_SIZE = 4096
+DETECT_SIZE = 65536
+
+BOMS = (
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+
+# <meta charset="x">, <meta http-equiv="Content-Type" content="...; charset=x">
+# and <?xml ... encoding="x"?>
+DECLARATION_RE = re.compile(
+    br'''<meta[^>]+?charset\s*=\s*["']?\s*([a-z0-9_:.+-]+)|'''
+    br'''<\?xml[^>]+?encoding\s*=\s*["']\s*([a-z0-9_:.+-]+)''',
+    re.IGNORECASE)
+
+# Declared encodings are decoded with the superset browsers use for them,
+# pages declaring latin-1 often hold windows-1252 punctuation and so on
+LABEL_OVERRIDES = {
+    'iso8859-1': 'cp1252',
+    'ascii': 'cp1252',
+    'iso8859-9': 'cp1254',
+    'gb2312': 'gbk',
+    'shift_jis': 'cp932',
+    'euc_kr': 'cp949',
+    'tis-620': 'cp874',
+}
+
+# Utf-16 and utf-32 documents start with a BOM, declarations and guesses
+# of them without one are wrong, and decoding with them rarely fails
+WIDE_ENCODINGS = ('utf-16', 'utf-32')
+
+_detector = None
+
+
+def _normalize(label):
+    """Returns the python name of the encoding `label`, None if unknown
+    """
+    if isinstance(label, bytes):
+        label = label.decode('ascii', 'ignore')
+    try:
+        name = codecs.lookup(label.strip()).name
+    except (LookupError, ValueError):
+        return None
+    return LABEL_OVERRIDES.get(name, name)
+
+
+def _decode(html, encoding):
+    try:
+        return html.decode(encoding)
+    except (UnicodeDecodeError, LookupError):
+        return None
+
+
+def get_bom_encoding(html):
+    for bom, encoding in BOMS:
+        if html.startswith(bom):
+            return encoding
+    return None
+
+
+def get_declared_encoding(html):
+    """Encoding declared by the first meta or xml declaration found in the
+    leading `META_SCAN_SIZE` bytes
+    """
+    match = DECLARATION_RE.search(html, 0, META_SCAN_SIZE)
+    if match is None:
+        return None
+    encoding = _normalize(match.group(1) or match.group(2))
+    if encoding and encoding.startswith(WIDE_ENCODINGS):
+        return 'utf-8'
+    return encoding
+
+
+def get_detector():
+    """Returns the `detect` function of the fastest statistical detector
+    installed among cchardet, charset_normalizer and chardet, None if
+    there is none
+    """
+    global _detector
+    if _detector is None:
+        _detector = False
+        for name in ('cchardet', 'charset_normalizer', 'chardet'):
+            try:
+                _detector = __import__(name).detect
+                break
+            except (ImportError, AttributeError):
+                continue
+    return _detector or None
+
+
+def detect_encoding(html):
+    """Guess of the statistical detector on the leading bytes of `html`
+    """
+    detect = get_detector()
+    if detect is None:
+        return None
+    encoding = detect(html[:DETECT_SIZE]).get('encoding')
+    encoding = _normalize(encoding) if encoding else None
+    if encoding and encoding.startswith(WIDE_ENCODINGS):
+        return None
+    return encoding
+
+
+def get_encoding(html, http_charset=None):
+    """Encoding of the `html` bytes for a parser decoding them itself. The
+    byte order mark, the http charset and the declaration of the document
+    are trusted as they are, only undeclared documents are checked for
+    utf-8 and then given to the statistical detector. None if unknown.
+    """
+    bom_encoding = get_bom_encoding(html)
+    if bom_encoding is not None:
+        return 'utf-8' if bom_encoding == 'utf-8-sig' else bom_encoding
+    encoding = (http_charset and _normalize(http_charset)) or \
+        get_declared_encoding(html)
+    if encoding:
+        return encoding
+    if html.isascii() or _decode(html, 'utf-8') is not None:
+        return 'utf-8'
+    return detect_encoding(html)
+
+
+def decode_html(html, http_charset=None):
+    """Decodes the `html` bytes, returns the markup and the encoding used.
+    The candidates are, in order: the byte order mark, the charset of the
+    http headers, the declaration of the document, utf-8, the statistical
+    detector and finally UnicodeDammit. A candidate is used once the whole
+    document decodes with it. The markup is None if nothing worked.
+    """
+    bom_encoding = get_bom_encoding(html)
+    if bom_encoding is not None:
+        markup = _decode(html, bom_encoding)
+        if markup is not None:
+            return markup, bom_encoding
+
+    tried = set()
+    for candidate in (lambda: http_charset and _normalize(http_charset),
+                      lambda: get_declared_encoding(html),
+                      lambda: 'utf-8',
+                      lambda: detect_encoding(html)):
+        encoding = candidate()
+        if not encoding or encoding in tried:
+            continue
+        tried.add(encoding)
+        markup = _decode(html, encoding)
+        if markup is not None:
+            return markup, encoding
+
+    log.debug('Falling back to UnicodeDammit, tried: %s' % ', '.join(tried))
+    converted = UnicodeDammit(html, is_html=True)
+    return converted.unicode_markup, converted.original_encoding
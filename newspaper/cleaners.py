@@ -3,9 +3,18 @@
 Holds the code for cleaning out unwanted tags from the lxml
 dom xpath.
 """
-import copy
+import re
 from .utils import ReplaceSequence
 
+# Whitespace css splits class attributes on
+CLASS_SEPARATORS = re.compile(r'[ \t\r\n]+')
+DROP_CAP_CLASSES = {'dropcap', 'drop_cap'}
+# Removal rules of a `DocumentCleaner` in the order they are applied, ids,
+# classes then names matching `remove_nodes_re` and not containing an
+# article go first, then the ids and classes matching each other pattern
+REMOVE_BY_ID, REMOVE_BY_CLASS, REMOVE_BY_NAME, REMOVE_BY_PATTERN = range(4)
+KEEP = float('inf')
+
 
 class DocumentCleaner(object):
 
@@ -29,13 +38,6 @@ class DocumentCleaner(object):
             "|konafilter|KonaFilter|breadcrumbs|^fn$|wp-caption-text"
             "|legende|ajoutVideo|timestamp|js_replies"
         )
-        self.regexp_namespace = "http://exslt.org/regular-expressions"
-        self.nauthy_ids_re = ("//*[re:test(@id, '%s', 'i')]" %
-                              self.remove_nodes_re)
-        self.nauthy_classes_re = ("//*[re:test(@class, '%s', 'i')]" %
-                                  self.remove_nodes_re)
-        self.nauthy_names_re = ("//*[re:test(@name, '%s', 'i')]" %
-                                self.remove_nodes_re)
         self.div_to_p_re = r"<(a|blockquote|dl|div|img|ol|p|pre|table|ul)"
         self.caption_re = "^caption$"
         self.google_re = " google "
@@ -47,152 +49,198 @@ class DocumentCleaner(object):
             .create("\n", "\n\n")\
             .append("\t")\
             .append("^\\s+$")
-        self.contains_article = './/article|.//*[@id="article"]|.//*[@itemprop="articleBody"]'
+        # all removal rules are compiled once, matched case insensitively
+        # as the exslt re:test(@attr, pattern, 'i') xpaths they replace
+        self.nodes_to_remove = re.compile(self.remove_nodes_re, re.I)
+        patterns = [self.caption_re, self.google_re, self.entries_re,
+                    self.facebook_re, self.facebook_braodcasting_re,
+                    self.twitter_re]
+        self.patterns_to_remove = [re.compile(p, re.I) for p in patterns]
+        self.any_pattern_to_remove = re.compile(
+            '|'.join('(?:%s)' % p for p in patterns), re.I)
 
     def clean(self, doc_to_clean):
         """Remove chunks of the DOM as specified
         """
-        doc_to_clean = self.clean_body_classes(doc_to_clean)
-        doc_to_clean = self.clean_article_tags(doc_to_clean)
-        doc_to_clean = self.clean_em_tags(doc_to_clean)
-        doc_to_clean = self.remove_drop_caps(doc_to_clean)
-        doc_to_clean = self.remove_scripts_styles(doc_to_clean)
-        doc_to_clean = self.clean_bad_tags(doc_to_clean)
-        doc_to_clean = self.remove_nodes_regex(doc_to_clean, self.caption_re)
-        doc_to_clean = self.remove_nodes_regex(doc_to_clean, self.google_re)
-        doc_to_clean = self.remove_nodes_regex(doc_to_clean, self.entries_re)
-        doc_to_clean = self.remove_nodes_regex(doc_to_clean, self.facebook_re)
-        doc_to_clean = self.remove_nodes_regex(doc_to_clean,
-                                               self.facebook_braodcasting_re)
-        doc_to_clean = self.remove_nodes_regex(doc_to_clean, self.twitter_re)
-        doc_to_clean = self.clean_para_spans(doc_to_clean)
+        doc_to_clean = self.remove_nodes(doc_to_clean)
         doc_to_clean = self.div_to_para(doc_to_clean, 'div')
         doc_to_clean = self.div_to_para(doc_to_clean, 'span')
         return doc_to_clean
 
-    def clean_body_classes(self, doc):
-        """Removes the `class` attribute from the <body> tag because
-        if there is a bad match, the entire DOM will be empty!
+    def is_article(self, node):
+        """Nodes matching `remove_nodes_re` are kept when they contain an
+        article node
         """
-        elements = self.parser.getElementsByTag(doc, tag="body")
-        if elements:
-            self.parser.delAttribute(elements[0], attr="class")
-        return doc
-
-    def clean_article_tags(self, doc):
-        articles = self.parser.getElementsByTag(doc, tag='article')
-        for article in articles:
-            for attr in ['id', 'name', 'class']:
-                self.parser.delAttribute(article, attr=attr)
-        return doc
+        return node.tag == 'article' or node.get('id') == 'article' or \
+            node.get('itemprop') == 'articleBody'
 
-    def clean_em_tags(self, doc):
-        ems = self.parser.getElementsByTag(doc, tag='em')
-        for node in ems:
-            images = self.parser.getElementsByTag(node, tag='img')
-            if len(images) == 0:
-                self.parser.drop_tag(node)
-        return doc
+    def remove_nodes(self, doc):
+        """Decides in a single walk what to drop or remove from `doc`, then
+        applies it in order:
 
-    def remove_drop_caps(self, doc):
-        items = self.parser.css_select(doc, 'span[class~=dropcap], '
-                                       'span[class~=drop_cap]')
-        for item in items:
-            self.parser.drop_tag(item)
-        return doc
+        - the class of the <body> and the id, name and class of <article>
+          nodes are deleted, so they never match the removal rules
+        - <em> without images and dropcap <span> tags are dropped
+        - <script> and <style> tags and all comments are removed
+        - nodes whose id, class then name match `remove_nodes_re` are
+          removed, unless they still contain an article at that point
+        - nodes whose id or class match the other patterns are removed
+        - <span> tags in paragraphs are dropped
 
-    def remove_scripts_styles(self, doc):
-        # remove scripts
-        scripts = self.parser.getElementsByTag(doc, tag='script')
-        for item in scripts:
-            self.parser.remove(item)
-        # remove styles
-        styles = self.parser.getElementsByTag(doc, tag='style')
-        for item in styles:
-            self.parser.remove(item)
-        # remove comments
-        comments = self.parser.getComments(doc)
-        for item in comments:
-            self.parser.remove(item)
+        Comments and the id, class and name rules cover the whole tree
+        `doc` belongs to, the other rules only `doc` and its descendants.
+        """
+        body = None
+        articles, ems, drop_caps, para_spans = [], [], [], []
+        drop_caps_set = set()
+        scripts, styles, comments = [], [], []
+        removals = []
+        # One frame per open node: in `doc`, in a <p> of `doc`, contains
+        # an <img>, and contains an article once none, the id then the
+        # class rule removed nodes
+        stack = []
+        order = 0
+        for event, node in self.parser.walk(self.parser.getRoot(doc)):
+            if event == 'comment':
+                comments.append(node)
+                continue
+            tag = node.tag
+            if not isinstance(tag, str):
+                continue
 
-        return doc
+            if event == 'start':
+                parent = stack[-1] if stack else None
+                in_doc = node is doc or (parent is not None and parent[0])
+                in_p = parent is not None and parent[1]
+                if in_doc and tag == 'span' and in_p:
+                    para_spans.append(node)
+                stack.append([in_doc, in_p or (in_doc and tag == 'p'),
+                              False, False, False, False, order])
+                order += 1
+                continue
 
-    def clean_bad_tags(self, doc):
-        # ids
-        naughty_list = self.parser.xpath_re(doc, self.nauthy_ids_re)
-        for node in naughty_list:
-            if not node.xpath(self.contains_article):
-                self.parser.remove(node)
-        # class
-        naughty_classes = self.parser.xpath_re(doc, self.nauthy_classes_re)
-        for node in naughty_classes:
-            if not node.xpath(self.contains_article):
-                self.parser.remove(node)
-        # name
-        naughty_names = self.parser.xpath_re(doc, self.nauthy_names_re)
-        for node in naughty_names:
-            if not node.xpath(self.contains_article):
-                self.parser.remove(node)
-        return doc
+            in_doc, _, has_img, article_0, article_1, article_2, start = \
+                stack.pop()
+            attrs = {'id': node.get('id'), 'class': node.get('class'),
+                     'name': node.get('name')}
+            transparent = False
+            if in_doc and node is not doc:
+                if tag == 'body' and body is None:
+                    body = node
+                    attrs['class'] = None
+                elif tag == 'article':
+                    articles.append((start, node))
+                    attrs = {}
+                elif tag == 'em' and not has_img:
+                    ems.append((start, node))
+                    transparent = True
+                elif tag == 'script' or tag == 'style':
+                    (scripts if tag == 'script' else styles).append(node)
+                    continue
+            if in_doc and tag == 'span' and attrs.get('class') and \
+                    DROP_CAP_CLASSES.intersection(
+                        CLASS_SEPARATORS.split(attrs['class'])):
+                drop_caps.append((start, node))
+                drop_caps_set.add(node)
+                transparent = True
 
-    def remove_nodes_regex(self, doc, pattern):
-        for selector in ['id', 'class']:
-            reg = "//*[re:test(@%s, '%s', 'i')]" % (selector, pattern)
-            naughty_list = self.parser.xpath_re(doc, reg)
-            for node in naughty_list:
-                self.parser.remove(node)
-        return doc
+            rule = KEEP
+            article = False
+            if not transparent:
+                rule = self.get_removal_rule(
+                    attrs, (article_0, article_1, article_2))
+                article = self.is_article(node)
+                if rule != KEEP:
+                    removals.append((rule, start, node))
+            if stack:
+                frame = stack[-1]
+                frame[2] = frame[2] or has_img or tag == 'img'
+                # contains an article after the removals of each pass
+                for i, contains in enumerate(
+                        (article_0, article_1, article_2)):
+                    if rule >= i and (article or contains):
+                        frame[3 + i] = True
 
-    def clean_para_spans(self, doc):
-        spans = self.parser.css_select(doc, 'p span')
-        for item in spans:
+        if body is not None:
+            self.parser.delAttribute(body, attr='class')
+        for _, article in sorted(articles, key=lambda item: item[0]):
+            for attr in ['id', 'name', 'class']:
+                self.parser.delAttribute(article, attr=attr)
+        for _, em in sorted(ems, key=lambda item: item[0]):
+            self.parser.drop_tag(em)
+        for _, item in sorted(drop_caps, key=lambda item: item[0]):
             self.parser.drop_tag(item)
+        for item in scripts + styles + comments:
+            self.parser.remove(item)
+        for _, _, node in sorted(removals, key=lambda item: item[:2]):
+            self.parser.remove(node)
+        for item in para_spans:
+            # spans of removed nodes are not in `doc` anymore
+            if item not in drop_caps_set and doc in item.iterancestors():
+                self.parser.drop_tag(item)
         return doc
 
+    def get_removal_rule(self, attrs, contains_article):
+        """The first rule that removes a node with the id, class and name
+        `attrs`, `contains_article` tells whether the node still contains
+        an article once the id, class and name rules before ran. Rules
+        sort in the order they are applied
+        """
+        for rule, attr in enumerate(('id', 'class', 'name')):
+            value = attrs.get(attr)
+            if value and not contains_article[rule] and \
+                    self.nodes_to_remove.search(value):
+                return rule
+        values = [attrs.get('id'), attrs.get('class')]
+        if not any(value and self.any_pattern_to_remove.search(value)
+                   for value in values):
+            return KEEP
+        for i, pattern in enumerate(self.patterns_to_remove):
+            for j, value in enumerate(values):
+                if value and pattern.search(value):
+                    return REMOVE_BY_PATTERN + 2 * i + j
+
     def get_flushed_buffer(self, replacement_text, doc):
-        return self.parser.textToPara(replacement_text)
+        return self.parser.nodesToPara(replacement_text)
 
     def replace_walk_left_right(self, kid, kid_text,
                                 replacement_text, nodes_to_remove):
+        """Adds the text of `kid` to `replacement_text` along with the
+        anchors around it not used yet
+        """
         kid_text_node = kid
         replace_text = self.tablines_replacements.replaceAll(kid_text)
         if len(replace_text) > 1:
             prev_node = self.parser.previousSibling(kid_text_node)
             while prev_node is not None \
                     and self.parser.getTag(prev_node) == "a" \
-                    and self.parser.getAttribute(
-                        prev_node, 'grv-usedalready') != 'yes':
-                outer = " " + self.parser.outerHtml(prev_node) + " "
-                replacement_text.append(outer)
-                nodes_to_remove.append(prev_node)
-                self.parser.setAttribute(prev_node, attr='grv-usedalready',
-                                         value='yes')
+                    and prev_node not in nodes_to_remove:
+                replacement_text.append(prev_node)
+                nodes_to_remove[prev_node] = None
                 prev_node = self.parser.previousSibling(prev_node)
 
             replacement_text.append(replace_text)
             next_node = self.parser.nextSibling(kid_text_node)
             while next_node is not None \
                     and self.parser.getTag(next_node) == "a" \
-                    and self.parser.getAttribute(
-                        next_node, 'grv-usedalready') != 'yes':
-                outer = " " + self.parser.outerHtml(next_node) + " "
-                replacement_text.append(outer)
-                nodes_to_remove.append(next_node)
-                self.parser.setAttribute(next_node, attr='grv-usedalready',
-                                         value='yes')
+                    and next_node not in nodes_to_remove:
+                replacement_text.append(next_node)
+                nodes_to_remove[next_node] = None
                 next_node = self.parser.nextSibling(next_node)
 
-    def get_replacement_nodes(self, doc, div):
+    def get_replacement_nodes(self, doc, div, moved_nodes=None):
+        """Returns the children of `div` with its texts and their anchors
+        put in paragraphs, the moved anchors are added to `moved_nodes`
+        """
         replacement_text = []
         nodes_to_return = []
-        nodes_to_remove = []
+        # the anchors moving to the new paragraphs, in order
+        nodes_to_remove = {}
         kids = self.parser.childNodesWithText(div)
         for kid in kids:
             # The node is a <p> and already has some replacement text
             if self.parser.getTag(kid) == 'p' and len(replacement_text) > 0:
-                new_node = self.get_flushed_buffer(
-                    ''.join(replacement_text), doc)
-                nodes_to_return.append(new_node)
+                nodes_to_return.append(replacement_text)
                 replacement_text = []
                 nodes_to_return.append(kid)
             # The node is a text node
@@ -205,14 +253,22 @@ class DocumentCleaner(object):
 
         # flush out anything still remaining
         if(len(replacement_text) > 0):
-            new_node = self.get_flushed_buffer(''.join(replacement_text), doc)
-            nodes_to_return.append(new_node)
+            nodes_to_return.append(replacement_text)
             replacement_text = []
 
+        # the anchors leave an empty <a> behind them, removed from the div
+        # but returned in their place
         for n in nodes_to_remove:
-            self.parser.remove(n)
+            emptied = self.parser.createElement(tag='a', tail=n.tail)
+            self.parser.getParent(n).replace(n, emptied)
+            n.tail = None
+            nodes_to_remove[n] = emptied
+            self.parser.remove(emptied)
+        if moved_nodes is not None:
+            moved_nodes.extend(nodes_to_remove)
 
-        return nodes_to_return
+        return [self.get_flushed_buffer(n, doc) if isinstance(n, list)
+                else nodes_to_remove.get(n, n) for n in nodes_to_return]
 
     def replace_with_para(self, doc, div):
         self.parser.replaceTag(div, 'p')
@@ -223,15 +279,33 @@ class DocumentCleaner(object):
         divs = self.parser.getElementsByTag(doc, tag=dom_type)
         tags = ['a', 'blockquote', 'dl', 'div', 'img', 'ol', 'p',
                 'pre', 'table', 'ul']
+        # the nodes holding any of `tags`, found going up from each of them
+        # once; a node only changes its own children so this holds for the
+        # nodes after it
+        has_tags = set()
+        for node in doc.iter(*tags):
+            for parent in node.iterancestors():
+                if parent in has_tags:
+                    break
+                has_tags.add(parent)
+        # the anchors moved to paragraphs, what they hold is left as is
+        moved_nodes = []
+        skipped = set()
         for div in divs:
-            items = self.parser.getElementsByTags(div, tags)
-            if div is not None and len(items) == 0:
+            if moved_nodes:
+                for node in moved_nodes:
+                    skipped.update(node.iter(dom_type))
+                del moved_nodes[:]
+            if div in skipped:
+                continue
+            if div is not None and div not in has_tags:
                 self.replace_with_para(doc, div)
                 bad_divs += 1
             elif div is not None:
-                replace_nodes = self.get_replacement_nodes(doc, div)
+                replace_nodes = self.get_replacement_nodes(
+                    doc, div, moved_nodes)
                 replace_nodes = [n for n in replace_nodes if n is not None]
-                attrib = copy.deepcopy(div.attrib)
+                attrib = dict(div.attrib)
                 div.clear()
                 for i, node in enumerate(replace_nodes):
                     div.insert(i, node)
@@ -13,12 +13,40 @@ __copyright__ = 'Copyright 2014, Lucas Ou-Yang'
 import logging
 
 from .parsers import Parser
+from .settings import HTTP_CACHE_DIRECTORY
 from .text import (StopWords, StopWordsArabic, StopWordsChinese,
                    StopWordsKorean, StopWordsHindi)
 from .version import __version__
 
 log = logging.getLogger(__name__)
 
+# Fields of an `Article` that `parse` can extract, 'text' holds the text,
+# the html and the top node of the body, 'images' the meta image, the top
+# image and the images (when `fetch_images` is set)
+ARTICLE_FIELDS = frozenset([
+    'title', 'authors', 'meta_lang', 'meta_favicon', 'meta_description',
+    'canonical_link', 'tags', 'meta_keywords', 'meta_data', 'publish_date',
+    'language', 'text', 'movies', 'images'])
+
+# Fields the extraction of a field needs, the body is scored with the
+# stopwords of the language
+FIELD_DEPENDENCIES = {
+    'text': ('language',),
+    'movies': ('language',),
+    'images': ('language',),
+    'language': ('meta_lang',),
+}
+
+EXTRACTION_PROFILES = {
+    'full': ARTICLE_FIELDS,
+    # the title is what `is_valid_body` checks along with the text
+    'text_only': frozenset(['title', 'text']),
+    'metadata_only': frozenset([
+        'title', 'authors', 'meta_lang', 'meta_favicon', 'meta_description',
+        'canonical_link', 'tags', 'meta_keywords', 'meta_data',
+        'publish_date']),
+}
+
 
 class Configuration(object):
     def __init__(self):
@@ -53,9 +81,28 @@ class Configuration(object):
         # Don't toggle this variable, done internally
         self.use_meta_language = True
 
+        # The language of articles is detected on a sample of their text,
+        # the script alone tells most languages not written in latin, the
+        # `language_detector` (a langdetection.LanguageDetector, langdetect
+        # when None) tells the others. With `trust_meta_language` the
+        # language the page declares is taken once its stopwords are found
+        # in the text. Setting `language_cache_size` remembers the language
+        # confirmed for the pages of a domain declaring a language, for that
+        # many pairs of them, later pages of the pair are not detected again
+        self.language_detector = None
+        self.trust_meta_language = False
+        self.language_cache_size = None
+
         # You may keep the html of just the main article body
         self.keep_article_html = False
 
+        # Fields `Article.parse` extracts, a name of EXTRACTION_PROFILES or
+        # some of ARTICLE_FIELDS, the others keep their empty defaults
+        self.extraction_profile = 'full'
+        # Have `Article.parse` only parse the document, each of these
+        # fields is extracted on the first access of its attributes
+        self.lazy_parse = False
+
         # Fail for error responses (e.g. 404 page)
         self.http_success_only = True
 
@@ -71,17 +118,79 @@ class Configuration(object):
         self.proxies = {}
         self.number_threads = 10
 
+        # Connection pooling of the shared http session, `pool_connections`
+        # is the number of hosts to keep pools for and `pool_maxsize` the
+        # number of keep-alive connections kept per host
+        self.pool_connections = 20
+        self.pool_maxsize = 10
+        self.keep_alive = True
+
+        # Resolved addresses of hosts are cached for `dns_cache_ttl` seconds,
+        # None disables the cache. With `prewarm_connections` a source opens
+        # connections to the hosts of its categories before downloading them
+        self.dns_cache_ttl = 300
+        self.prewarm_connections = False
+
+        # Politeness limits of threaded downloads, None disables a limit:
+        # requests per second to a single host (bursting up to
+        # `host_rate_burst`), concurrent requests per host and overall
+        self.host_rate_limit = None
+        self.host_rate_burst = 1
+        self.max_connections_per_host = None
+        self.max_in_flight = None
+
+        # Connection caps of the asyncio download engine, total and per host
+        self.async_concurrency = 100
+        self.async_concurrency_per_host = 10
+
+        # Connection errors, timeouts, 429 and 5xx are retried `max_retries`
+        # times (none by default), waiting up to `retry_backoff` * 2 **
+        # attempt seconds (full jitter, capped at `retry_backoff_max`) or
+        # as long as Retry-After asks when that is shorter than
+        # `retry_backoff_max`
+        self.max_retries = 0
+        self.retry_backoff = 0.5
+        self.retry_backoff_max = 30
+
+        # Requests to a host fail fast for `circuit_breaker_reset` seconds
+        # once it failed `circuit_breaker_threshold` times in a row, None
+        # disables the circuit breaker. The breaker is shared by every
+        # config of the process with the same two settings
+        self.circuit_breaker_threshold = None
+        self.circuit_breaker_reset = 60
+
+        # On-disk http cache, cached bodies are revalidated with
+        # If-None-Match / If-Modified-Since and a 304 is served from disk.
+        # The least recently used entries are evicted past `http_cache_size`
+        self.http_cache = False
+        self.http_cache_directory = HTTP_CACHE_DIRECTORY
+        self.http_cache_size = 268435456  # 256MB
+
+        # Path of a WARC file every download is appended to, as a request
+        # and a response record, gzipped per record if it ends with .gz
+        self.warc_file = None
+
         self.verbose = False  # for debugging
 
         self.thread_timeout_seconds = 1
 
         # strategy, size limit and invalid mimetypes for network.get_html()
+        # The 'selenium' and 'casperjs' strategies lease pooled browsers or
+        # casperjs workers, their kwargs are `pool_size` and `max_pages`
+        # rendered before a worker is recycled. Selenium also takes
+        # `page_load_timeout`, `virtual_display` and `log_file`. The 'splash'
+        # strategy takes the `host` of the service, its number of `slots`
+        # and the `wait` and `timeout` of renders
         self.content_strategy = {'name': 'requests', 'kwargs': {}}
         self.size_limit = 5242880
         self.invalid_content_types = ['audio/*', 'video/*', 'image/*', 'application/octet-stream', 'application/pdf']
 
         self.video_detect_provider = False
 
+        # Keep downloaded html as bytes and parse them with lxml in their
+        # detected encoding, `Article.html` is only decoded when accessed
+        self.parse_bytes = False
+
         # Set this to False if you want to recompute the categories
         # *every* time you build a `Source` object
         # TODO: Actually make this work
@@ -111,6 +220,28 @@ class Configuration(object):
     language = property(get_language, set_language,
                         del_language, "language prop")
 
+    def get_extract_fields(self):
+        """Returns the fields of `extraction_profile` and those their
+        extraction needs
+        """
+        profile = self.extraction_profile
+        if isinstance(profile, str):
+            if profile not in EXTRACTION_PROFILES:
+                raise Exception('Unknown extraction profile %r, it must be '
+                                'one of %s' % (profile, ', '.join(
+                                    sorted(EXTRACTION_PROFILES))))
+            profile = EXTRACTION_PROFILES[profile]
+        fields = set()
+        pending = list(profile)
+        while pending:
+            field = pending.pop()
+            if field not in ARTICLE_FIELDS:
+                raise Exception('Unknown article field %r' % field)
+            if field not in fields:
+                fields.add(field)
+                pending.extend(FIELD_DEPENDENCIES.get(field, ()))
+        return frozenset(fields)
+
     @staticmethod
     def get_stopwords_class(language):
         if language == 'ko':
@@ -15,7 +15,9 @@ __copyright__ = 'Copyright 2014, Lucas Ou-Yang'
 
 import copy
 import logging
+import operator
 import re
+from array import array
 from collections import defaultdict
 
 from dateutil.parser import parse as date_parser
@@ -25,6 +27,7 @@ from urllib.parse import urljoin, urlparse, urlunparse
 from . import urls
 from .utils import StringReplacement, StringSplitter
 from .nlp import word_count
+from .text import StopWords
 
 log = logging.getLogger(__name__)
 
@@ -40,10 +43,12 @@ ARROWS_SPLITTER = StringSplitter(" » ")
 COLON_SPLITTER = StringSplitter(":")
 SPACE_SPLITTER = StringSplitter(' ')
 NO_STRINGS = set()
-A_REL_TAG_SELECTOR = "a[rel=tag]"
-A_HREF_TAG_SELECTOR = ("a[href*='/tag/'], a[href*='/tags/'], "
-                       "a[href*='/topic/'], a[href*='?keyword=']")
+# a[rel=tag], then a[href*=...] for any of the below
+A_REL_TAG = 'tag'
+A_HREF_TAG_PATHS = ('/tag/', '/tags/', '/topic/', '?keyword=')
 RE_LANG = r'^[A-Za-z]{2}$'
+# meta[attr=value] and meta[attr="value"], answered from the document index
+RE_META_SELECTOR = re.compile(r'^meta\[([\w:.-]+)=["\']?([^"\'\]]*)["\']?\]$')
 
 good_paths = ['story', 'article', 'feature', 'featured', 'slides',
               'slideshow', 'gallery', 'news', 'video', 'media',
@@ -58,6 +63,143 @@ KNOWN_ARTICLE_CONTENT_TAGS = [
     {'tag': 'article'},
 ]
 
+# columns of the NodeStats table
+(TEXT_CHARS, TEXT_FRAGMENTS, STOPWORDS, ALNUM_WORDS, TOKENS,
+ LINKS, LINK_TOKENS, TEXT_LINKS) = range(8)
+NODE_STATS_COLUMNS = 8
+
+
+class NodeStats(object):
+    """Text statistics of the nodes of a document, as the extractor
+    would compute them from `Parser.getText`: text length, stopword and
+    word counts, link counts. They are summed up bottom-up over the text
+    fragments of the document in one walk, which holds since `getText`
+    joins the fragments with single spaces. Each node gets a row of one
+    flat array, its id is the offset of that row. Nodes added to the
+    document afterwards, or out of it, are computed when first asked for.
+    The word counts, only needed for the nodes without stopwords, are
+    computed on demand and memoized
+    """
+
+    def __init__(self, extractor, doc=None):
+        self.extractor = extractor
+        self.parser = extractor.parser
+        self.language = extractor.language
+        # stopwords only add up over fragments for the space separated
+        # languages, the other ones are counted per node and memoized
+        self.stopwords = None
+        if self.language and extractor.stopwords_class is StopWords:
+            self.stopwords = StopWords(language=self.language)
+        self.stopword_counts = {}
+        self.word_counts = {}
+        self.ids = {}
+        self.table = array('l')
+        if doc is not None:
+            self.add(doc)
+
+    def add(self, doc):
+        """Computes the statistics of `doc` and of all its descendants
+        """
+        table = self.table
+        ids = self.ids
+        add_text = self.add_text
+        stack = []
+        for event, node in self.parser.walk(doc):
+            if event == 'start':
+                totals = [0] * NODE_STATS_COLUMNS
+                if node.text:
+                    add_text(totals, node.text)
+                stack.append(totals)
+                continue
+            if event == 'end':
+                totals = stack.pop()
+                ids[node] = len(table)
+                table.extend(totals)
+                if not stack:
+                    break
+                parent = stack[-1]
+                parent[:] = map(operator.add, parent, totals)
+                if node.tag == 'a':
+                    parent[LINKS] += 1
+                    parent[LINK_TOKENS] += totals[TOKENS]
+                    if totals[TEXT_FRAGMENTS]:
+                        parent[TEXT_LINKS] += 1
+            if node.tail:
+                add_text(stack[-1], node.tail)
+
+    def add_text(self, totals, text):
+        words = text.split()
+        if not words:
+            return
+        fragment = ' '.join(words)
+        totals[TEXT_CHARS] += len(fragment)
+        totals[TEXT_FRAGMENTS] += 1
+        totals[TOKENS] += len(words)
+        totals[ALNUM_WORDS] += sum(map(str.isalnum, words))
+        stopwords = self.stopwords
+        if stopwords is not None:
+            # StopWords.get_stopword_count, without its WordStats
+            candidate_words = stopwords.candidate_words(
+                stopwords.remove_punctuation(fragment).lower())
+            stop_words = stopwords.STOP_WORDS or NO_STRINGS
+            totals[STOPWORDS] += sum(
+                1 for word in candidate_words if word in stop_words)
+
+    def get_id(self, node):
+        node_id = self.ids.get(node)
+        if node_id is None:
+            self.add(node)
+            node_id = self.ids[node]
+        return node_id
+
+    def text_length(self, node):
+        """len(parser.getText(node))
+        """
+        node_id = self.get_id(node)
+        fragments = self.table[node_id + TEXT_FRAGMENTS]
+        return self.table[node_id + TEXT_CHARS] + max(0, fragments - 1)
+
+    def word_count(self, node):
+        """nlp.word_count(parser.getText(node))
+        """
+        if node not in self.word_counts:
+            self.word_counts[node] = word_count(self.parser.getText(node))
+        return self.word_counts[node]
+
+    def stopword_count(self, node):
+        """extractor.count_stopwords(parser.getText(node))
+        """
+        if not self.language:
+            return None
+        if self.stopwords is None:
+            if node not in self.stopword_counts:
+                self.stopword_counts[node] = self.extractor.count_stopwords(
+                    self.parser.getText(node))
+            return self.stopword_counts[node]
+        node_id = self.get_id(node)
+        if not self.table[node_id + TEXT_FRAGMENTS]:
+            return 0
+        return self.table[node_id + STOPWORDS] or None
+
+    def is_highlink_density(self, node):
+        """See `ContentExtractor.is_highlink_density`, the text of the
+        links is joined without separator so the words at the seams of
+        two links count once
+        """
+        node_id = self.get_id(node)
+        row = self.table[node_id:node_id + NODE_STATS_COLUMNS]
+        num_links = float(row[LINKS])
+        if not num_links:
+            return False
+        words_number = float(row[ALNUM_WORDS])
+        if not words_number:
+            return True
+        num_link_words = float(
+            row[LINK_TOKENS] - max(0, row[TEXT_LINKS] - 1))
+        link_divisor = float(num_link_words / words_number)
+        score = float(link_divisor * num_links)
+        return score >= 1.0
+
 
 class ContentExtractor(object):
     MIN_STOPWORDS = 3
@@ -71,6 +213,41 @@ class ContentExtractor(object):
         self.parser = self.config.get_parser()
         self.language = config.language
         self.stopwords_class = config.stopwords_class
+        self._doc_index = None
+        self._node_stats = None
+        self.gravity_scores = {}
+        self.gravity_nodes = {}
+
+    def get_doc_index(self, doc):
+        """Returns the index of the meta tags and attributes of `doc`
+        the metadata extractors answer from, the one `index_document`
+        built if `doc` is its document. Any other document is queried
+        as is, its index is not built
+        """
+        if self._doc_index is not None and self._doc_index.doc is doc:
+            return self._doc_index
+        return self.parser.index_document(doc, built=False)
+
+    def index_document(self, doc):
+        """Indexes `doc` in one pass for the metadata extractors, until
+        `clear_doc_index`. `doc` must not be modified meanwhile
+        """
+        self._doc_index = self.parser.index_document(doc)
+
+    def clear_doc_index(self):
+        """Drops the document index, must be called before the indexed
+        document is modified
+        """
+        self._doc_index = None
+
+    def get_node_stats(self):
+        """Returns the text statistics of the nodes being scored, those
+        of the document given to `calculate_best_node` until
+        `post_cleanup` is done with its top node
+        """
+        if self._node_stats is None:
+            return NodeStats(self)
+        return self._node_stats
 
     def update_language(self, meta_lang):
         """Required to be called before the extraction process in some
@@ -152,11 +329,12 @@ class ContentExtractor(object):
         VALS = ['author', 'byline', 'dc.creator']
         matches = []
         authors = []
+        index = self.get_doc_index(doc)
 
         for attr in ATTRS:
             for val in VALS:
                 # found = doc.xpath('//*[@%s="%s"]' % (attr, val))
-                found = self.parser.getElementsByTag(doc, attr=attr, value=val)
+                found = index.getElementsByTag(attr=attr, value=val)
                 matches.extend(found)
 
         for match in matches:
@@ -257,9 +435,9 @@ class ContentExtractor(object):
             {'attribute': 'pubdate', 'value': 'pubdate',
              'content': 'datetime'},
         ]
+        index = self.get_doc_index(doc)
         for known_meta_tag in PUBLISH_DATE_TAGS:
-            meta_tags = self.parser.getElementsByTag(
-                doc,
+            meta_tags = index.getElementsByTag(
                 attr=known_meta_tag['attribute'],
                 value=known_meta_tag['value'])
             if meta_tags:
@@ -280,7 +458,7 @@ class ContentExtractor(object):
         :return:
         """
         kwargs = {'tag': 'base'}
-        base_element = self.parser.getElementsByTag(doc, **kwargs)
+        base_element = self.get_doc_index(doc).getElementsByTag(**kwargs)
         base_url = ''
         if base_element:
             base_url = self.parser.getAttribute(base_element[0], 'href')
@@ -304,12 +482,13 @@ class ContentExtractor(object):
         5. use title, after splitting
         """
         title = ''
+        index = self.get_doc_index(doc)
 
         kwargs = {'tag': 'meta', 'attr': 'property', 'value': 'og:title'}
-        title_element = self.parser.getElementsByTag(doc, **kwargs)
+        title_element = index.getElementsByTag(**kwargs)
 
         if title_element is None or len(title_element) == 0:
-            title_element = self.parser.getElementsByTag(doc, tag='title')
+            title_element = index.getElementsByTag(tag='title')
             # no title found
             if title_element is None or len(title_element) == 0:
                 return title
@@ -330,8 +509,7 @@ class ContentExtractor(object):
         # - too short texts (fewer than 2 words) are discarded
         # - clean double spaces
         title_text_h1 = ''
-        title_element_h1_list = self.parser.getElementsByTag(doc,
-                                                             tag='h1') or []
+        title_element_h1_list = index.getElementsByTag(tag='h1') or []
         title_text_h1_list = [self.parser.getText(tag) for tag in
                               title_element_h1_list]
         if title_text_h1_list:
@@ -484,7 +662,7 @@ class ContentExtractor(object):
         <link rel="icon" type="image/png" href="favicon.png" />
         """
         kwargs = {'tag': 'link', 'attr': 'rel', 'value': 'icon'}
-        meta = self.parser.getElementsByTag(doc, **kwargs)
+        meta = self.get_doc_index(doc).getElementsByTag(**kwargs)
         if meta:
             favicon = self.parser.getAttribute(meta[0], 'href')
             return urljoin(article_url, favicon)
@@ -502,8 +680,9 @@ class ContentExtractor(object):
                  'value': 'content-language'},
                 {'tag': 'meta', 'attr': 'name', 'value': 'lang'}
             ]
+            index = self.get_doc_index(doc)
             for item in items:
-                meta = self.parser.getElementsByTag(doc, **item)
+                meta = index.getElementsByTag(**item)
                 if meta:
                     attr = self.parser.getAttribute(
                         meta[0], attr='content')
@@ -522,7 +701,11 @@ class ContentExtractor(object):
             "meta[name=keywords]"
             "meta[property=og:type]"
         """
-        meta = self.parser.css_select(doc, metaname)
+        match = RE_META_SELECTOR.match(metaname)
+        if match:
+            meta = self.get_doc_index(doc).getMetaByAttribute(*match.groups())
+        else:
+            meta = self.parser.css_select(doc, metaname)
         content = None
         if meta is not None and len(meta) > 0:
             content = self.parser.getAttribute(meta[0], 'content')
@@ -538,7 +721,8 @@ class ContentExtractor(object):
         if not try_one:
             link_img_src_kwargs = \
                 {'tag': 'link', 'attr': 'rel', 'value': 'img_src|image_src'}
-            elems = self.parser.getElementsByTag(doc, use_regex=True, **link_img_src_kwargs)
+            elems = self.get_doc_index(doc).getElementsByTag(
+                use_regex=True, **link_img_src_kwargs)
             try_two = elems[0].get('href') if elems else None
 
             if not try_two:
@@ -546,7 +730,8 @@ class ContentExtractor(object):
 
                 if not try_three:
                     link_icon_kwargs = {'tag': 'link', 'attr': 'rel', 'value': 'icon'}
-                    elems = self.parser.getElementsByTag(doc, **link_icon_kwargs)
+                    elems = self.get_doc_index(doc).getElementsByTag(
+                        **link_icon_kwargs)
                     try_four = elems[0].get('href') if elems else None
 
         top_meta_image = try_one or try_two or try_three or try_four
@@ -572,7 +757,7 @@ class ContentExtractor(object):
 
     def get_meta_data(self, doc):
         data = defaultdict(dict)
-        properties = self.parser.css_select(doc, 'meta')
+        properties = self.get_doc_index(doc).getElementsByTag(tag='meta')
         for prop in properties:
             key = prop.attrib.get('property') or prop.attrib.get('name')
             value = prop.attrib.get('content') or prop.attrib.get('value')
@@ -617,8 +802,8 @@ class ContentExtractor(object):
         1. The rel=canonical tag
         2. The og:url tag
         """
-        links = self.parser.getElementsByTag(doc, tag='link', attr='rel',
-                                             value='canonical')
+        links = self.get_doc_index(doc).getElementsByTag(
+            tag='link', attr='rel', value='canonical')
 
         canonical = self.parser.getAttribute(links[0], 'href') if links else ''
         og_url = self.get_meta_content(doc, 'meta[property="og:url"]')
@@ -847,11 +1032,11 @@ class ContentExtractor(object):
     def extract_tags(self, doc):
         if len(list(doc)) == 0:
             return NO_STRINGS
-        elements = self.parser.css_select(
-            doc, A_REL_TAG_SELECTOR)
+        a_tags = self.get_doc_index(doc).getElementsByTag(tag='a')
+        elements = [a for a in a_tags if a.get('rel') == A_REL_TAG]
         if not elements:
-            elements = self.parser.css_select(
-                doc, A_HREF_TAG_SELECTOR)
+            elements = [a for a in a_tags if any(
+                path in a.get('href', '') for path in A_HREF_TAG_PATHS)]
             if not elements:
                 return NO_STRINGS
 
@@ -870,13 +1055,15 @@ class ContentExtractor(object):
         i = 0
         parent_nodes = []
         nodes_with_text = []
+        self._node_stats = stats = NodeStats(self, doc)
+        self.gravity_scores = {}
+        self.gravity_nodes = {}
 
         for node in nodes_to_check:
-            text_node = self.parser.getText(node)
-            stopwords = self.count_stopwords(text_node)
+            stopwords = stats.stopword_count(node)
             if stopwords is None:
-                stopwords = word_count(text_node)
-            high_link_density = self.is_highlink_density(node)
+                stopwords = stats.word_count(node)
+            high_link_density = stats.is_highlink_density(node)
             if stopwords >= self.MIN_STOPWORDS and not high_link_density:
                 nodes_with_text.append(node)
 
@@ -901,8 +1088,7 @@ class ContentExtractor(object):
                     if negscore > 40:
                         boost_score = float(5)
 
-            text_node = self.parser.getText(node)
-            stopwords = self.count_stopwords(text_node) or 0
+            stopwords = stats.stopword_count(node) or 0
             upscore = int(stopwords + boost_score)
 
             parent_node = self.parser.getParent(node)
@@ -934,6 +1120,8 @@ class ContentExtractor(object):
 
             if top_node is None:
                 top_node = e
+        if top_node is None:
+            self._node_stats = None
         return top_node
 
     def is_boostable(self, node):
@@ -947,6 +1135,7 @@ class ContentExtractor(object):
         steps_away = 0
         minimum_stopword_count = 5
         max_stepsaway_from_node = 3
+        stats = self.get_node_stats()
 
         nodes = self.walk_siblings(node)
         for current_node in nodes:
@@ -956,8 +1145,7 @@ class ContentExtractor(object):
                 continue
             if steps_away >= max_stepsaway_from_node:
                 return False
-            paragraph_text = self.parser.getText(current_node)
-            stopwords = self.count_stopwords(paragraph_text) or 0
+            stopwords = stats.stopword_count(current_node) or 0
             if stopwords > minimum_stopword_count:
                 return True
             steps_away += 1
@@ -982,8 +1170,9 @@ class ContentExtractor(object):
             self, current_sibling, baseline_score_siblings_para):
         """Adds any siblings that may have a decent score to this node
         """
+        stats = self.get_node_stats()
         if current_sibling.tag == 'p' and \
-                len(self.parser.getText(current_sibling)) > 0:
+                stats.text_length(current_sibling) > 0:
             e0 = current_sibling
             if e0.tail:
                 e0 = copy.deepcopy(e0)
@@ -995,18 +1184,17 @@ class ContentExtractor(object):
             return []
         ps = []
         for first_paragraph in potential_paragraphs:
-            text = self.parser.getText(first_paragraph)
-            if len(text) == 0:
+            if not stats.text_length(first_paragraph):
                 continue
-            paragraph_score = self.count_stopwords(text)
+            paragraph_score = stats.stopword_count(first_paragraph)
             if paragraph_score is None:
-                paragraph_score = word_count(text)
+                paragraph_score = stats.word_count(first_paragraph)
             sibling_baseline_score = float(.30)
-            high_link_density = self.is_highlink_density(
-                first_paragraph)
+            high_link_density = stats.is_highlink_density(first_paragraph)
             score = float(baseline_score_siblings_para *
                           sibling_baseline_score)
             if score < paragraph_score and not high_link_density:
+                text = self.parser.getText(first_paragraph)
                 p = self.parser.createElement(
                     tag='p', text=text, tail=None)
                 ps.append(p)
@@ -1025,13 +1213,13 @@ class ContentExtractor(object):
         paragraphs_number = 0
         paragraphs_score = 0
         nodes_to_check = self.parser.getElementsByTag(top_node, tag='p')
+        stats = self.get_node_stats()
 
         for node in nodes_to_check:
-            text_node = self.parser.getText(node)
-            stopwords = self.count_stopwords(text_node)
+            stopwords = stats.stopword_count(node)
             if stopwords is None:
-                stopwords = word_count(text_node)
-            high_link_density = self.is_highlink_density(node)
+                stopwords = stats.word_count(node)
+            high_link_density = stats.is_highlink_density(node)
             if stopwords >= self.MIN_STOPWORDS and not high_link_density:
                 paragraphs_number += 1
                 paragraphs_score += stopwords
@@ -1042,56 +1230,30 @@ class ContentExtractor(object):
         return base
 
     def update_score(self, node, add_to_score):
-        """Adds a score to the gravityScore Attribute we put on divs
-        we'll get the current score then add the score we're passing
-        in to the current.
+        """Adds a score to the gravity score we keep for the divs, by
+        node, out of the tree. The scores are those of the last document
+        given to `calculate_best_node`
         """
-        current_score = 0
-        score_string = self.parser.getAttribute(node, 'gravityScore')
-        if score_string:
-            current_score = float(score_string)
-
-        new_score = current_score + add_to_score
-        self.parser.setAttribute(node, "gravityScore", str(new_score))
+        self.gravity_scores[node] = \
+            self.gravity_scores.get(node, 0) + add_to_score
 
     def update_node_count(self, node, add_to_count):
         """Stores how many decent nodes are under a parent node
         """
-        current_score = 0
-        count_string = self.parser.getAttribute(node, 'gravityNodes')
-        if count_string:
-            current_score = int(count_string)
+        self.gravity_nodes[node] = \
+            self.gravity_nodes.get(node, 0) + add_to_count
 
-        new_score = current_score + add_to_count
-        self.parser.setAttribute(node, "gravityNodes", str(new_score))
+    def get_gravity_scores(self):
+        """Returns the gravity scores of the nodes of the last document
+        given to `calculate_best_node`, by node
+        """
+        return self.gravity_scores
 
     def is_highlink_density(self, e):
         """Checks the density of links within a node, if there is a high
         link to text ratio, then the text is less likely to be relevant
         """
-        links = self.parser.getElementsByTag(e, tag='a')
-        if not links:
-            return False
-
-        text = self.parser.getText(e)
-        words = [word for word in text.split() if word.isalnum()]
-        if not words:
-            return True
-        words_number = float(len(words))
-        sb = []
-        for link in links:
-            sb.append(self.parser.getText(link))
-
-        link_text = ''.join(sb)
-        link_words = link_text.split()
-        num_link_words = float(len(link_words))
-        num_links = float(len(links))
-        link_divisor = float(num_link_words / words_number)
-        score = float(link_divisor * num_links)
-        if score >= 1.0:
-            return True
-        return False
-        # return True if score > 1.0 else False
+        return self.get_node_stats().is_highlink_density(e)
 
     def get_score(self, node):
         """Returns the gravityScore as an integer from this node
@@ -1099,8 +1261,8 @@ class ContentExtractor(object):
         return self.get_node_gravity_score(node) or 0
 
     def get_node_gravity_score(self, node):
-        gravity_score = self.parser.getAttribute(node, 'gravityScore')
-        if not gravity_score:
+        gravity_score = self.gravity_scores.get(node)
+        if gravity_score is None:
             return None
         return float(gravity_score)
 
@@ -1141,9 +1303,11 @@ class ContentExtractor(object):
         or paras with no gusto; add adjacent nodes which look contenty
         """
         node = self.add_siblings(top_node)
+        stats = self.get_node_stats()
         for e in self.parser.getChildren(node):
             e_tag = self.parser.getTag(e)
             if e_tag != 'p':
-                if self.is_highlink_density(e):
+                if stats.is_highlink_density(e):
                     self.parser.remove(e)
+        self._node_stats = None
         return node
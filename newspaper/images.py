@@ -22,7 +22,9 @@ import urllib.parse
 import requests
 from PIL import Image, ImageFile
 
+from . import network
 from . import urls
+from .configuration import Configuration
 
 log = logging.getLogger(__name__)
 
@@ -97,26 +99,65 @@ def clean_url(url):
     return url
 
 
-def fetch_url(url, useragent, referer=None, retries=1, dimension=False):
+def read_body(response, size_limit):
+    """Reads the decompressed body of a streamed response, None as soon
+    as it grows past `size_limit` bytes
+    """
+    chunks = []
+    size = 0
+    for chunk in network.iter_content(response):
+        size += len(chunk)
+        if size >= size_limit:
+            log.debug('image is too big: %s' % response.url)
+            return None
+        chunks.append(chunk)
+    return b''.join(chunks)
+
+
+def fetch_url(url, useragent, referer=None, retries=1, dimension=False,
+              config=None):
     cur_try = 0
     url = clean_url(url)
     if not url.startswith(('http://', 'https://')):
         return None, None
 
+    size_limit = (config or Configuration()).size_limit
+    session = network.get_session(config)
+    cache = network.get_http_cache(config) if config is not None else None
+    headers = {
+        'User-Agent': useragent,
+        'Referer': referer,
+    }
+    entry = None
+    if cache is not None:
+        entry = cache.get(url)
+        headers = cache.conditional_headers(entry, headers)
     response = None
     while True:
+        # a fully read body lets the connection go back to the pool,
+        # a partial read (dimension only) forces us to drop it
+        body_consumed = False
+        from_cache = False
+        # the rest of a partially read body, a cached one is read whole
+        chunks = iter(())
         try:
-            response = requests.get(url, stream=True, timeout=5, headers={
-                'User-Agent': useragent,
-                'Referer': referer,
-            })
+            response = session.get(url, stream=True, timeout=5,
+                                   headers=headers)
 
+            if entry is not None and response.status_code == 304:
+                cache.revalidated(url, entry, response)
+                content = response.content
+                body_consumed = from_cache = True
             # if we only need the dimension of the image, we may not
             # need to download the entire thing
-            if dimension:
-                content = response.raw.read(chunk_size)
+            elif dimension:
+                chunks = network.iter_content(response, chunk_size)
+                content = next(chunks, b'')
             else:
-                content = response.raw.read()
+                content = read_body(response, size_limit)
+                if content is None:
+                    return None, None
+                body_consumed = True
 
             content_type = response.headers.get('Content-Type')
 
@@ -128,6 +169,9 @@ def fetch_url(url, useragent, referer=None, retries=1, dimension=False):
                 p = ImageFile.Parser()
                 new_data = content
                 while not p.image and new_data:
+                    if len(content) >= size_limit:
+                        p = None
+                        break
                     try:
                         p.feed(new_data)
                     except IOError:
@@ -148,7 +192,7 @@ def fetch_url(url, useragent, referer=None, retries=1, dimension=False):
                             raise e
                         p = None
                         break
-                    new_data = response.raw.read(chunk_size)
+                    new_data = next(chunks, b'')
                     content += new_data
 
                 if p is None:
@@ -162,6 +206,8 @@ def fetch_url(url, useragent, referer=None, retries=1, dimension=False):
                 # expected an image, but didn't get one
                 return None, None
 
+            if cache is not None and body_consumed and not from_cache:
+                cache.store(url, response, content)
             return content_type, content
 
         except (requests.exceptions.RequestException, ConnectionResetError, ConnectionError, HTTPException, HTTPError):
@@ -172,13 +218,16 @@ def fetch_url(url, useragent, referer=None, retries=1, dimension=False):
                 return None, None
         finally:
             if response is not None:
-                response.raw.close()
-                if response.raw._connection:
-                    response.raw._connection.close()
+                if body_consumed:
+                    response.raw.release_conn()
+                else:
+                    response.close()
 
 
-def fetch_image_dimension(url, useragent, referer=None, retries=1):
-    return fetch_url(url, useragent, referer, retries, dimension=True)
+def fetch_image_dimension(url, useragent, referer=None, retries=1,
+                          config=None):
+    return fetch_url(url, useragent, referer, retries, dimension=True,
+                     config=config)
 
 
 class Scraper:
@@ -260,7 +309,8 @@ class Scraper:
                     dimensions = (None, None)
             else:
                 dimensions = fetch_image_dimension(
-                    img_url, self.useragent, referer=self.url)
+                    img_url, self.useragent, referer=self.url,
+                    config=self.config)
 
             self._fetched[img_url]['dimensions'] = dimensions
         return self._fetched[img_url]['dimensions']
@@ -270,7 +320,8 @@ class Scraper:
             if img_url not in self._fetched:
                 self._fetched[img_url] = {}
             self._fetched[img_url]['image'] = fetch_url(img_url, self.useragent,
-                                                        referer=self.url)
+                                                        referer=self.url,
+                                                        config=self.config)
         return self._fetched[img_url]['image']
 
     def phash(self, img_url):
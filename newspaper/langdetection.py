@@ -0,0 +1,295 @@
+# -*- coding: utf-8 -*-
+"""
+Detection of the language of articles. Only a bounded sample of the text
+is looked at, the script settles the language of the scripts a single
+language is written in and the statistical detector is only the last
+resort.
+"""
+__title__ = 'newspaper'
+__author__ = 'Lucas Ou-Yang'
+__license__ = 'MIT'
+__copyright__ = 'Copyright 2014, Lucas Ou-Yang'
+
+import re
+import threading
+from collections import OrderedDict
+
+from .parsers import Parser
+from .text import StopWords
+from .utils import get_available_languages
+
+# Characters of text looked at, and read to pick them
+SAMPLE_SIZE = 1024
+SCAN_SIZE = 32768
+
+# The content of these tags is not text of the page
+SKIPPED_TAGS = frozenset([
+    'script', 'style', 'noscript', 'template', 'iframe', 'object', 'embed',
+    'applet', 'svg', 'math', 'select', 'textarea'])
+
+LETTER_RE = re.compile(r'[^\W\d_]')
+
+# A script tells the language of a sample holding `MIN_SCRIPT_LETTERS`
+# letters when `SCRIPT_SHARE` of them are in it. Each script comes with
+# its letters, the letters only some of the languages written in it use,
+# tried in order and found once they are `MARKER_SHARE` of the letters of
+# the script, and the language left when none is found. A script shared
+# by languages with no such letters has no language and the statistical
+# detector picks one.
+MIN_SCRIPT_LETTERS = 32
+SCRIPT_SHARE = 0.5
+MARKER_SHARE = 0.01
+SCRIPTS = (
+    # Hangul
+    ('\u1100-\u11ff\u3130-\u318f\uac00-\ud7af', (), 'ko'),
+    # Han and kana
+    ('\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff',
+     (('\u3040-\u30ff', 'ja'),), 'zh'),
+    # Arabic, Urdu then Persian letters
+    ('\u0600-\u06ff\u0750-\u077f\ufb50-\ufdff\ufe70-\ufeff',
+     (('\u0679\u0688\u0691\u06ba\u06be\u06c1\u06d2', 'ur'),
+      ('\u067e\u0686\u0698\u06a9\u06af\u06cc', 'fa')), 'ar'),
+    # Cyrillic, Ukrainian, Macedonian then Russian letters, Bulgarian has
+    # none of its own
+    ('\u0400-\u04ff',
+     (('\u0404\u0406\u0407\u0454\u0456\u0457\u0490\u0491', 'uk'),
+      ('\u0403\u0405\u0408\u0409\u040a\u040c\u040f'
+       '\u0453\u0455\u0458\u0459\u045a\u045c\u045f', 'mk'),
+      ('\u0401\u042b\u042d\u0451\u044b\u044d', 'ru')), 'bg'),
+    # Devanagari, Hindi, Marathi and Nepali are told apart by words
+    ('\u0900-\u097f', (), None),
+    ('\u0370-\u03ff\u1f00-\u1fff', (), 'el'),
+    ('\u0590-\u05ff', (), 'he'),
+    ('\u0e00-\u0e7f', (), 'th'),
+    ('\u0980-\u09ff', (), 'bn'),
+    ('\u0a00-\u0a7f', (), 'pa'),
+    ('\u0a80-\u0aff', (), 'gu'),
+    ('\u0b80-\u0bff', (), 'ta'),
+    ('\u0c00-\u0c7f', (), 'te'),
+    ('\u0c80-\u0cff', (), 'kn'),
+    ('\u0d00-\u0d7f', (), 'ml'),
+)
+_scripts = [(re.compile('[%s]' % letters),
+             [(re.compile('[%s]' % marker), marked_language)
+              for marker, marked_language in markers],
+             language)
+            for letters, markers, language in SCRIPTS]
+
+# The language a page declares is trusted when this share of the words
+# of the sample at least are its stopwords, and no other language has
+# more
+META_STOPWORD_SHARE = 0.15
+
+_language_caches = {}
+_language_caches_lock = threading.Lock()
+
+
+class LanguageDetector(object):
+    """Statistical detector of the language of texts, for the texts whose
+    script does not tell it. An instance of a subclass can be set as
+    `Configuration.language_detector`.
+    """
+    def detect(self, text):
+        """Returns the 2 char code of the language of `text`, None if it
+        is unknown
+        """
+        raise NotImplementedError
+
+
+class LangdetectDetector(LanguageDetector):
+    """langdetect, with its profiles loaded once and a fixed seed so the
+    same text always gets the same language
+    """
+    _factory = None
+    _factory_lock = threading.Lock()
+
+    @classmethod
+    def get_factory(cls):
+        with cls._factory_lock:
+            if cls._factory is None:
+                from langdetect.detector_factory import (
+                    DetectorFactory, PROFILES_DIRECTORY)
+                factory = DetectorFactory()
+                factory.load_profile(PROFILES_DIRECTORY)
+                factory.set_seed(0)
+                cls._factory = factory
+        return cls._factory
+
+    def detect(self, text):
+        from langdetect.lang_detect_exception import LangDetectException
+        detector = self.get_factory().create()
+        detector.append(text)
+        try:
+            language = detector.detect()
+        except LangDetectException:
+            return None
+        # zh-cn and zh-tw
+        return language.split('-')[0]
+
+
+class LanguageCache(object):
+    """Remembers the language confirmed for the pages of a domain
+    declaring a language, the least recently used of the `size` pairs
+    kept are dropped first.
+    """
+    def __init__(self, size):
+        self.size = size
+        self.languages = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, domain, meta_lang):
+        key = (domain, meta_lang)
+        with self.lock:
+            language = self.languages.get(key)
+            if language is not None:
+                self.languages.move_to_end(key)
+        return language
+
+    def set(self, domain, meta_lang, language):
+        with self.lock:
+            self.languages[(domain, meta_lang)] = language
+            self.languages.move_to_end((domain, meta_lang))
+            while len(self.languages) > self.size:
+                self.languages.popitem(last=False)
+
+
+def get_language_cache(config):
+    """Returns the process-wide `LanguageCache` of the config, None when
+    `config.language_cache_size` disables it
+    """
+    if not config.language_cache_size:
+        return None
+    with _language_caches_lock:
+        cache = _language_caches.get(config.language_cache_size)
+        if cache is None:
+            cache = _language_caches[config.language_cache_size] = \
+                LanguageCache(config.language_cache_size)
+    return cache
+
+
+def get_detector(config):
+    return config.language_detector or LangdetectDetector()
+
+
+def _sample(fragments, size):
+    """Joins the `fragments` of text up to `size` characters. When they
+    are longer the longest are kept, prose rather than menus and buttons,
+    in the order they come in
+    """
+    total = sum(len(f) for f in fragments) + len(fragments)
+    if total <= size:
+        return ' '.join(fragments)
+    kept = {}
+    for i in sorted(range(len(fragments)), key=lambda j: -len(fragments[j])):
+        kept[i] = fragments[i][:size]
+        size -= len(fragments[i]) + 1
+        if size <= 0:
+            break
+    return ' '.join(kept[i] for i in sorted(kept))
+
+
+def get_text_sample(text, size=SAMPLE_SIZE):
+    """Sample of at most about `size` characters of `text` for
+    detecting its language
+    """
+    fragments = []
+    for line in text[:SCAN_SIZE].splitlines():
+        line = ' '.join(line.split())
+        if line:
+            fragments.append(line)
+    return _sample(fragments, size)
+
+
+def get_node_sample(node, size=SAMPLE_SIZE):
+    """Sample of at most about `size` characters of the text of `node`
+    for detecting its language, scripts, styles and embedded content are
+    left out and only the text in the first `SCAN_SIZE` characters is
+    considered
+    """
+    fragments = []
+    scanned = 0
+    walker = Parser.walk(node)
+    for event, n in walker:
+        if event == 'start':
+            if n.tag in SKIPPED_TAGS:
+                walker.skip_subtree()
+                continue
+            text = n.text
+        elif n is node:
+            break
+        else:
+            # the tail of an element, a comment or a processing instruction
+            text = n.tail
+        if text:
+            text = ' '.join(text.split())
+            if text:
+                fragments.append(text)
+                scanned += len(text)
+                if scanned >= SCAN_SIZE:
+                    break
+    return _sample(fragments, size)
+
+
+def get_script_language(text):
+    """Language of `text` told by its script, None if it is written in
+    no script or a script several languages are written in alike
+    """
+    letters = ''.join(LETTER_RE.findall(text))
+    if len(letters) < MIN_SCRIPT_LETTERS:
+        return None
+    for script, markers, language in _scripts:
+        count = len(script.findall(letters))
+        if count < len(letters) * SCRIPT_SHARE:
+            continue
+        for marker, marked_language in markers:
+            if len(marker.findall(letters)) >= count * MARKER_SHARE:
+                return marked_language
+        return language
+    return None
+
+
+def is_in_language(text, language, config):
+    """Whether `META_STOPWORD_SHARE` of the words of `text` at least are
+    stopwords of `language`, and more than are those of any other
+    language written with spaces between words
+    """
+    languages = get_available_languages()
+    if language not in languages:
+        return False
+    shares = {}
+    for other in languages:
+        stopwords_class = config.get_stopwords_class(other)
+        if other != language and stopwords_class is not StopWords:
+            continue
+        word_stats = stopwords_class(language=other).get_stopword_count(text)
+        # the stopword count is None when there are none
+        shares[other] = (word_stats.get_stopword_count() or 0) / \
+            max(word_stats.get_word_count(), 1)
+    share = shares[language]
+    return share >= META_STOPWORD_SHARE and share == max(shares.values())
+
+
+def detect_language(sample, config, meta_lang=None, domain=None):
+    """Language of the text `sample` is taken from, None if unknown. The
+    language confirmed before for pages of `domain` declaring `meta_lang`
+    comes first, then the script of the sample, `meta_lang` itself when
+    `config.trust_meta_language` is set and its stopwords are found, and
+    finally the detector of the config. Languages agreeing with
+    `meta_lang` are remembered for the domain.
+    """
+    cache = get_language_cache(config) if meta_lang and domain else None
+    if cache is not None:
+        language = cache.get(domain, meta_lang)
+        if language is not None:
+            return language
+
+    language = get_script_language(sample)
+    if language is None and meta_lang and config.trust_meta_language and \
+            is_in_language(sample, meta_lang, config):
+        language = meta_lang
+    if language is None and sample:
+        language = get_detector(config).detect(sample)
+
+    if cache is not None and language == meta_lang:
+        cache.set(domain, meta_lang, language)
+    return language
@@ -9,12 +9,23 @@ __author__ = 'Lucas Ou-Yang'
 __license__ = 'MIT'
 __copyright__ = 'Copyright 2014, Lucas Ou-Yang'
 
+import asyncio
 import queue
+import threading
+import time
 import traceback
+from collections import OrderedDict, defaultdict, deque
+from contextlib import contextmanager
 from threading import Thread
+from urllib.parse import urlsplit
 
 from .configuration import Configuration
 
+# Marks threads run by a `HostScheduler`, their requests already hold a
+# politeness slot so the network layer must not acquire another one. The
+# limiter and host of that slot are kept as `slot`
+_local = threading.local()
+
 
 class Worker(Thread):
     """
@@ -55,16 +66,267 @@ class ThreadPool:
         self.tasks.join()
 
 
+class TokenBucket(object):
+    """Holds up to `capacity` tokens and refills `rate` tokens per second,
+    every request to a host consumes one token
+    """
+    def __init__(self, rate, capacity=1):
+        self.rate = float(rate)
+        self.capacity = max(1, capacity)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+
+    def consume(self):
+        """Takes a token if one is available and returns 0, otherwise
+        returns the number of seconds until the next token
+        """
+        now = time.monotonic()
+        self.tokens = min(self.capacity,
+                          self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+
+class HostLimiter(object):
+    """Enforces per host politeness: a token bucket rate of `rate` requests
+    per second (bursting up to `burst`), at most `per_host` concurrent
+    requests per host and at most `max_in_flight` requests overall. Any of
+    the limits may be None to disable it.
+    """
+    def __init__(self, rate=None, burst=1, per_host=None, max_in_flight=None):
+        self.rate = rate
+        self.burst = burst
+        self.per_host = per_host
+        self.max_in_flight = max_in_flight
+        self.buckets = {}
+        self.active = defaultdict(int)
+        self.in_flight = 0
+        self.cond = threading.Condition(threading.RLock())
+
+    def try_acquire(self, host):
+        """Returns 0 if a slot for `host` was taken, the seconds to wait
+        for the next token or None if we must wait for a release
+        """
+        with self.cond:
+            if self.max_in_flight and self.in_flight >= self.max_in_flight:
+                return None
+            if self.per_host and self.active[host] >= self.per_host:
+                return None
+            if self.rate:
+                bucket = self.buckets.get(host)
+                if bucket is None:
+                    bucket = self.buckets[host] = TokenBucket(
+                        self.rate, self.burst)
+                delay = bucket.consume()
+                if delay:
+                    return delay
+            self.active[host] += 1
+            self.in_flight += 1
+            return 0
+
+    def acquire(self, host):
+        with self.cond:
+            while True:
+                delay = self.try_acquire(host)
+                if delay == 0:
+                    return
+                self.cond.wait(delay)
+
+    async def aacquire(self, host):
+        """Event loop version of `acquire`, slots released by other
+        threads or tasks are polled for
+        """
+        while True:
+            delay = self.try_acquire(host)
+            if delay == 0:
+                return
+            await asyncio.sleep(ASYNC_POLL_INTERVAL if delay is None
+                                else delay)
+
+    def release(self, host):
+        with self.cond:
+            self.active[host] -= 1
+            if not self.active[host]:
+                del self.active[host]
+            self.in_flight -= 1
+            self.cond.notify_all()
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+# Seconds between two checks of an event loop task waiting for a slot
+ASYNC_POLL_INTERVAL = 0.05
+
+
+def get_host_limiter(config):
+    """Returns the process-wide `HostLimiter` for the politeness settings
+    of `config`, None if no limit is configured
+    """
+    key = (config.host_rate_limit, config.host_rate_burst,
+           config.max_connections_per_host, config.max_in_flight)
+    if not any((config.host_rate_limit, config.max_connections_per_host,
+                config.max_in_flight)):
+        return None
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limiter = _limiters[key] = HostLimiter(*key)
+    return limiter
+
+
+def get_host(url):
+    return urlsplit(url).hostname or ''
+
+
+@contextmanager
+def host_slot(url, config):
+    """Holds a politeness slot for the host of `url` while a request is
+    made. Requests dispatched by a `HostScheduler` got their slot from it.
+    """
+    limiter = get_host_limiter(config)
+    if limiter is None or getattr(_local, 'scheduled', False):
+        yield
+        return
+    host = get_host(url)
+    limiter.acquire(host)
+    try:
+        yield
+    finally:
+        limiter.release(host)
+
+
+@contextmanager
+def host_slot_released():
+    """Gives back the politeness slot a `HostScheduler` task holds while it
+    waits, e.g. before a retry, and takes a fresh one afterwards, so the
+    wait neither blocks other requests to the host nor saves a token
+    """
+    slot = getattr(_local, 'slot', None)
+    if slot is None:
+        yield
+        return
+    limiter, host = slot
+    limiter.release(host)
+    try:
+        yield
+    finally:
+        limiter.acquire(host)
+
+
+class AsyncHostSlot(object):
+    """Event loop version of `host_slot`, holds a politeness slot for the
+    host of `url` while a request is made without blocking the loop
+
+    >>> async with AsyncHostSlot(url, config):
+    ...     await session.get(url)
+    """
+    def __init__(self, url, config):
+        self.limiter = get_host_limiter(config)
+        if getattr(_local, 'scheduled', False):
+            self.limiter = None
+        self.host = get_host(url)
+
+    async def __aenter__(self):
+        if self.limiter is not None:
+            await self.limiter.aacquire(self.host)
+
+    async def __aexit__(self, *args):
+        if self.limiter is not None:
+            self.limiter.release(self.host)
+
+
+class HostScheduler(object):
+    """Thread pool which queues tasks per host and hands each worker the
+    task of whichever host is allowed to be requested next by the
+    `HostLimiter`. Work of many hosts is interleaved round robin, so a
+    slow or rate limited host never idles the pool.
+    """
+    def __init__(self, num_threads, limiter=None):
+        self.limiter = limiter
+        self.cond = limiter.cond if limiter else threading.Condition()
+        self.queues = OrderedDict()
+        self.pending = 0
+        self.closed = False
+        for _ in range(num_threads):
+            t = Thread(target=self._work)
+            t.daemon = True
+            t.start()
+
+    def add_task(self, url, func, *args, **kargs):
+        host = get_host(url)
+        with self.cond:
+            if host not in self.queues:
+                self.queues[host] = deque()
+            self.queues[host].append((func, args, kargs))
+            self.pending += 1
+            self.cond.notify_all()
+
+    def wait_completion(self):
+        with self.cond:
+            while self.pending:
+                self.cond.wait()
+            self.closed = True
+            self.cond.notify_all()
+
+    def _next_task(self):
+        with self.cond:
+            while True:
+                if not self.queues and self.closed:
+                    return None, None
+                wait = None
+                for host in list(self.queues):
+                    delay = self.limiter.try_acquire(host) \
+                        if self.limiter else 0
+                    if delay == 0:
+                        tasks = self.queues[host]
+                        task = tasks.popleft()
+                        if tasks:
+                            self.queues.move_to_end(host)
+                        else:
+                            del self.queues[host]
+                        return host, task
+                    if delay is not None:
+                        wait = delay if wait is None else min(wait, delay)
+                self.cond.wait(wait)
+
+    def _work(self):
+        _local.scheduled = True
+        while True:
+            host, task = self._next_task()
+            if task is None:
+                break
+            func, args, kargs = task
+            _local.slot = (self.limiter, host) if self.limiter else None
+            try:
+                func(*args, **kargs)
+            except Exception:
+                traceback.print_exc()
+            finally:
+                _local.slot = None
+                with self.cond:
+                    if self.limiter:
+                        self.limiter.release(host)
+                    self.pending -= 1
+                    self.cond.notify_all()
+
+
 class NewsPool(object):
 
     def __init__(self, config=None):
         """
-        Abstraction of a threadpool. A newspool can accept any number of
-        source OR article objects together in a list. It allocates one
-        thread to every source and then joins.
+        Abstraction of a threadpool. A newspool accepts a source or any
+        number of source objects together in a list. Each article of
+        the sources is downloaded on its own, queued on a `HostScheduler`
+        which interleaves the work of all sources, and then joins.
 
-        We allocate one thread per source to avoid rate limiting.
-        5 sources = 5 threads, one per source.
+        We allow `threads_per_source` concurrent requests per host to
+        avoid rate limiting, unless the config sets its own politeness
+        limits. 5 sources = 5 threads with the default of one thread per
+        source.
 
         >>> import newspaper
         >>> from newspaper import news_pool
@@ -95,14 +357,24 @@ class NewsPool(object):
                   'objects before .join(..)')
             raise
         self.pool.wait_completion()
+        for paper in self.papers:
+            paper._finish_articles_download()
         self.papers = []
         self.pool = None
 
     def set(self, paper_list, threads_per_source=1):
+        """Queues the download of every article of the sources of
+        `paper_list`, or of the single source it is
+        """
+        if hasattr(paper_list, 'articles'):
+            paper_list = [paper_list]
         self.papers = paper_list
         num_threads = threads_per_source * len(self.papers)
-        timeout = self.config.thread_timeout_seconds
-        self.pool = ThreadPool(num_threads, timeout)
+        limiter = get_host_limiter(self.config) or \
+            HostLimiter(per_host=threads_per_source)
+        self.pool = HostScheduler(num_threads, limiter)
 
         for paper in self.papers:
-            self.pool.add_task(paper.download_articles)
+            for article in paper.articles:
+                self.pool.add_task(article.url, paper._download_article,
+                                   article)
@@ -3,14 +3,35 @@
 All code involving requests and responses over the http network
 must be abstracted in this file.
 """
+import asyncio
+import hashlib
 import os
-import subprocess
+import pickle
+import random
+import re
+import socket
+import threading
+import time
+import zlib
+from collections import OrderedDict
 from contextlib import closing
-from http.client import HTTPException
-from urllib.parse import urljoin
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from http.client import HTTPException, responses
+from urllib.parse import urlsplit
 
 from requests import RequestException
-from requests.packages.urllib3.exceptions import HTTPError
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+from requests.packages.urllib3.connection import (
+    HTTPConnection, HTTPSConnection)
+from requests.packages.urllib3.connectionpool import (
+    HTTPConnectionPool, HTTPSConnectionPool)
+from requests.packages.urllib3.exceptions import (
+    DecodeError, HTTPError, NewConnectionError, ProtocolError,
+    ReadTimeoutError, SSLError)
+from requests.packages.urllib3.util.connection import allowed_gai_family
 
 from . import CASPERJS_PATH
 
@@ -23,14 +44,369 @@ import logging
 import requests
 
 from .configuration import Configuration
-from .mthreading import ThreadPool
-from .settings import cj
+from .mthreading import (AsyncHostSlot, HostScheduler, get_host,
+                         get_host_limiter, host_slot, host_slot_released)
+from .warc import get_warc_writer
 
 log = logging.getLogger()
 
 
 FAIL_ENCODING = 'ISO-8859-1'
 
+# Bodies are streamed in chunks of CHUNK_SIZE bytes, the first SNIFF_SIZE
+# bytes are checked against the signatures of binary payloads
+CHUNK_SIZE = 16384
+SNIFF_SIZE = 512
+BINARY_SIGNATURES = (
+    b'%PDF', b'\x89PNG', b'GIF87a', b'GIF89a', b'\xff\xd8\xff', b'PK\x03\x04',
+    b'\x1f\x8b', b'BZh', b'7z\xbc\xaf', b'Rar!', b'RIFF', b'OggS', b'fLaC',
+    b'ID3', b'\x1aE\xdf\xa3', b'FWS', b'CWS', b'\x00\x00\x01\x00', b'MZ',
+    b'\x7fELF', b'wOFF', b'wOF2',
+)
+UTF16_BOMS = (b'\xff\xfe', b'\xfe\xff')
+
+CHARSET_RE = re.compile(r'charset\s*=\s*["\']?([\w.:+-]+)', re.IGNORECASE)
+
+# Failures worth another try, they also count against the circuit breaker
+RETRY_STATUSES = frozenset([429, 500, 502, 503, 504])
+RETRY_ERRORS = (requests.ConnectionError, requests.Timeout,
+                requests.exceptions.ChunkedEncodingError)
+
+# Response headers kept along with a cached body, the validators are
+# refreshed from every 304
+CACHED_HEADERS = ('content-type', 'etag', 'last-modified')
+
+_dns_caches = {}
+_dns_caches_lock = threading.Lock()
+_sessions = {}
+_sessions_lock = threading.Lock()
+_caches = {}
+_caches_lock = threading.Lock()
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+class DNSCache(object):
+    """Caches the `getaddrinfo` records of host names for `ttl` seconds,
+    so the many connections a source crawl opens to the same hosts skip
+    the resolver.
+    """
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.records = {}
+        self.lock = threading.Lock()
+
+    def resolve(self, host, port):
+        key = (host, port)
+        now = time.monotonic()
+        with self.lock:
+            expires, records = self.records.get(key, (0, None))
+        if expires > now:
+            return records
+        records = socket.getaddrinfo(host, port, allowed_gai_family(),
+                                     socket.SOCK_STREAM)
+        with self.lock:
+            self.records[key] = (now + self.ttl, records)
+        return records
+
+    def invalidate(self, host, port):
+        with self.lock:
+            self.records.pop((host, port), None)
+
+
+def get_dns_cache(config):
+    """Returns the process-wide `DNSCache` of the config, None when
+    `config.dns_cache_ttl` disables it
+    """
+    if not config.dns_cache_ttl:
+        return None
+    with _dns_caches_lock:
+        dns_cache = _dns_caches.get(config.dns_cache_ttl)
+        if dns_cache is None:
+            dns_cache = _dns_caches[config.dns_cache_ttl] = \
+                DNSCache(config.dns_cache_ttl)
+    return dns_cache
+
+
+class CachedDNSConnectionMixin(object):
+    """Makes an urllib3 connection open its socket to the address cached by
+    `dns_cache` instead of resolving its host. The host name itself is kept
+    for the Host header, SNI and certificate checks. The records of a host
+    are dropped once none of its addresses accepts a connection.
+    """
+    dns_cache = None
+
+    def _new_conn(self):
+        host = self._dns_host
+        try:
+            records = self.dns_cache.resolve(host, self.port)
+        except socket.gaierror as e:
+            raise NewConnectionError(
+                self, 'Failed to resolve {}: {}'.format(host, e)) from e
+        except UnicodeError:
+            # invalid idna label, urllib3 raises its own error
+            return super(CachedDNSConnectionMixin, self)._new_conn()
+        error = None
+        try:
+            # every address is tried in turn, like a plain resolution does
+            for record in records:
+                self._dns_host = record[4][0]
+                try:
+                    return super(CachedDNSConnectionMixin, self)._new_conn()
+                except HTTPError as e:
+                    error = e
+        finally:
+            self._dns_host = host
+        self.dns_cache.invalidate(host, self.port)
+        raise error
+
+
+class DNSCachingAdapter(HTTPAdapter):
+    """`HTTPAdapter` whose pooled connections resolve hosts through a
+    `DNSCache`
+    """
+    def __init__(self, dns_cache, **kwargs):
+        self.dns_cache = dns_cache
+        super(DNSCachingAdapter, self).__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super(DNSCachingAdapter, self).init_poolmanager(*args, **kwargs)
+        attrs = {'dns_cache': self.dns_cache}
+        http_connection = type('HTTPConnection', (
+            CachedDNSConnectionMixin, HTTPConnection), attrs)
+        https_connection = type('HTTPSConnection', (
+            CachedDNSConnectionMixin, HTTPSConnection), attrs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': type('HTTPConnectionPool', (HTTPConnectionPool,),
+                         {'ConnectionCls': http_connection}),
+            'https': type('HTTPSConnectionPool', (HTTPSConnectionPool,),
+                          {'ConnectionCls': https_connection}),
+        }
+
+
+def get_session(config=None):
+    """Returns the process-wide `requests.Session` matching the connection
+    pool settings of the config. The session keeps one pool of keep-alive
+    connections per host and a cookie jar which persists cookies per domain,
+    so every download from the same host reuses its TCP and TLS connection.
+    Sessions are shared between threads, urllib3 pools and the cookie jar
+    are both guarded by their own locks.
+    """
+    config = config or Configuration()
+    key = (config.pool_connections, config.pool_maxsize, config.keep_alive,
+           config.dns_cache_ttl)
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = requests.Session()
+            dns_cache = get_dns_cache(config)
+            if dns_cache is not None:
+                adapter = DNSCachingAdapter(
+                    dns_cache, pool_connections=config.pool_connections,
+                    pool_maxsize=config.pool_maxsize)
+            else:
+                adapter = HTTPAdapter(
+                    pool_connections=config.pool_connections,
+                    pool_maxsize=config.pool_maxsize)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            # brotli and zstd are asked for when their modules are installed,
+            # requests only asks for gzip and deflate
+            session.headers['Accept-Encoding'] = ACCEPT_ENCODING
+            if not config.keep_alive:
+                session.headers['Connection'] = 'close'
+            _sessions[key] = session
+    return session
+
+
+def prewarm(urls, config=None):
+    """Resolves the hosts of `urls` and opens one pooled keep-alive
+    connection to each of them in parallel, no request is sent. Later
+    downloads from these hosts skip the DNS lookup and the TCP and TLS
+    handshakes.
+    """
+    config = config or Configuration()
+    session = get_session(config)
+    origins = OrderedDict()
+    for url in urls:
+        parts = urlsplit(url)
+        if parts.scheme in ('http', 'https') and parts.hostname:
+            origins.setdefault((parts.scheme, parts.netloc), url)
+
+    def connect(url):
+        try:
+            # the same settings as a request, so the connection lands in
+            # the pool later downloads draw from
+            settings = session.merge_environment_settings(
+                url, config.proxies, None, None, None)
+            adapter = session.get_adapter(url)
+            if hasattr(adapter, 'get_connection_with_tls_context'):
+                pool = adapter.get_connection_with_tls_context(
+                    requests.Request('GET', url).prepare(),
+                    settings['verify'], settings['proxies'], settings['cert'])
+            else:
+                pool = adapter.get_connection(url, settings['proxies'])
+            conn = pool._get_conn()
+            try:
+                conn.connect()
+            except Exception:
+                conn.close()
+                raise
+            pool._put_conn(conn)
+        except Exception as e:
+            log.debug('Prewarming %s failed: %s' % (url, e))
+
+    pool = HostScheduler(config.number_threads)
+    for url in origins.values():
+        pool.add_task(url, connect, url)
+    pool.wait_completion()
+
+
+def close_sessions():
+    """Closes all pooled connections and forgets the persisted cookies
+    """
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+
+class HTTPCache(object):
+    """On-disk cache of response bodies keyed by url. Only 200 responses
+    carrying an `ETag` or `Last-Modified` validator are stored, they are
+    revalidated with `If-None-Match` / `If-Modified-Since` and a 304 is
+    answered with the stored body. Entries are pickled one per file, the
+    least recently used ones are evicted once the directory grows past
+    `max_size` bytes.
+    """
+    def __init__(self, directory, max_size):
+        self.directory = directory
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        self.size = sum(size for _, _, size in self._entries())
+
+    def _path(self, url):
+        key = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, key)
+
+    def _entries(self):
+        """Yields (mtime, path, size) of every cache file
+        """
+        for entry in os.scandir(self.directory):
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            yield stat.st_mtime, entry.path, stat.st_size
+
+    def get(self, url):
+        """Returns the cached entry of `url`, None on a miss
+        """
+        try:
+            with open(self._path(url), 'rb') as f:
+                return pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+
+    def conditional_headers(self, entry, headers):
+        """Returns a copy of the request `headers` with the validators of
+        the cached `entry` added
+        """
+        headers = dict(headers)
+        if entry is not None:
+            if entry['headers'].get('etag'):
+                headers['If-None-Match'] = entry['headers']['etag']
+            if entry['headers'].get('last-modified'):
+                headers['If-Modified-Since'] = \
+                    entry['headers']['last-modified']
+        return headers
+
+    def revalidated(self, url, entry, response):
+        """Turns the 304 `response` into the cached 200 response of `url`
+        """
+        headers = CaseInsensitiveDict(entry['headers'])
+        for name in CACHED_HEADERS[1:]:
+            if name in response.headers:
+                headers[name] = response.headers[name]
+        response.status_code = entry['status_code']
+        response.reason = 'OK'
+        response.headers = headers
+        response.encoding = get_encoding_from_headers(headers)
+        response._content = entry['content']
+        response._content_consumed = True
+        response.from_cache = True
+        response.compressed_size = 0
+        response.decompressed_size = len(entry['content'])
+        try:
+            os.utime(self._path(url))
+        except OSError:
+            pass
+        log.debug('Url: {} revalidated from the http cache'.format(url))
+
+    def store(self, url, response, content=None):
+        """Caches the body of a 200 `response` if it has validators
+        """
+        headers = response.headers
+        if response.status_code != 200 or \
+                'no-store' in headers.get('cache-control', '').lower() or \
+                not (headers.get('etag') or headers.get('last-modified')):
+            return
+        entry = {
+            'url': url,
+            'status_code': response.status_code,
+            'headers': {name: headers[name]
+                        for name in CACHED_HEADERS if name in headers},
+            'content': response.content if content is None else content,
+        }
+        data = pickle.dumps(entry, pickle.HIGHEST_PROTOCOL)
+        if len(data) > self.max_size:
+            return
+        path = self._path(url)
+        tmp_path = '%s.%s.tmp' % (path, threading.get_ident())
+        with self.lock:
+            try:
+                old_size = os.path.getsize(path)
+            except OSError:
+                old_size = 0
+            try:
+                with open(tmp_path, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                log.warning('Could not write the http cache: %s' % e)
+                return
+            self.size += len(data) - old_size
+            if self.size > self.max_size:
+                self._evict()
+
+    def _evict(self):
+        entries = sorted(self._entries())
+        self.size = sum(size for _, _, size in entries)
+        for _, path, size in entries:
+            if self.size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self.size -= size
+
+
+def get_http_cache(config):
+    """Returns the shared `HTTPCache` of the config, None when caching
+    is disabled
+    """
+    if not config.http_cache:
+        return None
+    key = (config.http_cache_directory, config.http_cache_size)
+    with _caches_lock:
+        cache = _caches.get(key)
+        if cache is None:
+            cache = _caches[key] = HTTPCache(*key)
+    return cache
+
 
 def get_request_kwargs(timeout, useragent, proxies, headers):
     """This Wrapper method exists b/c some values in req_kwargs dict
@@ -38,7 +414,6 @@ def get_request_kwargs(timeout, useragent, proxies, headers):
     """
     return {
         'headers': headers if headers else {'User-Agent': useragent},
-        'cookies': cj(),
         'timeout': timeout,
         'allow_redirects': True,
         'proxies': proxies
@@ -49,12 +424,112 @@ class NetworkError(Exception):
     pass
 
 
+class CircuitOpenError(RequestException):
+    """Raised instead of sending a request to a host whose circuit is open
+    """
+
+
+class CircuitBreaker(object):
+    """Per host circuit breaker. Once a host failed `threshold` times in a
+    row (connection errors, timeouts, 429 and 5xx) its circuit opens and
+    requests to it fail fast with `CircuitOpenError` for `reset` seconds.
+    The first request after that probes the host, a success closes the
+    circuit and a failure opens it again.
+    """
+    def __init__(self, threshold, reset):
+        self.threshold = threshold
+        self.reset = reset
+        self.failures = {}
+        self.open_until = {}
+        self.lock = threading.Lock()
+
+    def check(self, url):
+        """Raises `CircuitOpenError` if the circuit of the host is open
+        """
+        host = get_host(url)
+        with self.lock:
+            until = self.open_until.get(host)
+            if until is None:
+                return
+            now = time.monotonic()
+            if now < until:
+                raise CircuitOpenError(
+                    'Circuit open for host {}, skipping {}'.format(host, url))
+            # half-open, this request probes the host while the others
+            # keep failing fast until it is done
+            self.open_until[host] = now + self.reset
+
+    def record(self, url, success):
+        host = get_host(url)
+        with self.lock:
+            if success:
+                self.failures.pop(host, None)
+                self.open_until.pop(host, None)
+                return
+            failures = self.failures[host] = self.failures.get(host, 0) + 1
+            if failures >= self.threshold:
+                if host not in self.open_until:
+                    log.warning('Circuit opened for host %s after %d '
+                                'failures' % (host, failures))
+                self.open_until[host] = time.monotonic() + self.reset
+
+    def trip(self, url, seconds):
+        """Opens the circuit of the host for at least `seconds`, used to
+        honor a `Retry-After` we do not wait for
+        """
+        host = get_host(url)
+        with self.lock:
+            until = time.monotonic() + seconds
+            self.open_until[host] = max(until, self.open_until.get(host, 0))
+
+
+def get_circuit_breaker(config):
+    """Returns the process-wide `CircuitBreaker` for the settings of
+    `config`, None if the breaker is disabled
+    """
+    if not config.circuit_breaker_threshold:
+        return None
+    key = (config.circuit_breaker_threshold, config.circuit_breaker_reset)
+    with _breakers_lock:
+        breaker = _breakers.get(key)
+        if breaker is None:
+            breaker = _breakers[key] = CircuitBreaker(*key)
+    return breaker
+
+
+def get_retry_after(response):
+    """Seconds to wait according to the `Retry-After` header, given either
+    as a number of seconds or as a http date. None if absent or invalid.
+    """
+    value = response.headers.get('retry-after')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return max(0.0, (date - datetime.now(timezone.utc)).total_seconds())
+
+
+def get_backoff(config, attempt):
+    """Exponential backoff with full jitter before retry number `attempt`
+    """
+    delay = min(config.retry_backoff_max, config.retry_backoff * 2 ** attempt)
+    return random.uniform(0, delay)
+
+
 def get_html(url, config=None, response=None):
     """HTTP response code agnostic
     """
     try:
         return get_html_2XX_only(url, config, response)
-    except requests.exceptions.RequestException as e:
+    except (RequestException, NetworkError) as e:
         log.debug('get_html() error. %s on URL: %s' % (e, url))
         return ''
 
@@ -66,12 +541,6 @@ def get_html_2XX_only(url, config=None, response=None):
     - Error out if a non 2XX HTTP response code is returned.
     """
     config = config or Configuration()
-    useragent = config.browser_user_agent
-    timeout = config.request_timeout
-    size_limit = config.size_limit
-    invalid_types = config.invalid_content_types
-    proxies = config.proxies
-    headers = config.headers
 
     if response is not None:
         return _get_html_from_response(response)
@@ -79,91 +548,511 @@ def get_html_2XX_only(url, config=None, response=None):
     def _get_using_requests():
         result = None
         try:
-            with closing(requests.get(url=url, stream=True, **get_request_kwargs(timeout, useragent, proxies, headers))) as _response:
-                response_code = _response.status_code
-                if not (200 <= response_code <= 299):
-                    raise NetworkError('Invalid status code: {}'.format(response_code))
-                length = _response.headers.get('content-length')
-                type = _response.headers.get('content-type')
-                if length is not None and int(length) >= size_limit:
-                    log.warning('Requests response is too big, aborting', extra={
-                        'url': url,
-                        'length': length,
-                    })
-                elif type is not None and any(filter(lambda x: type.startswith(x[:-1]) if x[-1] == '*' else type == x,
-                                                     invalid_types)):
-                    log.warning('Requests response has invalid content type, aborting', extra={
-                        'url': url,
-                        'content_type': type,
-                    })
-                else:
-                    log.info('Url: {} got response from Requests'.format(url))
-                    result = _get_html_from_response(_response)
+            _response = _request(url, config, check_headers=True)
+            if _response is not None:
+                log.info('Url: {} got response from Requests'.format(url))
+                result = _get_html_from_response(_response)
         except (RequestException, ConnectionResetError, ConnectionError, HTTPException, HTTPError) as e:
             raise NetworkError('Network error') from e
         return result or ''
 
-    if config.content_strategy['name'] == 'casperjs':
-        command_formula = '{casperjs} {script} {url}'
-
-        base_dir = os.path.abspath(os.path.dirname(__file__))
-        command = command_formula.format(
-            casperjs=CASPERJS_PATH,
-            script=os.path.join(base_dir, 'casperjs/get_page_content.js'),
-            url=url)
-        try:
-            p = subprocess.Popen(
-                command.split(), stdout=subprocess.PIPE,
-                stdin=subprocess.PIPE, stderr=subprocess.PIPE)
-            output, err = p.communicate(timeout=timeout)
-            response_code_part = str(output).split('\\n')[0]
-            response_code = int(''.join(filter(lambda x: x.isdigit(), response_code_part)))
-            if not (200 <= response_code <= 299):
-                raise NetworkError('Invalid status code: {}'.format(response_code))
-            log.info('Url: {} got response from CasperJS'.format(url))
-        except subprocess.TimeoutExpired as e:
-            log.info('Url: {} got timeout from CasperJS'.format(url))
+    if config.content_strategy['name'] != 'requests':
+        rendered = _render_page(url, config)
+        if rendered is None:
             return _get_using_requests()
+        response_code, html = rendered
+        if not (200 <= response_code <= 299):
+            raise NetworkError('Invalid status code: {}'.format(response_code))
+        return html
 
-        return output
+    return _get_using_requests()
 
-    elif config.content_strategy['name'] == 'selenium':
-        from selenium import webdriver
-        from selenium.webdriver.firefox.firefox_binary import FirefoxBinary
-        import pyvirtualdisplay
 
-        log_file = config.content_strategy['kwargs'].get('log_file')
+def _render_page(url, config):
+    """Renders `url` with the rendering content strategy of the config,
+    returns the status code of the page and its html. None if the render
+    failed, the page is then downloaded with requests. Selenium does not
+    report the status of pages, those it renders are taken as 200
+    """
+    name = config.content_strategy['name']
+    if name == 'casperjs':
+        from .renderers import RenderError, get_casper_pool
 
-        with pyvirtualdisplay.Display():
-            browser = webdriver.Firefox(firefox_binary=FirefoxBinary(
-                log_file=log_file))
-            browser.get(url)
-            log.info('Url: {} got response from Selenium'.format(url))
-            # webdriver does not support returning HTTP status code
-            html = browser.page_source
-            browser.quit()
-            del browser
-        return html
+        try:
+            response_code, html = get_casper_pool(
+                config, CASPERJS_PATH).render(url, config.request_timeout)
+        except RenderError as e:
+            log.info('Url: {} got {} from CasperJS'.format(url, e))
+            return None
+        log.info('Url: {} got response from CasperJS'.format(url))
+        return response_code, html
+
+    elif name == 'selenium':
+        from selenium.common.exceptions import TimeoutException
 
-    elif config.content_strategy['name'] == 'splash':
+        from .renderers import get_browser_pool
+
+        try:
+            return 200, get_browser_pool(config).render(url)
+        except TimeoutException:
+            log.info('Url: {} got timeout from Selenium'.format(url))
+            return None
+
+    elif name == 'splash':
         assert 'host' in config.content_strategy['kwargs'], \
             'If you want to use `Splash` as content strategy, you must ' \
             'define in config the `host` key in content_strategy[\'kwargs\']'
-        payload = {
+        from .renderers import RenderError, get_splash_client
+
+        try:
+            return get_splash_client(config).render(url)
+        except RenderError as e:
+            log.info('Url: {} got {} from Splash'.format(url, e))
+            return None
+
+    raise ValueError('Unknown content strategy {}'.format(name))
+
+
+def _is_acceptable_response(url, status_code, headers, config):
+    """Checks the status line and headers of a response before its body
+    is read. Non 2XX codes raise, too big or invalid typed bodies are
+    logged and skipped.
+    """
+    if not (200 <= status_code <= 299):
+        raise NetworkError('Invalid status code: {}'.format(status_code))
+    # the content-length of a compressed body is its compressed size, the
+    # decompressed size is only known, and capped, while it streams
+    length = headers.get('content-length')
+    type = headers.get('content-type')
+    if length is not None and int(length) >= config.size_limit:
+        log.warning('Requests response is too big, aborting', extra={
             'url': url,
-            'timeout': timeout,
-            'wait': 0.5
-        }
-        endpoint = urljoin(
-            config.content_strategy['kwargs']['host'], '/render.html')
-        resp = requests.get(endpoint, params=payload)
-        response_code = resp.status_code
-        if not (200 <= response_code <= 299):
-            raise NetworkError('Invalid status code: {}'.format(response_code))
-        log.info('Url: {} got response from Splash'.format(url))
-        return resp.content
+            'length': length,
+        })
+        return False
+    if type is not None and any(filter(lambda x: type.startswith(x[:-1]) if x[-1] == '*' else type == x,
+                                       config.invalid_content_types)):
+        log.warning('Requests response has invalid content type, aborting', extra={
+            'url': url,
+            'content_type': type,
+        })
+        return False
+    return True
+
+
+def is_binary_payload(head):
+    """True if the first bytes of a body can't be the start of an html or
+    xml document: known binary file signatures, media containers
+    (`....ftyp`) or NUL bytes in a body without an UTF-16 BOM
+    """
+    if head.startswith(BINARY_SIGNATURES) or head[4:8] == b'ftyp':
+        return True
+    return b'\x00' in head and not head.startswith(UTF16_BOMS)
+
+
+class BodyReader(object):
+    """Collects a streamed response body. The body is refused as soon as
+    its decompressed size grows past `size_limit` bytes, whatever the
+    content-length header says, or when its first bytes show a binary
+    payload. Callers then drop the connection instead of finishing the
+    transfer, a compressed bomb is only inflated as far as the chunks
+    fed before the limit.
+    """
+    def __init__(self, url, size_limit):
+        self.url = url
+        self.size_limit = size_limit
+        self.chunks = []
+        self.size = 0
+        self.sniffed = False
+
+    def feed(self, chunk):
+        """Returns False once the body must be refused
+        """
+        self.chunks.append(chunk)
+        self.size += len(chunk)
+        if self.size >= self.size_limit:
+            log.warning('Requests response is too big, aborting', extra={
+                'url': self.url,
+                'length': self.size,
+            })
+            return False
+        if not self.sniffed and self.size >= SNIFF_SIZE:
+            return self.sniff()
+        return True
+
+    def sniff(self):
+        self.sniffed = True
+        head = b''.join(self.chunks)[:SNIFF_SIZE]
+        if is_binary_payload(head):
+            log.warning('Requests response is not html, aborting', extra={
+                'url': self.url,
+            })
+            return False
+        return True
+
+    def getvalue(self):
+        """Returns the whole body, None if it is refused
+        """
+        if not self.sniffed and not self.sniff():
+            return None
+        return b''.join(self.chunks)
+
+
+def _get_brotli():
+    """The brotli module if it can bound the output of a decompression
+    step, older versions and brotlicffi can't
+    """
+    try:
+        import brotli
+    except ImportError:
+        return None
+    try:
+        brotli.Decompressor().process(b'', output_buffer_limit=CHUNK_SIZE)
+    except TypeError:
+        return None
+    return brotli
 
-    return _get_using_requests()
+
+def _get_zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        return None
+    return zstandard
+
+
+brotli = _get_brotli()
+zstandard = _get_zstandard()
+
+
+def decode_zlib(chunks, size, encoding):
+    """Yields the gzip or deflate stream of `chunks` decoded, zlib gives
+    at most `size` bytes per step. Concatenated gzip members are decoded
+    one after the other and deflate streams may lack the zlib header
+    """
+    is_gzip = encoding != 'deflate'
+    wbits = 16 + zlib.MAX_WBITS if is_gzip else zlib.MAX_WBITS
+    decompressor = zlib.decompressobj(wbits)
+    # input kept until the first output, to try it again as raw deflate
+    started = is_gzip
+    head = b''
+    for data in chunks:
+        while data:
+            if decompressor.eof:
+                if not is_gzip or not data.startswith(b'\x1f\x8b'):
+                    # trailing garbage
+                    return
+                decompressor = zlib.decompressobj(wbits)
+            try:
+                chunk = decompressor.decompress(data, size)
+            except zlib.error:
+                if started:
+                    raise
+                started = True
+                decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+                data = head + data
+                continue
+            if not started:
+                head += data
+                started = bool(chunk)
+            if chunk:
+                yield chunk
+            if decompressor.eof:
+                data = decompressor.unused_data
+            elif decompressor.unconsumed_tail or len(chunk) == size:
+                data = decompressor.unconsumed_tail
+                if not data:
+                    # output left for the input already consumed
+                    chunk = decompressor.decompress(b'', size)
+                    while chunk:
+                        yield chunk
+                        chunk = decompressor.decompress(b'', size)
+            else:
+                data = b''
+
+
+def decode_brotli(chunks, size, encoding):
+    """Yields the brotli stream of `chunks` decoded, brotli stops growing
+    its output past `size` bytes per step
+    """
+    decompressor = brotli.Decompressor()
+    for data in chunks:
+        chunk = decompressor.process(data, output_buffer_limit=size)
+        # output may be left even once it accepts more data
+        while chunk or not decompressor.can_accept_more_data():
+            if chunk:
+                yield chunk
+            if decompressor.is_finished():
+                break
+            chunk = decompressor.process(b'', output_buffer_limit=size)
+
+
+class ChunksReader(object):
+    """File-like object reading the `chunks` of an iterator
+    """
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+
+    def read(self, size=-1):
+        return next(self.chunks, b'')
+
+
+def decode_zstd(chunks, size, encoding):
+    """Yields the zstd frames of `chunks` decoded, at most `size` bytes
+    per step
+    """
+    reader = zstandard.ZstdDecompressor().stream_reader(
+        ChunksReader(chunks), read_size=size, read_across_frames=True)
+    chunk = reader.read(size)
+    while chunk:
+        yield chunk
+        chunk = reader.read(size)
+
+
+# The content-encodings decoded with a bound on the output of each step,
+# in the order they are asked for. The others are decoded by urllib3
+DECODERS = OrderedDict([('gzip', decode_zlib), ('deflate', decode_zlib)])
+DECODE_ERRORS = (zlib.error,)
+if brotli is not None:
+    DECODERS['br'] = decode_brotli
+    DECODE_ERRORS += (brotli.error,)
+if zstandard is not None:
+    DECODERS['zstd'] = decode_zstd
+    DECODE_ERRORS += (zstandard.ZstdError,)
+ACCEPT_ENCODING = ', '.join(DECODERS)
+DECODERS['x-gzip'] = decode_zlib
+
+
+def iter_content(response, chunk_size=CHUNK_SIZE):
+    """Yields the decoded body of a streamed `requests` response. The
+    content-encodings of DECODERS are decoded here, a compressed bomb
+    never inflates more than about `chunk_size` bytes at a time: urllib3
+    only bounds the output of its decoders from 2.6 on, before that a
+    single read is decoded whole. Errors are raised as `iter_content` of
+    requests raises them.
+    """
+    encoding = response.headers.get('content-encoding', '').lower().strip()
+    decoder = DECODERS.get(encoding)
+    try:
+        if decoder is None:
+            for chunk in response.raw.stream(chunk_size, decode_content=True):
+                yield chunk
+        else:
+            chunks = response.raw.stream(chunk_size, decode_content=False)
+            for chunk in decoder(chunks, chunk_size, encoding):
+                yield chunk
+    except ProtocolError as e:
+        raise requests.exceptions.ChunkedEncodingError(e)
+    except (DecodeError,) + DECODE_ERRORS as e:
+        raise requests.exceptions.ContentDecodingError(e)
+    except ReadTimeoutError as e:
+        raise requests.ConnectionError(e)
+    except SSLError as e:
+        raise requests.exceptions.SSLError(e)
+
+
+def _read_body(response, url, config):
+    """Streams the body of a `requests` response through a `BodyReader`
+    and stores it as the response content. Returns False if the body was
+    refused, the unread rest of it is never transferred.
+
+    The body is decoded by `iter_content`, about `CHUNK_SIZE` bytes at a
+    time for the content-encodings newspaper asks for. The bytes received
+    and their decoded size are kept as the `compressed_size` and
+    `decompressed_size` of the response.
+    """
+    reader = BodyReader(url, config.size_limit)
+    for chunk in iter_content(response):
+        if not reader.feed(chunk):
+            return False
+    body = reader.getvalue()
+    if body is None:
+        return False
+    response._content = body
+    response._content_consumed = True
+    set_transfer_sizes(response, response.raw.tell(), len(body))
+    return True
+
+
+def set_transfer_sizes(response, compressed_size, decompressed_size):
+    """Records the bytes of the body received over the wire and their
+    decompressed size, both are equal without a content-encoding
+    """
+    response.compressed_size = compressed_size
+    response.decompressed_size = decompressed_size
+    log.debug('Url: {} transferred {} bytes for {} bytes ({})'.format(
+        response.url, compressed_size, decompressed_size,
+        response.headers.get('content-encoding', 'identity')))
+
+
+def _request(url, config, check_headers=False):
+    """GETs `url` with the shared session, through the politeness limits,
+    the http cache and the byte cap of `_read_body`. With `check_headers`
+    non 2XX responses raise a `NetworkError` and unwanted content types
+    are refused from their headers. Returns the response with its content
+    read, None if the body was refused.
+
+    Connection errors, timeouts, 429 and 5xx are retried
+    `config.max_retries` times with a jittered exponential backoff, or
+    after the delay of their `Retry-After` header. No politeness slot is
+    held while waiting, every attempt takes a fresh one.
+    """
+    retries = config.max_retries
+    for attempt in range(retries + 1):
+        retry = attempt < retries
+        try:
+            response = _send(url, config, check_headers, retry)
+        except RETRY_ERRORS as e:
+            if not retry:
+                raise
+            delay = _get_retry_delay(url, config, attempt, error=e)
+        else:
+            if not (retry and response is not None and
+                    response.status_code in RETRY_STATUSES):
+                return response
+            delay = _get_retry_delay(url, config, attempt, response=response)
+            if delay is None:
+                return _give_up(url, response, config, check_headers)
+        # requests of threads run by a `HostScheduler` hold its slot
+        with host_slot_released():
+            time.sleep(delay)
+
+
+def _get_retry_delay(url, config, attempt, error=None, response=None):
+    """Seconds to wait before retrying `url` after attempt number `attempt`
+    failed with `error` or got a `response` with a retryable status. None
+    if its `Retry-After` is longer than `config.retry_backoff_max`.
+    """
+    if error is not None:
+        delay = get_backoff(config, attempt)
+        log.debug('Url: {} failed with {}, retrying in {:.2f}s'.format(
+            url, error, delay))
+        return delay
+    delay = get_retry_after(response)
+    if delay is None:
+        delay = get_backoff(config, attempt)
+    elif delay > config.retry_backoff_max:
+        return None
+    log.debug('Url: {} got status {}, retrying in {:.2f}s'.format(
+        url, response.status_code, delay))
+    return delay
+
+
+def _send(url, config, check_headers, retry):
+    """Performs one attempt of `_request`. When `retry` is set responses
+    with a retryable status are returned right away with their body unread.
+    """
+    kwargs = get_request_kwargs(config.request_timeout,
+                                config.browser_user_agent,
+                                config.proxies, config.headers)
+    cache = get_http_cache(config)
+    entry = None
+    if cache is not None:
+        entry = cache.get(url)
+        kwargs['headers'] = cache.conditional_headers(entry, kwargs['headers'])
+    breaker = get_circuit_breaker(config)
+    if breaker is not None:
+        breaker.check(url)
+    with host_slot(url, config):
+        try:
+            response = get_session(config).get(url, stream=True, **kwargs)
+        except RETRY_ERRORS:
+            if breaker is not None:
+                breaker.record(url, False)
+            raise
+        if breaker is not None:
+            breaker.record(url, response.status_code not in RETRY_STATUSES)
+        with closing(response):
+            if entry is not None and response.status_code == 304:
+                cache.revalidated(url, entry, response)
+                archive(response, response.request.headers, config)
+                return response
+            if retry and response.status_code in RETRY_STATUSES:
+                return response
+            if check_headers and not _is_acceptable_response(
+                    url, response.status_code, response.headers, config):
+                return None
+            if not _read_body(response, url, config):
+                return None
+    archive(response, response.request.headers, config)
+    if cache is not None:
+        cache.store(url, response)
+    return response
+
+
+def archive(response, request_headers, config):
+    """Appends a downloaded response, and the request headers it was
+    sent with, to the WARC file of the config if there is one. Responses
+    revalidated from the http cache are archived with their cached body
+    """
+    writer = get_warc_writer(config)
+    if writer is not None:
+        writer.write_exchange(response.url, request_headers,
+                              response.status_code, response.reason,
+                              response.headers, response.content)
+
+
+def _give_up(url, response, config, check_headers):
+    """Ends the retries of `url` when its `Retry-After` is too long to wait
+    for, the host is failed fast until then
+    """
+    delay = get_retry_after(response)
+    log.warning('Url: {} asked to retry after {:.0f}s, giving up'.format(
+        url, delay))
+    breaker = get_circuit_breaker(config)
+    if breaker is not None:
+        breaker.trip(url, delay)
+    if check_headers:
+        _is_acceptable_response(
+            url, response.status_code, response.headers, config)
+    response._content = b''
+    response._content_consumed = True
+    return response
+
+
+async def _aread_body(aio_response, url, config):
+    """Event loop version of `_read_body` for aiohttp responses, returns
+    the body or None if it was refused
+    """
+    reader = BodyReader(url, config.size_limit)
+    async for chunk in aio_response.content.iter_chunked(CHUNK_SIZE):
+        if not reader.feed(chunk):
+            aio_response.close()
+            return None
+    return reader.getvalue()
+
+
+def get_html_bytes_2XX_only(url, config=None, response=None):
+    """Same as `get_html_2XX_only`, but the body of a plain requests
+    download is not decoded: returns the html bytes along with the charset
+    of the http headers, None if they have none. The html of rendering
+    strategies is returned as `get_html_2XX_only` does.
+    """
+    config = config or Configuration()
+    if response is None:
+        if config.content_strategy['name'] != 'requests':
+            return get_html_2XX_only(url, config), None
+        try:
+            response = _request(url, config, check_headers=True)
+        except (RequestException, ConnectionResetError, ConnectionError,
+                HTTPException, HTTPError) as e:
+            raise NetworkError('Network error') from e
+        if response is None:
+            return '', None
+        log.info('Url: {} got response from Requests'.format(url))
+    return response.content or '', get_http_charset(response)
+
+
+def get_http_charset(response):
+    """Charset given by the content-type header of the response, unlike
+    `response.encoding` it is not defaulted for text types. ISO-8859-1 is
+    left out, as `_get_html_from_response` does: servers send it for pages
+    in any charset, the one of the html is used instead
+    """
+    match = CHARSET_RE.search(response.headers.get('content-type', ''))
+    if match is None or match.group(1).upper() == FAIL_ENCODING:
+        return None
+    return match.group(1)
 
 
 def _get_html_from_response(response):
@@ -176,16 +1065,39 @@ def _get_html_from_response(response):
     return html or ''
 
 
+def _render(url, config):
+    """Wraps the page rendered by the content strategy of the config in a
+    `requests.Response` with the status the renderer reported. Pages the
+    renderer failed on are downloaded with requests
+    """
+    rendered = _render_page(url, config)
+    if rendered is None:
+        return _request(url, config)
+    status_code, html = rendered
+    response = requests.Response()
+    response.status_code = status_code
+    response.reason = responses.get(status_code, '')
+    response.url = url
+    if isinstance(html, str):
+        response.encoding = 'utf-8'
+        html = html.encode('utf-8')
+    response._content = html or b''
+    response._content_consumed = True
+    return response
+
+
 class MRequest(object):
     """Wrapper for request object for multithreading. If the domain we are
     crawling is under heavy load, the self.resp will be left as None.
     If this is the case, we still want to report the url which has failed
-    so (perhaps) we can try again later.
+    so (perhaps) we can try again later. With `render` the page is
+    rendered by the content strategy of the config, otherwise it is always
+    downloaded with requests.
     """
-    def __init__(self, url, config=None):
+    def __init__(self, url, config=None, render=False):
         self.url = url
-        self.config = config
-        config = config or Configuration()
+        self.config = config = config or Configuration()
+        self.render = render and config.content_strategy['name'] != 'requests'
         self.useragent = config.browser_user_agent
         self.timeout = config.request_timeout
         self.proxies = config.proxies
@@ -194,31 +1106,298 @@ class MRequest(object):
 
     def send(self):
         try:
-            self.resp = requests.get(self.url, **get_request_kwargs(
-                self.timeout, self.useragent, self.proxies, self.headers))
+            if self.render:
+                resp = _render(self.url, self.config)
+            else:
+                resp = _request(self.url, self.config)
+            if resp is None:
+                return
+            self.resp = resp
+            if self.config.http_success_only:
+                self.resp.raise_for_status()
+        except (RequestException, NetworkError) as e:
+            log.critical('[REQUEST FAILED] ' + str(e))
+
+    async def asend(self, client):
+        """Same as `send` but performed on the event loop by an
+        `AsyncClient`
+        """
+        if self.render:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, self.send)
+        try:
+            self.resp = await client.get(self.url)
+            if self.resp is None:
+                return
             if self.config.http_success_only:
                 self.resp.raise_for_status()
         except RequestException as e:
             log.critical('[REQUEST FAILED] ' + str(e))
 
 
-def multithread_request(urls, config=None):
+def multithread_request(urls, config=None, render=False):
     """Request multiple urls via mthreading, order of urls & requests is stable
-    returns same requests but with response variables filled.
+    returns same requests but with response variables filled. Requests are
+    interleaved across hosts and obey the politeness limits of the config.
+    Only with `render` are the pages rendered by the content strategy.
     """
     config = config or Configuration()
     num_threads = config.number_threads
-    timeout = config.thread_timeout_seconds
 
-    pool = ThreadPool(num_threads, timeout)
+    pool = HostScheduler(num_threads, get_host_limiter(config))
 
     m_requests = []
     for url in urls:
-        m_requests.append(MRequest(url, config))
+        m_requests.append(MRequest(url, config, render))
 
     for req in m_requests:
-        pool.add_task(req.send)
+        pool.add_task(req.url, req.send)
 
     pool.wait_completion()
     return m_requests
 
+
+
+class AsyncClient(object):
+    """Event loop counterpart of the pooled session returned by
+    `get_session`, built on aiohttp. Connections are capped globally by
+    `config.async_concurrency` and per host by
+    `config.async_concurrency_per_host`, so thousands of downloads can be
+    in flight on one thread without flooding a single publisher.
+
+    >>> async with AsyncClient(config) as client:
+    ...     html = await aget_html_2XX_only(url, config, client=client)
+
+    Responses are handed back as `requests.Response` objects, so everything
+    consuming `MRequest.resp` works unchanged.
+    """
+    def __init__(self, config=None):
+        self.config = config or Configuration()
+        self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    def get_session(self):
+        if self._session is None:
+            import aiohttp
+
+            connector = aiohttp.TCPConnector(
+                limit=self.config.async_concurrency,
+                limit_per_host=self.config.async_concurrency_per_host,
+                force_close=not self.config.keep_alive,
+                use_dns_cache=bool(self.config.dns_cache_ttl),
+                ttl_dns_cache=self.config.dns_cache_ttl or None)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(
+                    total=self.config.request_timeout))
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def request(self, url, headers=None):
+        """Returns the aiohttp request context manager for `url`, the
+        body is left unread so callers can inspect headers first
+        """
+        config = self.config
+        kwargs = get_request_kwargs(config.request_timeout,
+                                    config.browser_user_agent,
+                                    config.proxies, config.headers)
+        proxy = kwargs['proxies'].get(urlsplit(url).scheme)
+        return self.get_session().get(url,
+                                      headers=headers or kwargs['headers'],
+                                      allow_redirects=True, proxy=proxy)
+
+    async def get(self, url, check_headers=False):
+        """Downloads `url` fully, network errors are raised as
+        `requests.RequestException` just like the threaded path. Returns
+        None if the body was refused by the `BodyReader`. The http cache,
+        `check_headers`, the retries, the circuit breaker and the
+        politeness limits of the config behave as in `_request`, a
+        politeness slot is waited for without blocking the loop.
+        """
+        config = self.config
+        retries = config.max_retries
+        for attempt in range(retries + 1):
+            retry = attempt < retries
+            try:
+                response = await self._send(url, check_headers, retry)
+            except RETRY_ERRORS as e:
+                if not retry:
+                    raise
+                delay = _get_retry_delay(url, config, attempt, error=e)
+            else:
+                if not (retry and response is not None and
+                        response.status_code in RETRY_STATUSES):
+                    return response
+                delay = _get_retry_delay(url, config, attempt,
+                                         response=response)
+                if delay is None:
+                    return _give_up(url, response, config, check_headers)
+            await asyncio.sleep(delay)
+
+    async def _send(self, url, check_headers, retry):
+        """Performs one attempt of `get`, as `_send` does for `_request`
+        """
+        import aiohttp
+
+        config = self.config
+        cache = get_http_cache(config)
+        entry = headers = None
+        if cache is not None:
+            entry = cache.get(url)
+            headers = cache.conditional_headers(entry, get_request_kwargs(
+                config.request_timeout, config.browser_user_agent,
+                config.proxies, config.headers)['headers'])
+        breaker = get_circuit_breaker(config)
+        if breaker is not None:
+            breaker.check(url)
+        try:
+            async with AsyncHostSlot(url, config):
+                try:
+                    _response = await self.request(url, headers)
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    error = _get_request_error(e)
+                    if breaker is not None and \
+                            isinstance(error, RETRY_ERRORS):
+                        breaker.record(url, False)
+                    raise error from e
+                if breaker is not None:
+                    breaker.record(url, _response.status not in RETRY_STATUSES)
+                async with _response:
+                    if entry is not None and _response.status == 304:
+                        response = _build_response(_response, b'')
+                        cache.revalidated(url, entry, response)
+                        archive(response, _response.request_info.headers,
+                                config)
+                        return response
+                    if retry and _response.status in RETRY_STATUSES:
+                        return _build_response(_response, b'')
+                    if check_headers and not _is_acceptable_response(
+                            url, _response.status, _response.headers,
+                            config):
+                        return None
+                    body = await _aread_body(_response, url, config)
+                    if body is None:
+                        return None
+                    response = _build_response(_response, body)
+                    # aiohttp < 3.10 does not count the compressed bytes
+                    set_transfer_sizes(response, getattr(
+                        _response.content, 'total_raw_bytes', len(body)),
+                        len(body))
+                    archive(response, _response.request_info.headers,
+                            config)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise _get_request_error(e) from e
+        if cache is not None:
+            cache.store(url, response)
+        return response
+
+
+def _get_request_error(error):
+    """The `requests` exception matching an aiohttp or asyncio `error`,
+    connection errors and timeouts are retried as they are by `_request`
+    """
+    import aiohttp
+
+    if isinstance(error, asyncio.TimeoutError):
+        return requests.Timeout(str(error))
+    if isinstance(error, (aiohttp.ClientConnectionError,
+                          aiohttp.ClientPayloadError)):
+        return requests.ConnectionError(str(error))
+    return RequestException(str(error))
+
+
+def _build_response(aio_response, body):
+    """Wraps a consumed aiohttp response into a `requests.Response`
+    """
+    response = requests.Response()
+    response.status_code = aio_response.status
+    response.reason = aio_response.reason
+    response.headers = CaseInsensitiveDict(aio_response.headers)
+    response.url = str(aio_response.url)
+    response.encoding = get_encoding_from_headers(response.headers)
+    response._content = body
+    return response
+
+
+async def aget_html(url, config=None, client=None):
+    """HTTP response code agnostic, event loop version of `get_html`
+    """
+    try:
+        return await aget_html_2XX_only(url, config, client)
+    except (RequestException, NetworkError) as e:
+        log.debug('aget_html() error. %s on URL: %s' % (e, url))
+        return ''
+
+
+async def aget_html_2XX_only(url, config=None, client=None):
+    """Event loop version of `get_html_2XX_only`. Only the plain requests
+    content strategy is natively asynchronous, the rendering strategies
+    run in the default executor.
+    """
+    config = config or Configuration()
+    if config.content_strategy['name'] != 'requests':
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None, get_html_2XX_only, url, config)
+
+    _response = await _aget_response(url, config, client)
+    if _response is None:
+        return ''
+    return _get_html_from_response(_response)
+
+
+async def aget_html_bytes_2XX_only(url, config=None, client=None):
+    """Event loop version of `get_html_bytes_2XX_only`
+    """
+    config = config or Configuration()
+    if config.content_strategy['name'] != 'requests':
+        return await aget_html_2XX_only(url, config, client), None
+
+    _response = await _aget_response(url, config, client)
+    if _response is None:
+        return '', None
+    return get_html_bytes_2XX_only(url, config, _response)
+
+
+async def _aget_response(url, config, client):
+    """Downloads `url` with `client`, or a client of its own, network
+    errors are raised as `NetworkError`. None if the body was refused.
+    """
+    own_client = client is None
+    client = client or AsyncClient(config)
+    try:
+        _response = await client.get(url, check_headers=True)
+        if _response is not None:
+            log.info('Url: {} got response from aiohttp'.format(url))
+        return _response
+    except (RequestException, ConnectionError) as e:
+        raise NetworkError('Network error') from e
+    finally:
+        if own_client:
+            await client.close()
+
+
+async def async_request(urls, config=None, client=None, render=False):
+    """Request multiple urls on the event loop, order of urls & requests
+    is stable. Returns `MRequest` objects with their response filled, just
+    like `multithread_request`.
+    """
+    config = config or Configuration()
+    m_requests = [MRequest(url, config, render) for url in urls]
+    own_client = client is None
+    client = client or AsyncClient(config)
+    try:
+        await asyncio.gather(*[req.asend(client) for req in m_requests])
+    finally:
+        if own_client:
+            await client.close()
+    return m_requests
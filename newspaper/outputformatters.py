@@ -10,12 +10,61 @@ __copyright__ = 'Copyright 2014, Lucas Ou-Yang'
 from html import unescape
 import logging
 
-from .text import innerTrim
+from .text import innerTrim, StopWords
 from .nlp import word_count
 
 
 log = logging.getLogger(__name__)
 
+# formatters removing nodes by their text, they run together in one
+# bottom-up walk over the top node when they follow each other in this
+# order
+REMOVAL_FORMATTERS = [
+    'remove_empty_tags',
+    'remove_trailing_media_div',
+    'remove_fewwords_paragraphs',
+    'remove_twitter_media_widgets',
+    'remove_figcaption_tags',
+]
+MEDIA_TAGS = ('object', 'embed')
+NO_STRINGS = frozenset()
+
+
+class NodeText(object):
+    """What `Parser.getText` of a node of the top node returns once the
+    nodes to remove are gone, summed up from its children: the length,
+    first and last characters, stopword and word counts of the text, and
+    whether media are left under the node. `has_text` and `has_media` are
+    for the tree before any removal of text
+    """
+    __slots__ = ('has_text', 'has_media', 'kept_media', 'chars', 'fragments',
+                 'stopwords', 'words', 'first', 'last', 'parts',
+                 'empty_start', 'fewwords_start')
+
+    def __init__(self, keep_parts=False):
+        self.has_text = self.has_media = self.kept_media = False
+        self.chars = self.fragments = self.stopwords = self.words = 0
+        self.first = self.last = ''
+        self.parts = [] if keep_parts else None
+
+    def add(self, other):
+        """Appends the text of a child
+        """
+        if not other.fragments:
+            return
+        if not self.fragments:
+            self.first = other.first
+        self.last = other.last
+        self.chars += other.chars
+        self.fragments += other.fragments
+        self.stopwords += other.stopwords
+        self.words += other.words
+        if self.parts is not None:
+            self.parts.extend(other.parts)
+
+    def get_length(self):
+        return self.chars + max(0, self.fragments - 1)
+
 
 class OutputFormatter(object):
 
@@ -25,6 +74,7 @@ class OutputFormatter(object):
         :type config: newspaper.configuration.Configuration
         """
         self.top_node = None
+        self.fewwords_stopwords = None
         self.config = config
         self.parser = self.config.get_parser()
         self.language = config.language
@@ -63,22 +113,41 @@ class OutputFormatter(object):
         self.top_node = top_node
         html, text = '', ''
 
-        if 'remove_negativescores_nodes' not in self.excluded_formatters:
-            self.remove_negativescores_nodes()
+        # Nodes scored below 1 used to be removed here, selected with the
+        # css selector `*[gravityScore]`. It lowercased the attribute name
+        # and never matched, the scores are no longer kept on the nodes
 
         if self.config.keep_article_html:
             html = self.convert_to_html()
 
-        for formatter in self.formatters:
-            if formatter in self.excluded_formatters:
-                continue
-
-            if hasattr(self, formatter):
-                getattr(self, formatter)()
+        formatters = [formatter for formatter in self.formatters
+                      if formatter not in self.excluded_formatters and
+                      hasattr(self, formatter)]
+        while formatters:
+            removals = self.get_removal_formatters(formatters)
+            if removals:
+                self.remove_nodes(removals)
+                del formatters[:len(removals)]
+            else:
+                getattr(self, formatters.pop(0))()
 
         text = self.convert_to_text()
         return text, html
 
+    def get_removal_formatters(self, formatters):
+        """Returns the leading `formatters` that `remove_nodes` can run
+        in one walk, those of REMOVAL_FORMATTERS in the same order
+        """
+        removals = []
+        position = -1
+        for formatter in formatters:
+            if formatter not in REMOVAL_FORMATTERS or \
+                    REMOVAL_FORMATTERS.index(formatter) <= position:
+                break
+            position = REMOVAL_FORMATTERS.index(formatter)
+            removals.append(formatter)
+        return removals
+
     def convert_to_text(self):
         txts = []
         for node in list(self.get_top_node()):
@@ -117,18 +186,6 @@ class OutputFormatter(object):
         """
         self.parser.stripTags(self.get_top_node(), 'a')
 
-    def remove_negativescores_nodes(self):
-        """If there are elements inside our top node that have a
-        negative gravity score, let's give em the boot.
-        """
-        gravity_items = self.parser.css_select(
-            self.top_node, "*[gravityScore]")
-        for item in gravity_items:
-            score = self.parser.getAttribute(item, 'gravityScore')
-            score = float(score) if score else 0
-            if score < 1:
-                item.getparent().remove(item)
-
     def replace_with_text(self):
         """
         Replace common tags with just text so we don't have any crazy
@@ -139,23 +196,134 @@ class OutputFormatter(object):
         self.parser.stripTags(
             self.get_top_node(), 'b', 'strong', 'i', 'br', 'sup')
 
+    def remove_nodes(self, formatters):
+        """Runs `formatters`, some of REMOVAL_FORMATTERS in their order,
+        in a single bottom-up walk over the top node. The text of each
+        node is summed up from its children as it will be once the nodes
+        removed by the formatters before are gone, which gives the nodes
+        each formatter removes. They are then removed in the order the
+        formatters would have removed them one after the other
+        """
+        remove_empty = 'remove_empty_tags' in formatters
+        remove_fewwords = 'remove_fewwords_paragraphs' in formatters
+        remove_twitter = 'remove_twitter_media_widgets' in formatters
+        remove_figcaptions = 'remove_figcaption_tags' in formatters
+        # stopwords only add up over text fragments for the space
+        # separated languages, the text is kept for the other ones
+        self.fewwords_stopwords = None
+        if self.language:
+            self.fewwords_stopwords = self.stopwords_class(
+                language=self.language)
+        keep_parts = self.language and self.stopwords_class is not StopWords
+
+        top_node = self.get_top_node()
+        empty_nodes = []
+        fewwords_nodes = []
+        twitter_nodes = []
+        figcaptions = []
+        stack = []
+        for event, node in self.parser.walk(top_node):
+            if event == 'start':
+                text = NodeText(keep_parts)
+                self.add_text(text, node.text)
+                text.empty_start = len(empty_nodes)
+                text.fewwords_start = len(fewwords_nodes)
+                stack.append(text)
+                if remove_twitter and \
+                        (node.get('class') or '').startswith('twitter-'):
+                    twitter_nodes.append(node)
+                if remove_figcaptions and node.tag == 'figcaption' and \
+                        node is not top_node:
+                    figcaptions.append(node)
+                continue
+            if event == 'end':
+                text = stack.pop()
+                if not stack:
+                    break
+                parent = stack[-1]
+                is_media = node.tag in MEDIA_TAGS
+                if remove_empty and not text.has_text and \
+                        not text.has_media:
+                    # the nodes under an empty node are empty too
+                    del empty_nodes[text.empty_start:]
+                    empty_nodes.append(node)
+                else:
+                    parent.has_text = parent.has_text or text.has_text
+                    parent.has_media = parent.has_media or is_media or \
+                        text.has_media
+                    if remove_fewwords and self.is_fewwords_node(node, text):
+                        del fewwords_nodes[text.fewwords_start:]
+                        fewwords_nodes.append(node)
+                    else:
+                        parent.add(text)
+                        parent.kept_media = parent.kept_media or \
+                            is_media or text.kept_media
+            self.add_text(stack[-1], node.tail)
+
+        for node in reversed(empty_nodes):
+            self.parser.remove(node)
+        if 'remove_trailing_media_div' in formatters:
+            self.remove_trailing_media_div()
+        for nodes in (fewwords_nodes[::-1], twitter_nodes, figcaptions):
+            for node in nodes:
+                if node is top_node or any(
+                        e is top_node for e in node.iterancestors()):
+                    self.parser.remove(node)
+
+    def add_text(self, node_text, text):
+        """Appends a text or tail to the text of a node
+        """
+        if not text:
+            return
+        words = text.split()
+        if not words:
+            return
+        fragment = ' '.join(words)
+        node_text.has_text = True
+        if not node_text.fragments:
+            node_text.first = fragment[0]
+        node_text.last = fragment[-1]
+        node_text.chars += len(fragment)
+        node_text.fragments += 1
+        node_text.words += word_count(fragment)
+        stopwords = self.fewwords_stopwords
+        if node_text.parts is not None:
+            node_text.parts.append(fragment)
+        elif stopwords is not None:
+            # StopWords.get_stopword_count, without its WordStats
+            candidate_words = stopwords.candidate_words(
+                stopwords.remove_punctuation(fragment).lower())
+            stop_words = stopwords.STOP_WORDS or NO_STRINGS
+            node_text.stopwords += sum(
+                1 for word in candidate_words if word in stop_words)
+
+    def is_fewwords_node(self, node, text):
+        """Whether `remove_fewwords_paragraphs` removes `node`, of text
+        `text`
+        """
+        if not text.fragments:
+            stopwords = 0
+        elif text.parts is not None:
+            joined = ' '.join(text.parts)
+            stopwords = self.fewwords_stopwords.get_stopword_count(
+                joined).get_stopword_count()
+            if stopwords is None:
+                stopwords = text.words
+        elif self.language:
+            stopwords = text.stopwords or text.words
+        else:
+            stopwords = text.words
+        is_br_return = node.tag == 'br' and text.get_length() == 2 and \
+            text.first == '\\' and text.last == 'r'
+        if not is_br_return and stopwords < 3 and not text.kept_media:
+            return True
+        return text.first == '(' and text.last == ')'
+
     def remove_empty_tags(self):
         """It's common in top_node to exit tags that are filled with data
         within properties but not within the tags themselves, delete them
         """
-        all_nodes = self.parser.getElementsByTags(
-            self.get_top_node(), ['*'])
-        all_nodes.reverse()
-        for el in all_nodes:
-            tag = self.parser.getTag(el)
-            text = self.parser.getText(el)
-            if (tag != 'br' or text != '\\r') \
-                    and not text \
-                    and len(self.parser.getElementsByTag(
-                        el, tag='object')) == 0 \
-                    and len(self.parser.getElementsByTag(
-                        el, tag='embed')) == 0:
-                self.parser.remove(el)
+        self.remove_nodes(['remove_empty_tags'])
 
     def remove_trailing_media_div(self):
         """Punish the *last top level* node in the top_node if it's
@@ -190,36 +358,10 @@ class OutputFormatter(object):
         remove paragraphs that have less than x number of words,
         would indicate that it's some sort of link
         """
-        all_nodes = self.parser.getElementsByTags(self.get_top_node(), ['*'])
-        all_nodes.reverse()
-        for el in all_nodes:
-            tag = self.parser.getTag(el)
-            text = self.parser.getText(el)
-            if self.language:
-                stopwords = self.stopwords_class(language=self.language).\
-                    get_stopword_count(text).get_stopword_count()
-                if stopwords is None:
-                    stopwords = word_count(text)
-            else:
-                stopwords = word_count(text)
-            if (tag != 'br' or text != '\\r') and \
-                    stopwords < 3 and \
-                    len(self.parser.getElementsByTag(el, tag='object')) == 0 and \
-                    len(self.parser.getElementsByTag(el, tag='embed')) == 0:
-                self.parser.remove(el)
-            # TODO
-            # check if it is in the right place
-            else:
-                trimmed = self.parser.getText(el)
-                if trimmed.startswith("(") and trimmed.endswith(")"):
-                    self.parser.remove(el)
+        self.remove_nodes(['remove_fewwords_paragraphs'])
 
     def remove_twitter_media_widgets(self):
-        nodes = self.parser.css_select(self.top_node, '*[class^="twitter-"]')
-        for node in nodes:
-            self.parser.remove(node)
+        self.remove_nodes(['remove_twitter_media_widgets'])
 
     def remove_figcaption_tags(self):
-        all_nodes = self.parser.getElementsByTag(self.get_top_node(), 'figcaption')
-        for node in all_nodes:
-            self.parser.remove(node)
+        self.remove_nodes(['remove_figcaption_tags'])
@@ -7,28 +7,48 @@ Parser objects will only contain operations that manipulate
 or query an lxml or soup dom object generated from an article's html.
 """
 import logging
+import lxml.cssselect
 import lxml.etree
 import lxml.html
 import lxml.html.clean
+from lxml.html.defs import block_tags
 import re
 from html import unescape
 import string
 
-from bs4 import UnicodeDammit
-from copy import deepcopy
-
 from . import text
+from .charsets import decode_html, get_encoding
 
 log = logging.getLogger(__name__)
 
+REGEXP_NAMESPACE = {'re': 'http://exslt.org/regular-expressions'}
+LOWERCASE_ATTR = 'translate(@%s, "%s", "%s")' % (
+    '%s', string.ascii_uppercase, string.ascii_lowercase)
+
+# Compiled XPath and css selectors shared by the whole process, keyed by
+# the expression, or by the arguments the expression is built from
+_compiled_xpaths = {}
+_compiled_selectors = {}
+
 
 class Parser(object):
 
+    @classmethod
+    def compile_xpath(cls, expression, key=None, namespaces=None):
+        """Returns `expression` compiled once per process, under `key`
+        when the caller looks it up before building the expression
+        """
+        key = key or expression
+        xpath = _compiled_xpaths.get(key)
+        if xpath is None:
+            xpath = lxml.etree.XPath(expression, namespaces=namespaces)
+            _compiled_xpaths[key] = xpath
+        return xpath
+
     @classmethod
     def xpath_re(cls, node, expression):
-        regexp_namespace = "http://exslt.org/regular-expressions"
-        items = node.xpath(expression, namespaces={'re': regexp_namespace})
-        return items
+        xpath = cls.compile_xpath(expression, namespaces=REGEXP_NAMESPACE)
+        return xpath(node)
 
     @classmethod
     def drop_tag(cls, nodes):
@@ -40,20 +60,22 @@ class Parser(object):
 
     @classmethod
     def css_select(cls, node, selector):
-        return node.cssselect(selector)
+        compiled = _compiled_selectors.get(selector)
+        if compiled is None:
+            compiled = lxml.cssselect.CSSSelector(selector, translator='html')
+            _compiled_selectors[selector] = compiled
+        return compiled(node)
 
     @classmethod
-    def get_unicode_html(cls, html):
+    def get_unicode_html(cls, html, http_charset=None):
         if isinstance(html, str):
             return html
         if not html:
             return html
-        converted = UnicodeDammit(html, is_html=True)
-        if not converted.unicode_markup:
+        html, encoding = decode_html(html, http_charset)
+        if not html:
             raise Exception(
-                'Failed to detect encoding of article HTML, tried: %s' %
-                ', '.join(converted.tried_encodings))
-        html = converted.unicode_markup
+                'Failed to detect encoding of article HTML')
         return html
 
     @classmethod
@@ -71,6 +93,27 @@ class Parser(object):
             log.warn('fromstring() returned an invalid string: %s...', html[:20])
             return
 
+    @classmethod
+    def fromstring_bytes(cls, html, http_charset=None):
+        """Parses the `html` bytes straight from their detected encoding,
+        without decoding them to a string first. Falls back to `fromstring`
+        when the encoding is unknown to lxml.
+        """
+        encoding = get_encoding(html, http_charset)
+        if encoding is not None:
+            try:
+                parser = lxml.html.HTMLParser(
+                    encoding=encoding.replace('_', '-'))
+                cls.doc = lxml.html.fromstring(html, parser=parser)
+                return cls.doc
+            except LookupError:
+                pass
+            except Exception:
+                log.warn('fromstring_bytes() returned an invalid string: '
+                         '%s...', html[:20])
+                return
+        return cls.fromstring(cls.get_unicode_html(html, http_charset))
+
     @classmethod
     def clean_article_html(cls, node):
         article_cleaner = lxml.html.clean.Cleaner()
@@ -101,8 +144,7 @@ class Parser(object):
 
     @classmethod
     def getElementById(cls, node, idd):
-        selector = '//*[@id="%s"]' % idd
-        elems = node.xpath(selector)
+        elems = cls.compile_xpath('//*[@id=$idd]')(node, idd=idd)
         if elems:
             return elems[0]
         return None
@@ -110,23 +152,35 @@ class Parser(object):
     @classmethod
     def getElementsByTag(
             cls, node, tag=None, attr=None, value=None, childs=False, use_regex=False) -> list:
-        NS = None
-        # selector = tag or '*'
-        selector = 'descendant-or-self::%s' % (tag or '*')
-        if attr and value:
-            if use_regex:
-                NS = {"re": "http://exslt.org/regular-expressions"}
-                selector = '%s[re:test(@%s, "%s", "i")]' % (selector, attr, value)
-            else:
-                trans = 'translate(@%s, "%s", "%s")' % (attr, string.ascii_uppercase, string.ascii_lowercase)
-                selector = '%s[contains(%s, "%s")]' % (selector, trans, value.lower())
-        elems = node.xpath(selector, namespaces=NS)
-        # remove the root node
-        # if we have a selection tag
-        if node in elems and (tag or childs):
-            elems.remove(node)
+        # the value is passed in as an xpath variable, one compiled
+        # expression serves every value of an attribute
+        if not (attr and value):
+            attr = value = use_regex = None
+        key = ('getElementsByTag', tag, attr, use_regex)
+        xpath = _compiled_xpaths.get(key)
+        if xpath is None:
+            selector = 'descendant-or-self::%s' % (tag or '*')
+            if attr and use_regex:
+                selector = '%s[re:test(@%s, $value, "i")]' % (selector, attr)
+            elif attr:
+                selector = '%s[contains(%s, $value)]' % (
+                    selector, LOWERCASE_ATTR % attr)
+            xpath = cls.compile_xpath(
+                selector, key=key, namespaces=REGEXP_NAMESPACE)
+        if value is None:
+            elems = xpath(node)
+        else:
+            elems = xpath(node, value=value if use_regex else value.lower())
+        # remove the root node if we have a selection tag, in document
+        # order it can only come first
+        if elems and elems[0] is node and (tag or childs):
+            del elems[0]
         return elems
 
+    @classmethod
+    def index_document(cls, doc, built=True):
+        return DocumentIndex(doc, built)
+
     @classmethod
     def appendChild(cls, node, child):
         node.append(child)
@@ -147,31 +201,71 @@ class Parser(object):
             root.text = None
             root.insert(0, t)
         # loop childs
-        for c, n in enumerate(list(root)):
-            idx = root.index(n)
+        for n in list(root):
             # don't process texts nodes
             if n.tag == 'text':
                 continue
             # create a text node for tail
             if n.tail:
                 t = cls.createElement(tag='text', text=n.tail, tail=None)
-                root.insert(idx + 1, t)
+                n.addnext(t)
         return list(root)
 
     @classmethod
     def textToPara(cls, text):
         return cls.fromstring(text)
 
+    @classmethod
+    def nodesToPara(cls, nodes):
+        """Builds out of `nodes`, texts and elements, the node `textToPara`
+        would parse from the texts and the html of the elements, each
+        element between two spaces: a lone element comes back as is, else
+        they are wrapped in a <div> when they hold block content and in a
+        <span> otherwise. The elements are moved, not copied, and the texts
+        are kept as text, never parsed as html
+        """
+        para = cls.createElement(tag='span')
+        last = None
+        txt = ''
+        for node in nodes:
+            if isinstance(node, str):
+                txt += node
+                continue
+            if last is None:
+                # leading blanks are dropped by the html parser
+                para.text = txt + ' ' if txt else None
+            else:
+                last.tail = txt + ' '
+            para.append(node)
+            last = node
+            txt = ' '
+        if last is None:
+            para.text = txt
+            return para
+        last.tail = txt
+        if len(para) == 1 and not para.text and not last.tail.strip():
+            para.remove(last)
+            return last
+        for node in para:
+            for e in node.iter(lxml.etree.Element):
+                if e.tag in block_tags:
+                    para.tag = 'div'
+                    return para
+        return para
+
     @classmethod
     def getChildren(cls, node):
         return node.getchildren()
 
     @classmethod
     def getElementsByTags(cls, node, tags):
-        selector = 'descendant::*[%s]' % (
-            ' or '.join('self::%s' % tag for tag in tags))
-        elems = node.xpath(selector)
-        return elems
+        key = ('getElementsByTags',) + tuple(tags)
+        xpath = _compiled_xpaths.get(key)
+        if xpath is None:
+            selector = 'descendant::*[%s]' % (
+                ' or '.join('self::%s' % tag for tag in tags))
+            xpath = cls.compile_xpath(selector, key=key)
+        return xpath(node)
 
     @classmethod
     def createElement(cls, tag='p', text=None, tail=None):
@@ -183,12 +277,25 @@ class Parser(object):
 
     @classmethod
     def getComments(cls, node):
-        return node.xpath('//comment()')
+        return cls.compile_xpath('//comment()')(node)
 
     @classmethod
     def getParent(cls, node):
         return node.getparent()
 
+    @classmethod
+    def getRoot(cls, node):
+        return node.getroottree().getroot()
+
+    @classmethod
+    def walk(cls, node):
+        """Yields the ('start', element), ('end', element), ('comment',
+        comment) and ('pi', processing instruction) events of a depth first
+        walk over `node`
+        """
+        return lxml.etree.iterwalk(
+            node, events=('start', 'end', 'comment', 'pi'))
+
     @classmethod
     def remove(cls, node):
         parent = node.getparent()
@@ -256,11 +363,8 @@ class Parser(object):
 
     @classmethod
     def outerHtml(cls, node):
-        e0 = node
-        if e0.tail:
-            e0 = deepcopy(e0)
-            e0.tail = None
-        return cls.nodeToString(e0)
+        return lxml.etree.tostring(
+            node, method='html', with_tail=False).decode()
 
     @classmethod
     def is_tag_visible(cls, tag):
@@ -270,3 +374,70 @@ class Parser(object):
                 r'(display:[\s]*none|visibility:[\s]*hidden)', _style.lower()):
             return False
         return True
+
+
+class DocumentIndex(object):
+    """The meta, link and heading nodes of a document, along with the
+    attribute values metadata extraction looks up, gathered in a single
+    traversal. Its queries answer like the `Parser` methods of the same
+    name would on the indexed document, without walking it again. The
+    queries it doesn't cover, and all of them when it is not `built`,
+    walk the document. It goes stale once the document is modified.
+    """
+    TAGS = ('meta', 'link', 'base', 'title', 'h1', 'a')
+    ATTRS = ('name', 'rel', 'itemprop', 'class', 'id', 'property',
+             'http-equiv', 'pubdate')
+
+    def __init__(self, doc, built=True):
+        self.doc = doc
+        self.built = built
+        if not built:
+            return
+        self.tags = dict((tag, []) for tag in self.TAGS)
+        # attr -> [(node, value, lowercased value)] in document order
+        self.attrs = dict((attr, []) for attr in self.ATTRS)
+        for node in doc.iter():
+            tag = node.tag
+            if not isinstance(tag, str):
+                # comments and processing instructions
+                continue
+            if tag in self.tags:
+                self.tags[tag].append(node)
+            for attr, value in node.items():
+                if attr in self.attrs:
+                    self.attrs[attr].append((node, value, value.lower()))
+
+    def getElementsByTag(self, tag=None, attr=None, value=None,
+                         use_regex=False):
+        if not (attr and value):
+            attr = value = None
+        covered = attr in self.ATTRS if attr else tag in self.TAGS
+        if not (self.built and covered):
+            return Parser.getElementsByTag(self.doc, tag=tag, attr=attr,
+                                           value=value, use_regex=use_regex)
+        if attr:
+            if use_regex:
+                regex = re.compile(value, re.IGNORECASE)
+                elems = [node for node, raw, _ in self.attrs[attr]
+                         if regex.search(raw)]
+            else:
+                value = value.lower()
+                elems = [node for node, _, lower in self.attrs[attr]
+                         if value in lower]
+            if tag:
+                elems = [node for node in elems if node.tag == tag]
+        else:
+            elems = list(self.tags[tag])
+        # remove the root node if we have a selection tag, in document
+        # order it can only come first
+        if tag and elems and elems[0] is self.doc:
+            del elems[0]
+        return elems
+
+    def getMetaByAttribute(self, attr, value):
+        """The meta tags whose `attr` is exactly `value`, as matched by
+        the css selector meta[attr="value"]
+        """
+        metas = self.tags['meta'] if self.built else \
+            Parser.getElementsByTag(self.doc, tag='meta')
+        return [node for node in metas if node.get(attr) == value]
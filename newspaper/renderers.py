@@ -0,0 +1,378 @@
+# -*- coding: utf-8 -*-
+"""
+Long-lived rendering backends for the javascript content strategies of
+`network.get_html_2XX_only`. Starting a browser or a casperjs process costs
+seconds, so they are pooled and leased per page instead of being started
+per url.
+"""
+__title__ = 'newspaper'
+__author__ = 'Lucas Ou-Yang'
+__license__ = 'MIT'
+__copyright__ = 'Copyright 2014, Lucas Ou-Yang'
+
+import atexit
+import json
+import os
+import logging
+import queue
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from urllib.parse import urljoin
+
+import requests
+from requests.adapters import HTTPAdapter
+
+log = logging.getLogger(__name__)
+
+CASPERJS_WORKER = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                               'casperjs/render_worker.js')
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class RenderError(Exception):
+    """A render worker crashed or did not answer in time
+    """
+
+
+def firefox(log_file=None, headless=True):
+    """Default browser factory of the selenium content strategy
+    """
+    from selenium import webdriver
+    try:
+        from selenium.webdriver.firefox.firefox_binary import FirefoxBinary
+    except ImportError:
+        # selenium >= 4.10 dropped FirefoxBinary, firefox runs headless
+        options = webdriver.FirefoxOptions()
+        if headless:
+            options.add_argument('-headless')
+        service = webdriver.FirefoxService(log_output=log_file)
+        return webdriver.Firefox(options=options, service=service)
+    return webdriver.Firefox(firefox_binary=FirefoxBinary(log_file=log_file))
+
+
+class PooledBrowser(object):
+    """A browser of a `BrowserPool` and the number of pages it rendered
+    """
+    def __init__(self, driver):
+        self.driver = driver
+        self.pages = 0
+        self.broken = False
+
+    def is_alive(self):
+        """Health check, a crashed browser or a dead webdriver session
+        fails to answer the cheapest command there is
+        """
+        try:
+            self.driver.current_url
+        except Exception:
+            return False
+        return True
+
+    def quit(self):
+        try:
+            self.driver.quit()
+        except Exception as e:
+            log.debug('Quitting browser failed: %s' % e)
+
+
+class CasperWorker(object):
+    """A long-running casperjs process, it reads one url per line on its
+    stdin and answers with one JSON line holding the http status and the
+    html of the page
+    """
+    def __init__(self, command):
+        self.process = subprocess.Popen(
+            command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL)
+        self.lines = queue.Queue()
+        self.pages = 0
+        self.broken = False
+        reader = threading.Thread(target=self._read)
+        reader.daemon = True
+        reader.start()
+
+    def _read(self):
+        for line in self.process.stdout:
+            self.lines.put(line)
+        self.lines.put(None)
+
+    def is_alive(self):
+        return self.process.poll() is None
+
+    def render(self, url, timeout):
+        """Returns the (status, html) of `url`, raises `RenderError` if
+        the worker dies or takes longer than `timeout` seconds
+        """
+        try:
+            self.process.stdin.write(url.encode('utf-8') + b'\n')
+            self.process.stdin.flush()
+        except OSError as e:
+            raise RenderError('casperjs worker is gone: %s' % e)
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                line = self.lines.get(
+                    timeout=max(0, deadline - time.monotonic()))
+            except queue.Empty:
+                raise RenderError('timeout')
+            if line is None:
+                raise RenderError('casperjs worker exited')
+            try:
+                reply = json.loads(line.decode('utf-8'))
+            except ValueError:
+                # casperjs and phantomjs warnings
+                continue
+            return reply['status'], reply['html']
+
+    def quit(self):
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+        self.process.kill()
+        self.process.wait()
+
+
+class WorkerPool(object):
+    """Keeps up to `size` long-lived workers and leases them to one page
+    at a time, threads wait for a free worker. Workers are health checked
+    before each lease, recycled after `max_pages` pages and dropped when a
+    page fails, the next lease starts a fresh one.
+    """
+    def __init__(self, size=2, max_pages=100):
+        self.size = size
+        self.max_pages = max_pages
+        self.idle = []
+        self.leased = 0
+        self.closed = False
+        self.cond = threading.Condition()
+
+    def _start(self):
+        raise NotImplementedError
+
+    def _acquire(self):
+        with self.cond:
+            while not self.idle and self.leased >= self.size:
+                self.cond.wait()
+            self.leased += 1
+            worker = self.idle.pop() if self.idle else None
+        try:
+            while worker is not None and not worker.is_alive():
+                log.warning('Dropping dead worker of %s' %
+                            type(self).__name__)
+                worker.quit()
+                with self.cond:
+                    worker = self.idle.pop() if self.idle else None
+            return worker or self._start()
+        except BaseException:
+            self._release(None)
+            raise
+
+    def _release(self, worker):
+        if worker is not None and (self.closed or worker.broken or
+                                   worker.pages >= self.max_pages):
+            worker.quit()
+            worker = None
+        with self.cond:
+            self.leased -= 1
+            if worker is not None:
+                self.idle.append(worker)
+            self.cond.notify()
+
+    @contextmanager
+    def lease(self):
+        """Holds a worker of the pool, it is dropped if the block raises
+        """
+        worker = self._acquire()
+        try:
+            yield worker
+            worker.pages += 1
+        except BaseException:
+            worker.broken = True
+            raise
+        finally:
+            self._release(worker)
+
+    def close(self):
+        """Quits the idle workers, leased ones are quit on release
+        """
+        with self.cond:
+            idle, self.idle = self.idle, []
+            self.closed = True
+        for worker in idle:
+            worker.quit()
+
+
+class BrowserPool(WorkerPool):
+    """`WorkerPool` of selenium browsers built by `factory`, every page is
+    bounded by `page_load_timeout`. With `virtual_display` one
+    pyvirtualdisplay display is started for the whole pool, for browsers
+    which can't run headless.
+    """
+    def __init__(self, factory=firefox, size=2, max_pages=100,
+                 page_load_timeout=30, virtual_display=False):
+        super(BrowserPool, self).__init__(size, max_pages)
+        self.factory = factory
+        self.page_load_timeout = page_load_timeout
+        self.virtual_display = virtual_display
+        self.display = None
+
+    def _start(self):
+        with self.cond:
+            if self.virtual_display and self.display is None:
+                import pyvirtualdisplay
+
+                self.display = pyvirtualdisplay.Display()
+                self.display.start()
+        driver = self.factory()
+        if self.page_load_timeout:
+            driver.set_page_load_timeout(self.page_load_timeout)
+        return PooledBrowser(driver)
+
+    def render(self, url):
+        """Loads `url` in a pooled browser and returns its page source,
+        selenium's TimeoutException is raised past `page_load_timeout`
+        """
+        with self.lease() as browser:
+            browser.driver.get(url)
+            log.info('Url: {} got response from Selenium'.format(url))
+            # webdriver does not support returning HTTP status code
+            return browser.driver.page_source
+
+    def close(self):
+        super(BrowserPool, self).close()
+        if self.display is not None:
+            self.display.stop()
+            self.display = None
+
+
+class CasperPool(WorkerPool):
+    """`WorkerPool` of `CasperWorker` processes running `command`
+    """
+    def __init__(self, command, size=2, max_pages=100):
+        super(CasperPool, self).__init__(size, max_pages)
+        self.command = command
+
+    def _start(self):
+        return CasperWorker(self.command)
+
+    def render(self, url, timeout):
+        """Returns the (status, html) of `url`, raises `RenderError` when
+        the worker crashes or times out, it is then restarted
+        """
+        with self.lease() as worker:
+            return worker.render(url, timeout)
+
+
+class SplashClient(object):
+    """Client of a Splash rendering service at `host`. Requests go through
+    a session pooling one keep-alive connection per Splash slot, at most
+    `slots` renders are in flight so Splash never queues them. `wait` is
+    the time given to the page scripts after load and `timeout` the render
+    budget Splash is given, both in seconds.
+    """
+    def __init__(self, host, slots=20, wait=0.5, timeout=30):
+        self.endpoint = urljoin(host, '/render.html')
+        self.slots = slots
+        self.wait = wait
+        self.timeout = timeout
+        self.semaphore = threading.BoundedSemaphore(slots)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=slots)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def render(self, url, wait=None, timeout=None):
+        """Returns the (status, html bytes) Splash answers for `url`, raises
+        `RenderError` when the render times out
+        """
+        wait = self.wait if wait is None else wait
+        timeout = self.timeout if timeout is None else timeout
+        params = {'url': url, 'wait': wait, 'timeout': timeout}
+        with self.semaphore:
+            try:
+                # Splash answers 504 itself when the render budget is spent,
+                # the client timeout only covers a stuck service
+                response = self.session.get(self.endpoint, params=params,
+                                            timeout=timeout + wait + 5)
+            except requests.Timeout:
+                raise RenderError('timeout')
+        if response.status_code == 504:
+            raise RenderError('timeout')
+        log.info('Url: {} got response from Splash'.format(url))
+        return response.status_code, response.content
+
+    def render_many(self, urls, wait=None, timeout=None):
+        """Renders `urls` concurrently on every slot, returns their
+        (status, html bytes) in order, or the exception a render raised
+        """
+        def render(url):
+            try:
+                return self.render(url, wait, timeout)
+            except (RenderError, requests.RequestException) as e:
+                return e
+
+        with ThreadPoolExecutor(self.slots) as executor:
+            return list(executor.map(render, urls))
+
+    def close(self):
+        self.session.close()
+
+
+def _get_pool(key, build):
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = build()
+    return pool
+
+
+def get_browser_pool(config):
+    """Returns the process-wide `BrowserPool` for the selenium settings of
+    `config.content_strategy['kwargs']`: `log_file`, `pool_size`,
+    `max_pages`, `page_load_timeout` and `virtual_display`
+    """
+    kwargs = config.content_strategy['kwargs']
+    log_file = kwargs.get('log_file')
+    key = ('selenium', log_file, kwargs.get('pool_size', 2),
+           kwargs.get('max_pages', 100), kwargs.get('page_load_timeout', 30),
+           kwargs.get('virtual_display', True))
+    return _get_pool(key, lambda: BrowserPool(
+        lambda: firefox(log_file), size=key[2], max_pages=key[3],
+        page_load_timeout=key[4], virtual_display=key[5]))
+
+
+def get_casper_pool(config, casperjs_path):
+    """Returns the process-wide `CasperPool` for the casperjs settings of
+    `config.content_strategy['kwargs']`: `pool_size` and `max_pages`
+    """
+    kwargs = config.content_strategy['kwargs']
+    key = ('casperjs', casperjs_path, kwargs.get('pool_size', 2),
+           kwargs.get('max_pages', 100))
+    return _get_pool(key, lambda: CasperPool(
+        [casperjs_path, CASPERJS_WORKER], size=key[2], max_pages=key[3]))
+
+
+def get_splash_client(config):
+    """Returns the process-wide `SplashClient` for the splash settings of
+    `config.content_strategy['kwargs']`: `host`, `slots`, `wait` and
+    `timeout`, which defaults to `config.request_timeout`
+    """
+    kwargs = config.content_strategy['kwargs']
+    key = ('splash', kwargs['host'], kwargs.get('slots', 20),
+           kwargs.get('wait', 0.5),
+           kwargs.get('timeout', config.request_timeout))
+    return _get_pool(key, lambda: SplashClient(*key[1:]))
+
+
+@atexit.register
+def close_pools():
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
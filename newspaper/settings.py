@@ -54,4 +54,11 @@ ANCHOR_DIRECTORY = os.path.join(TOP_DIRECTORY, CF_CACHE_DIRECTORY)
 if not os.path.exists(ANCHOR_DIRECTORY):
     os.mkdir(ANCHOR_DIRECTORY)
 
+# http response cache, bodies are revalidated with their ETag/Last-Modified
+HTTP_CACHE_FILE = 'http_cache'
+HTTP_CACHE_DIRECTORY = os.path.join(TOP_DIRECTORY, HTTP_CACHE_FILE)
+
+if not os.path.exists(HTTP_CACHE_DIRECTORY):
+    os.mkdir(HTTP_CACHE_DIRECTORY)
+
 TRENDING_URL = 'http://www.google.com/trends/hottrends/atom/feed?pn=p1'
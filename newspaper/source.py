@@ -89,6 +89,8 @@ class Source(object):
         self.parse()
 
         self.set_categories()
+        if self.config.prewarm_connections:
+            network.prewarm([c.url for c in self.categories], self.config)
         self.download_categories()  # mthread
         self.parse_categories()
 
@@ -98,6 +100,23 @@ class Source(object):
 
         self.generate_articles()
 
+    async def abuild(self):
+        """Asyncio version of `build`, all downloads of the source share
+        one `network.AsyncClient`
+        """
+        async with network.AsyncClient(self.config) as client:
+            await self.adownload(client)
+            self.parse()
+
+            self.set_categories()
+            await self.adownload_categories(client)
+            self.parse_categories()
+
+            await self.aset_feeds(client)
+            await self.adownload_feeds(client)
+
+            self.generate_articles()
+
     def purge_articles(self, reason, articles):
         """Delete rejected articles, if there is an articles param,
         purge from there, otherwise purge from source instance.
@@ -129,6 +148,21 @@ class Source(object):
         """Don't need to cache getting feed urls, it's almost
         instant with xpath
         """
+        common_feed_urls_as_categories = self._get_common_feed_categories()
+        category_urls = [c.url for c in common_feed_urls_as_categories]
+        requests = network.multithread_request(category_urls, self.config)
+        self._set_feeds(common_feed_urls_as_categories, requests)
+
+    async def aset_feeds(self, client=None):
+        """Asyncio version of `set_feeds`
+        """
+        common_feed_urls_as_categories = self._get_common_feed_categories()
+        category_urls = [c.url for c in common_feed_urls_as_categories]
+        requests = await network.async_request(
+            category_urls, self.config, client=client)
+        self._set_feeds(common_feed_urls_as_categories, requests)
+
+    def _get_common_feed_categories(self):
         common_feed_urls = ['/feed', '/feeds', '/rss']
         common_feed_urls = [urljoin(self.url, url) for url in common_feed_urls]
 
@@ -140,11 +174,9 @@ class Source(object):
                 new_parts = split.scheme, split.netloc, new_path, '', ''
                 common_feed_urls.append(urlunsplit(new_parts))
 
-        common_feed_urls_as_categories = [Category(url=url) for url in common_feed_urls]
-
-        category_urls = [c.url for c in common_feed_urls_as_categories]
-        requests = network.multithread_request(category_urls, self.config)
+        return [Category(url=url) for url in common_feed_urls]
 
+    def _set_feeds(self, common_feed_urls_as_categories, requests):
         for index, _ in enumerate(common_feed_urls_as_categories):
             response = requests[index].resp
             if response and response.ok:
@@ -176,12 +208,27 @@ class Source(object):
         """
         self.html = network.get_html(self.url, self.config)
 
+    async def adownload(self, client=None):
+        """Asyncio version of `download`
+        """
+        self.html = await network.aget_html(self.url, self.config, client)
+
     def download_categories(self):
         """Download all category html, can use mthreading
         """
         category_urls = [c.url for c in self.categories]
         requests = network.multithread_request(category_urls, self.config)
+        self._set_categories_html(requests)
+
+    async def adownload_categories(self, client=None):
+        """Asyncio version of `download_categories`
+        """
+        category_urls = [c.url for c in self.categories]
+        requests = await network.async_request(
+            category_urls, self.config, client=client)
+        self._set_categories_html(requests)
 
+    def _set_categories_html(self, requests):
         for index, _ in enumerate(self.categories):
             req = requests[index]
             if req.resp is not None:
@@ -198,7 +245,17 @@ class Source(object):
         """
         feed_urls = [f.url for f in self.feeds]
         requests = network.multithread_request(feed_urls, self.config)
+        self._set_feeds_rss(requests)
+
+    async def adownload_feeds(self, client=None):
+        """Asyncio version of `download_feeds`
+        """
+        feed_urls = [f.url for f in self.feeds]
+        requests = await network.async_request(
+            feed_urls, self.config, client=client)
+        self._set_feeds_rss(requests)
 
+    def _set_feeds_rss(self, requests):
         for index, _ in enumerate(self.feeds):
             req = requests[index]
             if req.resp is not None:
@@ -342,28 +399,59 @@ class Source(object):
         """
         # TODO fix how the article's is_downloaded is not set!
         urls = [a.url for a in self.articles]
-        failed_articles = []
 
         if threads == 1:
-            for index, article in enumerate(self.articles):
-                url = urls[index]
-                html = network.get_html(url, config=self.config)
-                self.articles[index].set_html(html)
-                if not html:
-                    failed_articles.append(self.articles[index])
-            self.articles = [a for a in self.articles if a.html]
+            for article in self.articles:
+                self._download_article(article)
         else:
-            if threads > 5:
+            if threads > 5 and not (self.config.host_rate_limit or
+                                    self.config.max_connections_per_host):
                 print(('Using 5+ threads on a single source '
                        'may get you rate limited!'))
-            filled_requests = network.multithread_request(urls, self.config)
-            # Note that the responses are returned in original order
-            for index, req in enumerate(filled_requests):
+            filled_requests = network.multithread_request(
+                urls, self.config, render=True)
+            self._set_articles_html(filled_requests)
+        self._finish_articles_download()
+
+    async def adownload_articles(self, client=None):
+        """Asyncio version of `download_articles`, concurrency is bounded
+        by the `async_concurrency` config values instead of threads
+        """
+        urls = [a.url for a in self.articles]
+        filled_requests = await network.async_request(
+            urls, self.config, client=client, render=True)
+        self._set_articles_html(filled_requests)
+        self._finish_articles_download()
+
+    def _download_article(self, article):
+        if not self.config.parse_bytes:
+            html = network.get_html(article.url, config=self.config)
+            article.set_html(html)
+            return
+        try:
+            article.set_html(*network.get_html_bytes_2XX_only(
+                article.url, self.config))
+        except network.NetworkError as e:
+            log.debug('get_html_bytes_2XX_only() error. %s on URL: %s' %
+                      (e, article.url))
+
+    def _set_articles_html(self, filled_requests):
+        # Note that the responses are returned in original order
+        for index, req in enumerate(filled_requests):
+            if self.config.parse_bytes and req.resp is not None:
+                self.articles[index].set_html(
+                    *network.get_html_bytes_2XX_only(
+                        req.url, self.config, req.resp))
+            else:
                 html = network.get_html(req.url, response=req.resp)
                 self.articles[index].set_html(html)
-                if not req.resp:
-                    failed_articles.append(self.articles[index])
-            self.articles = [a for a in self.articles if a.html]
+
+    def _finish_articles_download(self):
+        """Drops the articles whose download failed
+        """
+        failed_articles = [a for a in self.articles
+                           if not (a.raw_html or a.html)]
+        self.articles = [a for a in self.articles if a.raw_html or a.html]
 
         self.is_downloaded = True
         if len(failed_articles) > 0:
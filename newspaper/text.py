@@ -58,7 +58,7 @@ class WordStats(object):
 
 class StopWords(object):
 
-    TRANS_TABLE = str.maketrans('', '')
+    TRANS_TABLE = str.maketrans('', '', string.punctuation)
     _cached_stop_words = {}
 
     def __init__(self, language='en'):
@@ -73,13 +73,9 @@ class StopWords(object):
     def remove_punctuation(self, content):
         # code taken form
         # http://stackoverflow.com/questions/265960/best-way-to-strip-punctuation-from-a-string-in-python
-        content_is_unicode = isinstance(content, str)
-        if content_is_unicode:
-            content = content.encode('utf-8')
-        trans_table = {ord(c): None for c in string.punctuation}
-        stripped_input = content.decode('utf-8').translate(trans_table)
-
-        return stripped_input
+        if not isinstance(content, str):
+            content = content.decode('utf-8')
+        return content.translate(self.TRANS_TABLE)
 
     def candidate_words(self, stripped_input):
         return stripped_input.split(' ')
@@ -113,7 +109,7 @@ class StopWordsChinese(StopWords):
         # jieba builds a tree that takes a while. avoid building
         # this tree if we don't use the chinese language
         import jieba
-        return jieba.cut(stripped_input, cut_all=True)
+        return list(jieba.cut(stripped_input, cut_all=True))
 
 
 class StopWordsArabic(StopWords):
@@ -0,0 +1,286 @@
+# -*- coding: utf-8 -*-
+"""
+Reading and writing of WARC/1.0 files, the archive format of web crawls.
+Downloads are appended as request and response records when
+`config.warc_file` is set, `api.read_warc` parses archived pages again
+without touching the network.
+"""
+__title__ = 'newspaper'
+__author__ = 'Lucas Ou-Yang'
+__license__ = 'MIT'
+__copyright__ = 'Copyright 2014, Lucas Ou-Yang'
+
+import atexit
+import base64
+import gzip
+import hashlib
+import logging
+import os
+import threading
+import uuid
+import zlib
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+import requests
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from .version import __version__
+
+log = logging.getLogger(__name__)
+
+WARC_VERSION = b'WARC/1.0'
+GZIP_MAGIC = b'\x1f\x8b'
+WARC_SUFFIXES = ('.warc', '.warc.gz')
+
+# Bodies are archived decoded, so the headers describing the transfer
+# are dropped from the archived response
+TRANSFER_HEADERS = ('content-encoding', 'transfer-encoding',
+                    'content-length')
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+def _record_id():
+    return '<urn:uuid:%s>' % uuid.uuid4()
+
+
+def _digest(data):
+    return 'sha1:' + base64.b32encode(hashlib.sha1(data).digest()).decode()
+
+
+def _format_headers(headers):
+    return ''.join('%s: %s\r\n' % (name, value)
+                   for name, value in headers.items()).encode('latin-1',
+                                                              'replace')
+
+
+def format_record(type, url, block, content_type, date, record_id,
+                  **extra):
+    """Serializes one WARC record holding `block`, `extra` headers are
+    given as keyword arguments, `WARC_Concurrent_To` is written as
+    `WARC-Concurrent-To`
+    """
+    headers = [('WARC-Type', type), ('WARC-Record-ID', record_id),
+               ('WARC-Date', date)]
+    if url is not None:
+        headers.append(('WARC-Target-URI', url))
+    headers.extend((name.replace('_', '-'), value)
+                   for name, value in extra.items())
+    headers.append(('Content-Type', content_type))
+    headers.append(('Content-Length', str(len(block))))
+    return (WARC_VERSION + b'\r\n' + _format_headers(dict(headers)) +
+            b'\r\n' + block + b'\r\n\r\n')
+
+
+class WARCWriter(object):
+    """Appends records to the WARC file at `path`, every record is a gzip
+    member of its own when `path` ends with `.gz`. A request and its
+    response are written together under a lock, so the threads of a
+    process don't interleave them. Nothing keeps several processes from
+    interleaving theirs, each process should write its own file. A
+    `warcinfo` record starts new files.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.compress = path.endswith('.gz')
+        self.lock = threading.Lock()
+        self.file = open(path, 'ab')
+        if self.file.tell() == 0:
+            info = ('software: newspaper/%s\r\n'
+                    'format: WARC File Format 1.0\r\n' % __version__)
+            self._write(format_record(
+                'warcinfo', None, info.encode(), 'application/warc-fields',
+                self._date(), _record_id(),
+                WARC_Filename=os.path.basename(path)))
+
+    def _date(self):
+        return datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+    def _write(self, *records):
+        if self.compress:
+            # one gzip member per record, so readers can seek to records
+            records = [gzip.compress(record) for record in records]
+        with self.lock:
+            self.file.write(b''.join(records))
+            self.file.flush()
+
+    def write_exchange(self, url, request_headers, status, reason, headers,
+                       body, method='GET'):
+        """Archives a request to `url` along with the response it got,
+        `body` is the decoded response body
+        """
+        parts = urlsplit(url)
+        target = (parts.path or '/') + ('?' + parts.query if parts.query
+                                        else '')
+        request_block = ('%s %s HTTP/1.1\r\n' % (method, target)).encode() + \
+            _format_headers(request_headers) + b'\r\n'
+        headers = dict((name, value) for name, value in headers.items()
+                       if name.lower() not in TRANSFER_HEADERS)
+        headers['Content-Length'] = str(len(body))
+        response_block = ('HTTP/1.1 %d %s\r\n' % (status, reason or '')
+                          ).encode('latin-1', 'replace') + \
+            _format_headers(headers) + b'\r\n' + body
+
+        date = self._date()
+        response_id = _record_id()
+        response = format_record(
+            'response', url, response_block,
+            'application/http; msgtype=response', date, response_id,
+            WARC_Payload_Digest=_digest(body))
+        request = format_record(
+            'request', url, request_block,
+            'application/http; msgtype=request', date, _record_id(),
+            WARC_Concurrent_To=response_id)
+        self._write(response, request)
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+
+def get_warc_writer(config):
+    """Returns the process-wide `WARCWriter` of `config.warc_file`, None
+    if downloads are not archived
+    """
+    if not config.warc_file:
+        return None
+    path = os.path.abspath(os.path.expanduser(config.warc_file))
+    with _writers_lock:
+        writer = _writers.get(path)
+        if writer is None:
+            writer = _writers[path] = WARCWriter(path)
+    return writer
+
+
+@atexit.register
+def close_warc_writers():
+    with _writers_lock:
+        for writer in _writers.values():
+            writer.close()
+        _writers.clear()
+
+
+def _dechunk(body):
+    chunks = []
+    while body:
+        line, _, body = body.partition(b'\r\n')
+        size = int(line.split(b';')[0].strip() or b'0', 16)
+        if size == 0:
+            break
+        chunks.append(body[:size])
+        body = body[size + 2:]
+    return b''.join(chunks)
+
+
+def _decompress(body, encoding):
+    if encoding in ('gzip', 'x-gzip', 'deflate'):
+        # wbits 47 detects the gzip and zlib headers, raw deflate has none
+        try:
+            return zlib.decompress(body, 47)
+        except zlib.error:
+            return zlib.decompress(body, -zlib.MAX_WBITS)
+    if encoding == 'br':
+        try:
+            import brotli
+        except ImportError:
+            import brotlicffi as brotli
+        return brotli.decompress(body)
+    if encoding == 'zstd':
+        import zstandard
+        return zstandard.ZstdDecompressor().decompressobj().decompress(body)
+    return body
+
+
+class WARCRecord(object):
+    """A record read from a WARC file, `headers` are the WARC headers and
+    `content` the raw block
+    """
+    def __init__(self, headers, content):
+        self.headers = headers
+        self.content = content
+
+    @property
+    def type(self):
+        return self.headers.get('WARC-Type')
+
+    @property
+    def url(self):
+        url = self.headers.get('WARC-Target-URI', '')
+        # WARC/0.18 files wrap the uri in angle brackets
+        return url.strip('<>')
+
+    def http_response(self):
+        """Parses a response record into a consumed `requests.Response`,
+        chunked and compressed bodies of archives written by other crawlers
+        are decoded. None if the block is not an http response.
+        """
+        head, _, body = self.content.partition(b'\r\n\r\n')
+        lines = head.decode('latin-1').split('\r\n')
+        status = lines[0].split(' ', 2)
+        if len(status) < 2 or not status[0].startswith('HTTP/') or \
+                not status[1].isdigit():
+            return None
+        headers = CaseInsensitiveDict()
+        for line in lines[1:]:
+            name, _, value = line.partition(':')
+            headers[name.strip()] = value.strip()
+        try:
+            if 'chunked' in headers.get('transfer-encoding', '').lower():
+                body = _dechunk(body)
+            encoding = headers.get('content-encoding', '').lower().strip()
+            body = _decompress(body, encoding)
+        except (ValueError, zlib.error, ImportError) as e:
+            log.debug('Could not decode archived body of %s: %s' %
+                      (self.url, e))
+            return None
+
+        response = requests.Response()
+        response.status_code = int(status[1])
+        response.reason = status[2] if len(status) > 2 else ''
+        response.headers = headers
+        response.url = self.url
+        response.encoding = get_encoding_from_headers(headers)
+        response._content = body
+        response._content_consumed = True
+        return response
+
+
+def _read_records(f):
+    while True:
+        line = f.readline()
+        if not line:
+            return
+        if not line.startswith(b'WARC/'):
+            # blank lines closing the previous record
+            continue
+        headers = CaseInsensitiveDict()
+        for line in iter(f.readline, b''):
+            line = line.rstrip(b'\r\n')
+            if not line:
+                break
+            name, _, value = line.decode('utf-8', 'replace').partition(':')
+            headers[name.strip()] = value.strip()
+        length = int(headers.get('Content-Length', 0))
+        yield WARCRecord(headers, f.read(length))
+
+
+def iter_records(path):
+    """Yields the records of the WARC file at `path`, or of every `.warc`
+    and `.warc.gz` file of the directory `path` in name order. Compressed
+    files are detected from their content.
+    """
+    if os.path.isdir(path):
+        paths = sorted(os.path.join(path, name) for name in os.listdir(path)
+                       if name.endswith(WARC_SUFFIXES))
+    else:
+        paths = [path]
+    for path in paths:
+        with open(path, 'rb') as f:
+            compressed = f.read(2) == GZIP_MAGIC
+        opener = gzip.open if compressed else open
+        with opener(path, 'rb') as f:
+            for record in _read_records(f):
+                yield record
@@ -6,6 +6,7 @@ Multi-thread:           5.9 secs (10 threads) for 100 requests
 Async-IO with Gevent:   10.5 secs  for 100 requests
 Single thread:          86.0 secs for 100 requests
 """
+import asyncio
 import sys
 import logging
 import queue
@@ -29,7 +30,7 @@ log = logging.getLogger(__name__)
 PARENT_DIR = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, os.path.join(PARENT_DIR, '..'))
 
-from newspaper.network import multithread_request, sync_request
+from newspaper.network import async_request, multithread_request, sync_request
 from newspaper.utils import print_duration
 
 
@@ -55,10 +56,8 @@ def mthread_run(urls):
 def asyncio_run(urls):
     """download a bunch of urls via async io
     """
-    pass
-    # rs = (grequests.request('GET', u, **req_kwargs) for u in urls)
-    # responses = async_request(urls)
-    # print(responses)
+    reqs = asyncio.run(async_request(urls))
+    resps = [req.resp for req in reqs]
 
 
 def benchmark():
@@ -67,7 +66,7 @@ def benchmark():
     urls = read_urls(amount=1000)
     # naive_run(urls)
     mthread_run(urls)
-    # asyncio_run(urls)
+    asyncio_run(urls)
 
 
 if __name__ == '__main__':
@@ -9,6 +9,8 @@ import time
 import traceback
 from collections import defaultdict, OrderedDict
 import concurrent.futures
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
 TEST_DIR = os.path.abspath(os.path.dirname(__file__))
 PARENT_DIR = os.path.join(TEST_DIR, '..')
@@ -73,6 +75,75 @@ def get_base_domain(url):
     return base_domain
 
 
+class LocalServer(object):
+    """Serves canned responses on localhost, `routes` maps a path to
+    a (status, headers, body) tuple, or to a callable returning it from the
+    request handler. Paths without a query string match any query. Counts
+    the TCP connections it accepts, so tests can tell whether connections
+    were reused. Responses with a `Connection: close` header are sent without a
+    content-length, their body ends when the connection closes.
+    """
+    def __init__(self, routes):
+        self.routes = routes
+        self.connections = 0
+        self.requests = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                server.requests.append((self.path, dict(self.headers)))
+                route = server.routes.get(self.path) or server.routes.get(
+                    self.path.split('?')[0], (404, {}, b''))
+                if callable(route):
+                    route = route(self)
+                status, headers, body = route
+                if callable(body):
+                    body = body(self)
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                if 'Content-Length' not in headers and \
+                        'Connection' not in headers:
+                    self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        class Server(ThreadingHTTPServer):
+            def get_request(self):
+                request = ThreadingHTTPServer.get_request(self)
+                server.connections += 1
+                return request
+
+        self.httpd = Server(('127.0.0.1', 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = 'http://127.0.0.1:%d' % self.httpd.server_port
+
+    def wait_for_connections(self, count, timeout=5):
+        """Returns the number of connections once it reaches `count`, or
+        after `timeout` seconds. A client is connected before the server
+        thread accepts the connection
+        """
+        deadline = time.time() + timeout
+        while self.connections < count and time.time() < deadline:
+            time.sleep(0.01)
+        return self.connections
+
+    def __enter__(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
 def check_url(*args, **kwargs):
     return ExhaustiveFullTextCase.check_url(*args, **kwargs)
 
@@ -245,6 +316,97 @@ class ArticleTestCase(unittest.TestCase):
             self.article.clean_doc)
         self.assertEqual('article', meta_type)
 
+    @print_test
+    def test_lazy_clean_trees(self):
+        self.setup_stage('meta')
+        parser = self.article.config.get_parser()
+        clean_doc = self.article.clean_doc
+        self.assertIsNot(self.article.doc, clean_doc)
+        self.assertIs(clean_doc, self.article.clean_doc)
+        self.assertEqual(
+            1, len(parser.getElementsByTag(clean_doc, 'head')))
+
+        # a copy taken by parse, the extractor is left as it was
+        scores = self.article.extractor.get_gravity_scores()
+        clean_top_node = self.article.clean_top_node
+        self.assertIs(scores, self.article.extractor.get_gravity_scores())
+        self.assertIsNot(self.article.top_node, clean_top_node)
+        self.assertIn(
+            'We dodged a bullet', parser.getText(clean_top_node))
+
+    @print_test
+    def test_extraction_profiles(self):
+        self.setup_stage('meta')
+        html = mock_resource_with('cnn_article', 'html')
+
+        config = Configuration()
+        config.extraction_profile = 'metadata_only'
+        article = Article(self.article.url, config=config)
+        article.download(html)
+        article.parse()
+        self.assertEqual(self.article.title, article.title)
+        self.assertEqual(self.article.authors, article.authors)
+        self.assertEqual(self.article.publish_date, article.publish_date)
+        self.assertEqual(self.article.meta_data, article.meta_data)
+        self.assertEqual('', article.text)
+        self.assertIsNone(article.top_node)
+        self.assertEqual('', article.top_image)
+        # there is no text to judge the body by
+        self.assertTrue(article.is_valid_body())
+
+        config.extraction_profile = ('text', 'publish_date')
+        self.assertEqual({'text', 'publish_date', 'language', 'meta_lang'},
+                         config.get_extract_fields())
+        article = Article(self.article.url, config=config)
+        article.download(html)
+        article.parse()
+        self.assertEqual(self.article.text, article.text)
+        self.assertEqual(self.article.publish_date, article.publish_date)
+        self.assertEqual('', article.title)
+        self.assertEqual([], article.authors)
+        self.assertEqual({}, article.meta_data)
+        self.assertEqual([], article.movies)
+        self.assertTrue(article.is_valid_body())
+
+        config.extraction_profile = 'text only'
+        self.assertRaises(Exception, config.get_extract_fields)
+        config.extraction_profile = ('text', 'body')
+        self.assertRaises(Exception, config.get_extract_fields)
+
+    @print_test
+    def test_lazy_parse(self):
+        self.setup_stage('meta')
+        html = mock_resource_with('cnn_article', 'html')
+
+        config = Configuration()
+        config.lazy_parse = True
+        article = Article(self.article.url, config=config)
+        article.download(html)
+        article.parse()
+        self.assertTrue(article.is_parsed)
+        self.assertIn('body', article._pending_steps)
+        self.assertEqual(self.article.title, article.title)
+        self.assertEqual(self.article.publish_date, article.publish_date)
+        # the body is left alone until it is read
+        self.assertNotIn('title', article._pending_steps)
+        self.assertIn('body', article._pending_steps)
+        self.assertIn('authors', article._pending_steps)
+
+        self.assertEqual(self.article.text, article.text)
+        self.assertEqual(self.article.top_img, article.top_img)
+        self.assertEqual(self.article.movies, article.movies)
+        self.assertIn('authors', article._pending_steps)
+        # read from a fresh parse of the page once the body is cleaned
+        self.assertEqual(self.article.authors, article.authors)
+        self.assertEqual(self.article.meta_data, article.meta_data)
+        self.assertEqual(self.article.tags, article.tags)
+
+        article = Article(self.article.url, config=config)
+        article.download(html)
+        article.parse()
+        self.assertTrue(article.is_valid_body())
+        self.assertEqual(self.article.text, article.text)
+
     @print_test
     def test_meta_extraction(self):
         self.setup_stage('meta')
@@ -418,6 +580,214 @@ class ContentExtractorTestCase(unittest.TestCase):
             'https://example.com/meta_link_rel_icon.ico'
         )
 
+    def test_metadata_from_document_index(self):
+        html = ('<html><head>'
+                '<meta name="description" content=" A description ">'
+                '<meta property="og:type" content="article">'
+                '<meta property="article:published_time" '
+                'content="2017-03-01T10:00:00">'
+                '</head><body>'
+                '<span class="Byline">By Jane Roe and John Doe</span>'
+                '<a rel="tag" href="/x">Storms</a>'
+                '<a href="/tags/weather">Weather</a>'
+                '</body></html>')
+        doc = self.parser.fromstring(html)
+        self.extractor.index_document(doc)
+        self.assertEqual('A description',
+                         self.extractor.get_meta_description(doc))
+        self.assertEqual('article', self.extractor.get_meta_type(doc))
+        self.assertEqual(['Jane Roe', 'John Doe'],
+                         self.extractor.get_authors(doc))
+        self.assertEqual('2017-03-01 10:00:00', str(
+            self.extractor.get_publishing_date('http://example.com', doc)))
+        self.assertEqual({'Storms'}, self.extractor.extract_tags(doc))
+        self.assertTrue(self.extractor.get_doc_index(doc).built)
+
+        other = self.parser.fromstring(
+            '<div><a href="/topic/rain">Rain</a></div>')
+        self.assertEqual({'Rain'}, self.extractor.extract_tags(other))
+        self.assertEqual('', self.extractor.get_meta_type(other))
+        self.assertFalse(self.extractor.get_doc_index(other).built)
+
+        # queries the index doesn't cover walk the document
+        index = self.extractor.get_doc_index(doc)
+        self.assertEqual(self.parser.getElementsByTag(doc),
+                         index.getElementsByTag())
+        self.assertEqual(['a'], [node.tag for node in index.getElementsByTag(
+            attr='href', value='/tags/')])
+        self.extractor.clear_doc_index()
+
+    def test_document_index_after_changes(self):
+        doc = self.parser.fromstring(
+            '<html><head><title>Old title</title></head>'
+            '<body><a rel="tag" href="/x">Storms</a></body></html>')
+        self.assertEqual('Old title',
+                         self.extractor.get_title('http://example.com', doc))
+        self.assertEqual({'Storms'}, self.extractor.extract_tags(doc))
+        self.parser.getElementsByTag(doc, tag='title')[0].text = 'New title'
+        link = self.parser.getElementsByTag(doc, tag='a')[0]
+        link.getparent().remove(link)
+        self.assertEqual('New title',
+                         self.extractor.get_title('http://example.com', doc))
+        self.assertEqual(set(), self.extractor.extract_tags(doc))
+
+        self.extractor.index_document(doc)
+        self.assertEqual(set(), self.extractor.extract_tags(doc))
+        self.extractor.clear_doc_index()
+        self.parser.appendChild(doc.find('body'), link)
+        self.assertEqual({'Storms'}, self.extractor.extract_tags(doc))
+
+    def test_compiled_selectors(self):
+        doc = self.parser.fromstring(
+            '<div class="Story"><div class="story" id="a\'b">'
+            '<p>One</p></div><span class="teaser">Two</span></div>')
+        self.assertEqual(1, len(self.parser.getElementsByTag(doc, tag='div')))
+        self.assertEqual(2, len(self.parser.getElementsByTag(
+            doc, attr='class', value='STORY')))
+        self.assertEqual(1, len(self.parser.getElementsByTag(
+            doc, tag='div', attr='class', value='story')))
+        self.assertEqual(['teaser'], [e.get('class') for e in
+                                      self.parser.getElementsByTag(
+                                          doc, attr='class', value='^tea',
+                                          use_regex=True)])
+        self.assertEqual('div', self.parser.getElementById(doc, "a'b").tag)
+        self.assertEqual(['p'], [e.tag for e in
+                                 self.parser.css_select(doc, 'div > p')])
+        self.assertEqual(['p'], [e.tag for e in
+                                 self.parser.css_select(doc, 'div > p')])
+
+    def test_node_stats(self):
+        doc = self.parser.fromstring(
+            '<div><p> It was the  best <!-- of --> of times, </p>'
+            '<p><a href="/a">Read</a><a href="/b">more news</a> here</p>'
+            '<p><a href="/c">Only links</a></p></div>')
+        stats = newspaper.extractors.NodeStats(self.extractor, doc)
+        for node in doc.iter('div', 'p', 'a'):
+            text = self.parser.getText(node)
+            self.assertEqual(len(text), stats.text_length(node))
+            self.assertEqual(self.extractor.count_stopwords(text),
+                             stats.stopword_count(node))
+            self.assertEqual(newspaper.nlp.word_count(text),
+                             stats.word_count(node))
+        first, second, third = doc.findall('p')
+        self.assertFalse(stats.is_highlink_density(first))
+        # 'Readmore news' is two link words out of four words, two links
+        self.assertTrue(stats.is_highlink_density(second))
+        self.assertTrue(stats.is_highlink_density(third))
+        self.assertFalse(stats.is_highlink_density(doc))
+
+        added = self.parser.createElement(tag='p', text='all of the')
+        doc.append(added)
+        self.assertEqual(3, stats.stopword_count(added))
+
+    def test_gravity_scores(self):
+        paragraph = ('<p>It was the best of times, it was the worst of '
+                     'times, it was the age of wisdom.</p>')
+        doc = self.parser.fromstring(
+            '<div><div id="body">%s%s</div><div id="caption">'
+            '<p>Photo by the staff of the paper</p></div></div>' %
+            (paragraph, paragraph))
+        top_node = self.extractor.calculate_best_node(doc)
+        self.assertEqual('body', top_node.get('id'))
+        self.assertNotIn('gravity', self.parser.nodeToString(doc))
+        scores = self.extractor.get_gravity_scores()
+        self.assertEqual(scores[top_node], self.extractor.get_score(top_node))
+        self.assertGreater(self.extractor.get_score(top_node), 1)
+        self.assertEqual(0, self.extractor.get_score(doc[0][0]))
+        self.assertEqual(2, self.extractor.gravity_nodes[top_node])
+
+
+class DocumentCleanerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.cleaner = newspaper.cleaners.DocumentCleaner(Configuration())
+        self.parser = newspaper.parsers.Parser
+
+    def _clean(self, html):
+        doc = self.cleaner.clean(self.parser.fromstring(html))
+        return self.parser.nodeToString(doc)
+
+    def test_clean_tags(self):
+        html = self._clean(
+            '<html><body class="comment"><div id="a"><!-- c -->'
+            '<p>One <em>two</em> <span>three</span></p>'
+            '<p><em><img src="x.jpg"></em>'
+            '<span class="dropcap big">F</span>our</p>'
+            '<script>var x;</script><div class="sharetwitter">Tweet</div>'
+            '</div></body></html>')
+        self.assertEqual(
+            '<html><body><div id="a"><p>One two three</p>'
+            '<p><em><img src="x.jpg"></em>Four</p></div></body></html>',
+            html)
+
+    def test_clean_keeps_nodes_with_articles(self):
+        # the class rule runs after the id rule, the name rule after both
+        html = self._clean(
+            '<html><body><div id="comments"><div class="footer" '
+            'itemprop="articleBody"><p>Text</p></div></div></body></html>')
+        self.assertIn('id="comments"', html)
+        self.assertNotIn('Text', html)
+
+        html = self._clean(
+            '<html><body><div name="comments"><div class="footer" '
+            'itemprop="articleBody"><p>Text</p></div></div></body></html>')
+        self.assertNotIn('comments', html)
+
+    def test_div_to_para(self):
+        doc = self.parser.fromstring(
+            '<html><body><div id="a">Hello <a href="x">link</a> world'
+            '<p>para</p>tail <a href="y">more</a></div>'
+            '<div>Only text</div></body></html>')
+        doc = self.cleaner.div_to_para(doc, 'div')
+        self.assertEqual(
+            '<html><body><div id="a"><a></a><span>Hello <a href="x">link'
+            '</a> world</span><p>para</p>tail <a></a><span>tail '
+            '<a href="y">more</a> </span></div><p>Only text</p></body></html>',
+            self.parser.nodeToString(doc))
+
+        # texts are moved as they are, not parsed again as html
+        doc = self.parser.fromstring(
+            '<html><body><div>One &lt;b&gt; two<p>p</p></div></body></html>')
+        doc = self.cleaner.div_to_para(doc, 'div')
+        self.assertEqual(
+            '<html><body><div><span>One &lt;b&gt; two</span><p>p</p></div>'
+            '</body></html>', self.parser.nodeToString(doc))
+
+
+class OutputFormatterTestCase(unittest.TestCase):
+    def setUp(self):
+        self.formatter = newspaper.outputformatters.OutputFormatter(
+            Configuration())
+        self.parser = newspaper.parsers.Parser
+        self.html = (
+            '<div><p>It was the best of times, it was the worst of times.</p>'
+            '<p><span> </span><b>Read more</b></p>'
+            '<div><p><object></object></p></div>'
+            '<p>(Photo by the staff of the agency)</p>'
+            '<div><p>Short</p>a note of the kind that is all</div>'
+            '<div class="twitter-tweet">It was all of the tweets there are</div>'
+            '<figure><figcaption>A picture of the best of times</figcaption>'
+            '<object data="x.swf"></object></figure>'
+            '<div><p>All of the related stories</p></div></div>')
+
+    def test_formatters_in_one_pass(self):
+        top_node = self.parser.fromstring(self.html)
+        text, html = self.formatter.get_formatted(top_node)
+        self.assertEqual('It was the best of times, it was the worst of '
+                         'times.\n\na note of the kind that is all', text)
+        self.assertEqual(
+            '<div><p>It was the best of times, it was the worst of times.</p>'
+            '<div> a note of the kind that is all</div><figure></figure>'
+            '</div>', self.parser.nodeToString(top_node))
+
+    def test_excluded_formatters(self):
+        self.formatter.excluded_formatters = ['remove_fewwords_paragraphs']
+        top_node = self.parser.fromstring(self.html)
+        text, html = self.formatter.get_formatted(top_node)
+        self.assertEqual('It was the best of times, it was the worst of '
+                         'times.\n\nRead more\n\n(Photo by the staff of the '
+                         'agency)\n\nShort a note of the kind that is all',
+                         text)
+
 
 class SourceTestCase(unittest.TestCase):
     @print_test
@@ -578,6 +948,798 @@ class MThreadingTestCase(unittest.TestCase):
               len(tc_paper.articles[1].html))
 
 
+
+class PolitenessTestCase(unittest.TestCase):
+    @print_test
+    def test_token_bucket_rate(self):
+        from newspaper.mthreading import HostLimiter
+
+        limiter = HostLimiter(rate=50, burst=1)
+        ts = time.time()
+        for _ in range(6):
+            limiter.acquire('example.com')
+            limiter.release('example.com')
+        self.assertGreaterEqual(time.time() - ts, 0.09)
+
+    @print_test
+    def test_scheduler_interleaves_hosts(self):
+        from newspaper.mthreading import HostLimiter, HostScheduler
+
+        events = []
+
+        def task(name, seconds):
+            events.append(('start', name))
+            time.sleep(seconds)
+            events.append(('end', name))
+
+        scheduler = HostScheduler(2, HostLimiter(per_host=1))
+        for i in range(3):
+            scheduler.add_task('http://slow.com/%d' % i, task, 'slow%d' % i,
+                               0.2)
+        for i in range(3):
+            scheduler.add_task('http://fast.com/%d' % i, task, 'fast%d' % i,
+                               0.01)
+        scheduler.wait_completion()
+
+        # a single slow host never holds both workers
+        self.assertLess(events.index(('end', 'fast2')),
+                        events.index(('start', 'slow1')))
+        self.assertEqual(12, len(events))
+
+    @print_test
+    def test_set_downloads_every_article(self):
+        from newspaper.mthreading import NewsPool
+
+        routes = dict(('/%d' % i, (200, {'Content-Type': 'text/html'},
+                                   ('<html>article %d</html>' % i).encode()))
+                      for i in range(6))
+        config = Configuration()
+        config.memoize_articles = False
+        with LocalServer(routes) as server:
+            sources = []
+            for paths in (['/0', '/1', '/2', '/missing'], ['/3', '/4', '/5']):
+                source = Source(server.url, config=config)
+                source.articles = [Article(server.url + path, config=config)
+                                   for path in paths]
+                sources.append(source)
+
+            pool = NewsPool(config)
+            pool.set(sources[0])
+            pool.join()
+            self.assertTrue(sources[0].is_downloaded)
+            self.assertEqual(
+                ['<html>article %d</html>' % i for i in range(3)],
+                [article.html for article in sources[0].articles])
+
+            pool.set(sources, threads_per_source=2)
+            pool.join()
+            self.assertEqual(
+                ['<html>article %d</html>' % i for i in range(6)],
+                [article.html for source in sources
+                 for article in source.articles])
+            self.assertEqual(9, len([path for path, _ in server.requests
+                                     if path != '/missing']))
+
+    @print_test
+    def test_failed_article_downloads_are_dropped(self):
+        from newspaper.mthreading import NewsPool
+
+        routes = {'/ok': (200, {'Content-Type': 'text/html'},
+                          b'<html>ok</html>'),
+                  '/missing': (404, {'Content-Type': 'text/html'},
+                               b'<html>gone</html>')}
+        with LocalServer(routes) as server:
+            for parse_bytes in (False, True):
+                config = Configuration()
+                config.memoize_articles = False
+                config.parse_bytes = parse_bytes
+                for threaded in (False, True):
+                    source = Source(server.url, config=config)
+                    source.articles = [
+                        Article(server.url + path, config=config)
+                        for path in ('/ok', '/missing')]
+                    if threaded:
+                        pool = NewsPool(config)
+                        pool.set([source])
+                        pool.join()
+                    else:
+                        source.download_articles()
+                    self.assertEqual([server.url + '/ok'],
+                                     [a.url for a in source.articles])
+                    self.assertIn('ok', source.articles[0].html)
+
+
+class NetworkTestCase(unittest.TestCase):
+    @print_test
+    def test_session_is_shared_per_pool_settings(self):
+        from newspaper import network
+
+        config = Configuration()
+        self.assertIs(network.get_session(config),
+                      network.get_session(Configuration()))
+        config.pool_maxsize = 3
+        self.assertIsNot(network.get_session(config),
+                         network.get_session(Configuration()))
+
+    @print_test
+    def test_connections_are_reused(self):
+        from newspaper import network
+
+        html = b'<html><body><p>pooled</p></body></html>'
+        routes = {'/a': (200, {'Content-Type': 'text/html; charset=utf-8'},
+                         html),
+                  '/b': (200, {'Content-Type': 'text/html; charset=utf-8'},
+                         html)}
+        network.close_sessions()
+        with LocalServer(routes) as server:
+            self.assertIn('pooled', network.get_html(server.url + '/a'))
+            self.assertIn('pooled', network.get_html(server.url + '/b'))
+            reqs = network.multithread_request([server.url + '/a'])
+            self.assertEqual(200, reqs[0].resp.status_code)
+        self.assertEqual(1, server.connections)
+
+    @print_test
+    def test_download_is_byte_capped(self):
+        from newspaper import network
+
+        config = Configuration()
+        config.size_limit = 4096
+        unbounded = {'Content-Type': 'text/html', 'Connection': 'close'}
+        routes = {'/big': (200, unbounded, b'<html>' + b'a' * 100000),
+                  '/pdf': (200, unbounded, b'%PDF-1.4' + b'a' * 1000),
+                  '/ok': (200, unbounded, b'<html>' + b'a' * 1000)}
+        with LocalServer(routes) as server:
+            self.assertEqual('', network.get_html(server.url + '/big', config))
+            self.assertEqual('', network.get_html(server.url + '/pdf', config))
+            self.assertEqual(1006, len(network.get_html(
+                server.url + '/ok', config)))
+            reqs = network.multithread_request(
+                [server.url + '/big', server.url + '/ok'], config)
+            self.assertIsNone(reqs[0].resp)
+            self.assertEqual(1006, len(reqs[1].resp.content))
+
+    @print_test
+    def test_async_download(self):
+        import asyncio
+        from newspaper import network
+
+        html = b'<html><body><p>async</p></body></html>'
+        routes = {'/a': (200, {'Content-Type': 'text/html; charset=utf-8'},
+                         html),
+                  '/missing': (404, {}, b'')}
+        with LocalServer(routes) as server:
+            urls = [server.url + '/a', server.url + '/missing']
+            reqs = asyncio.run(network.async_request(urls))
+            self.assertEqual([server.url + '/a', server.url + '/missing'],
+                             [req.url for req in reqs])
+            self.assertEqual(200, reqs[0].resp.status_code)
+            self.assertIn('async', network.get_html(
+                reqs[0].url, response=reqs[0].resp))
+            self.assertEqual(404, reqs[1].resp.status_code)
+
+            article = Article(server.url + '/a')
+            asyncio.run(article.adownload())
+            self.assertIn('async', article.html)
+
+    @print_test
+    def test_http_cache_revalidates(self):
+        import asyncio
+        import tempfile
+        from newspaper import network, warc
+
+        html = b'<html><body><p>cached</p></body></html>'
+
+        def etagged(handler):
+            if handler.headers.get('If-None-Match') == '"v1"':
+                return 304, {'ETag': '"v1"'}, b''
+            return 200, {'Content-Type': 'text/html; charset=utf-8',
+                         'ETag': '"v1"'}, html
+
+        config = Configuration()
+        config.http_cache = True
+        with tempfile.TemporaryDirectory() as directory, \
+                tempfile.TemporaryDirectory() as warc_directory, \
+                LocalServer({'/a': etagged}) as server:
+            config.http_cache_directory = directory
+            config.warc_file = os.path.join(warc_directory, 'crawl.warc')
+            url = server.url + '/a'
+            self.assertIn('cached', network.get_html(url, config))
+            self.assertIn('cached', network.get_html(url, config))
+            reqs = network.multithread_request([url], config)
+            self.assertEqual(200, reqs[0].resp.status_code)
+            self.assertTrue(reqs[0].resp.from_cache)
+            self.assertIn('cached', reqs[0].resp.text)
+            self.assertIn('cached', asyncio.run(
+                network.aget_html(url, config)))
+            self.assertEqual(
+                [None, '"v1"', '"v1"', '"v1"'],
+                [headers.get('If-None-Match')
+                 for _, headers in server.requests])
+
+            # revalidated pages are archived with their cached body
+            warc.close_warc_writers()
+            responses = [record.http_response() for record in
+                         warc.iter_records(config.warc_file)
+                         if record.type == 'response']
+            self.assertEqual([200] * 4,
+                             [r.status_code for r in responses])
+            self.assertTrue(all(b'cached' in r.content for r in responses))
+
+            cache = network.get_http_cache(config)
+            cache.max_size = cache.size + 64
+            cache.store(server.url + '/b', reqs[0].resp)
+            self.assertIsNone(cache.get(url))
+            self.assertIsNotNone(cache.get(server.url + '/b'))
+
+
+    @print_test
+    def test_image_dimension_revalidated(self):
+        import io
+        import tempfile
+        from PIL import Image
+        from newspaper import images
+
+        png = io.BytesIO()
+        Image.new('RGB', (40, 30)).save(png, 'PNG')
+        bodies = {'/full.png': png.getvalue(),
+                  '/truncated.png': png.getvalue()[:12]}
+
+        def etagged(handler):
+            if handler.headers.get('If-None-Match') == '"v1"':
+                return 304, {'ETag': '"v1"'}, b''
+            return 200, {'Content-Type': 'image/png', 'ETag': '"v1"'}, \
+                bodies[handler.path]
+
+        config = Configuration()
+        config.http_cache = True
+        with tempfile.TemporaryDirectory() as directory, \
+                LocalServer(dict((path, etagged) for path in bodies)) \
+                as server:
+            config.http_cache_directory = directory
+            for path, size in (('/full.png', (40, 30)),
+                               ('/truncated.png', (None, None))):
+                url = server.url + path
+                images.fetch_url(url, 'agent', config=config)
+                self.assertEqual(size, images.fetch_image_dimension(
+                    url, 'agent', config=config))
+                self.assertEqual('"v1"', server.requests[-1][1].get(
+                    'If-None-Match'))
+    @print_test
+    def test_bytes_pipeline(self):
+        import asyncio
+
+        body = '<html><head><title>Заголовок статьи</title></head>' \
+            '<body><p>Текст</p></body></html>'
+        declared = body.replace('<head>', '<head><meta charset="cp1251">')
+        routes = {'/meta': (200, {'Content-Type': 'text/html'},
+                            declared.encode('cp1251')),
+                  '/header': (200, {'Content-Type': 'text/html; charset=koi8-r'},
+                              body.encode('koi8-r'))}
+        config = Configuration()
+        config.parse_bytes = True
+        config.fetch_images = False
+        with LocalServer(routes) as server:
+            for path, charset in (('/meta', None), ('/header', 'koi8-r')):
+                article = Article(server.url + path, config=config)
+                article.download()
+                self.assertIsInstance(article.raw_html, bytes)
+                self.assertEqual(charset, article.html_encoding)
+                self.assertIsNone(article._html)
+                article.parse()
+                self.assertEqual('Заголовок статьи', article.title)
+                self.assertIsNone(article._html)
+                self.assertIn('Текст', article.html)
+
+            article = Article(server.url + '/header', config=config)
+            asyncio.run(article.adownload())
+            self.assertEqual(body.encode('koi8-r'), article.raw_html)
+
+    @print_test
+    def test_bytes_pipeline_latin1_header(self):
+        # servers label pages in any charset ISO-8859-1, the meta charset
+        # is trusted instead in both modes
+        body = '<html><head><meta charset="utf-8"><title>Café</title>' \
+            '</head><body><p>Crème brûlée</p></body></html>'
+        routes = {'/a': (200, {'Content-Type': 'text/html; charset=ISO-8859-1'},
+                         body.encode('utf-8'))}
+        with LocalServer(routes) as server:
+            parsed = []
+            for parse_bytes in (False, True):
+                config = Configuration()
+                config.parse_bytes = parse_bytes
+                config.fetch_images = False
+                article = Article(server.url + '/a', config=config)
+                article.download()
+                article.parse()
+                parsed.append((article.title, article.html))
+        self.assertEqual(parsed[0], parsed[1])
+        self.assertEqual('Café', parsed[0][0])
+        self.assertIn('Crème brûlée', parsed[0][1])
+
+    @print_test
+    def test_compressed_downloads(self):
+        import asyncio
+        import gzip
+        from newspaper import images, network
+
+        html = b'<html><body>' + b'<p>compressed</p>' * 1000 + b'</body></html>'
+        bomb = b'<html><body>' + b' ' * 8 * 1024 * 1024
+        headers = {'Content-Type': 'text/html; charset=utf-8',
+                   'Content-Encoding': 'gzip'}
+        routes = {'/page': (200, headers, gzip.compress(html)),
+                  '/bomb': (200, headers, gzip.compress(bomb)),
+                  '/image.png': (200, {'Content-Type': 'image/png',
+                                       'Content-Encoding': 'gzip'},
+                                 gzip.compress(bomb))}
+        config = Configuration()
+        with LocalServer(routes) as server:
+            response = network._request(server.url + '/page', config)
+            self.assertEqual(html, response.content)
+            self.assertEqual(len(gzip.compress(html)), response.compressed_size)
+            self.assertEqual(len(html), response.decompressed_size)
+            self.assertIn('gzip', server.requests[-1][1]['Accept-Encoding'])
+
+            self.assertIsNone(network._request(server.url + '/bomb', config))
+            self.assertEqual('', network.get_html(server.url + '/bomb', config))
+            self.assertEqual((None, None), images.fetch_url(
+                server.url + '/image.png', 'agent', config=config))
+
+            async def aget(url):
+                async with network.AsyncClient(config) as client:
+                    return await client.get(url)
+            response = asyncio.run(aget(server.url + '/page'))
+            self.assertEqual(html, response.content)
+            self.assertEqual(len(html), response.decompressed_size)
+            self.assertIsNone(asyncio.run(aget(server.url + '/bomb')))
+
+    @print_test
+    def test_bounded_decoders(self):
+        import gzip
+        import zlib
+        from newspaper import network
+
+        bomb = b' ' * 8 * 1024 * 1024
+        encoded = {'gzip': gzip.compress(bomb[:1024]) + gzip.compress(bomb),
+                   'deflate': zlib.compress(bomb)}
+        if network.brotli is not None:
+            encoded['br'] = network.brotli.compress(bomb)
+        if network.zstandard is not None:
+            encoded['zstd'] = network.zstandard.ZstdCompressor().compress(bomb)
+        for encoding, body in encoded.items():
+            self.assertIn(encoding, network.ACCEPT_ENCODING)
+            chunks = list(network.DECODERS[encoding](
+                [body], network.CHUNK_SIZE, encoding))
+            self.assertLessEqual(max(map(len, chunks)), 2 * network.CHUNK_SIZE)
+            self.assertEqual(len(bomb) + (1024 if encoding == 'gzip' else 0),
+                             sum(map(len, chunks)))
+        # deflate sent without its zlib header
+        chunks = network.decode_zlib([zlib.compress(bomb)[2:-4]],
+                                     network.CHUNK_SIZE, 'deflate')
+        self.assertEqual(bomb, b''.join(chunks))
+
+        routes = {}
+        for encoding, body in encoded.items():
+            routes['/' + encoding] = (200, {'Content-Type': 'text/html',
+                                            'Content-Encoding': encoding}, body)
+        config = Configuration()
+        with LocalServer(routes) as server:
+            for encoding in encoded:
+                self.assertIsNone(
+                    network._request(server.url + '/' + encoding, config))
+
+    @print_test
+    def test_warc_archive(self):
+        import asyncio
+        import gzip
+        import tempfile
+        from newspaper import network, warc
+
+        body = '<html><head><title>Заголовок статьи</title></head>' \
+            '<body><p>Текст</p></body></html>'
+        routes = {'/ru': (200, {'Content-Type': 'text/html; charset=koi8-r',
+                                'Content-Encoding': 'gzip'},
+                          gzip.compress(body.encode('koi8-r'))),
+                  '/missing': (404, {'Content-Type': 'text/html'}, b'gone')}
+        with tempfile.TemporaryDirectory() as directory, \
+                LocalServer(routes) as server:
+            for name in ('crawl.warc.gz', 'crawl.warc'):
+                config = Configuration()
+                config.warc_file = os.path.join(directory, name)
+                config.fetch_images = False
+                Article(server.url + '/ru', config=config).download()
+                network._request(server.url + '/missing', config)
+                asyncio.run(Article(server.url + '/ru',
+                                    config=config).adownload())
+                warc.close_warc_writers()
+
+                records = list(warc.iter_records(config.warc_file))
+                self.assertEqual(['warcinfo'] + ['response', 'request'] * 3,
+                                 [record.type for record in records])
+                self.assertEqual(records[1].headers['WARC-Record-ID'],
+                                 records[2].headers['WARC-Concurrent-To'])
+                self.assertTrue(records[2].content.startswith(b'GET /ru '))
+
+                articles = list(newspaper.read_warc(config.warc_file))
+                self.assertEqual([server.url + '/ru'] * 2,
+                                 [article.url for article in articles])
+                articles[0].parse()
+                self.assertEqual('Заголовок статьи', articles[0].title)
+            self.assertEqual(6, len(list(newspaper.read_warc(
+                directory, http_success_only=False))))
+
+        record = warc.WARCRecord({}, b'HTTP/1.1 200 OK\r\n'
+                                 b'Transfer-Encoding: chunked\r\n'
+                                 b'Content-Encoding: gzip\r\n\r\n' +
+                                 b'%x\r\n' % len(gzip.compress(b'<p>x</p>')) +
+                                 gzip.compress(b'<p>x</p>') + b'\r\n0\r\n\r\n')
+        self.assertEqual(b'<p>x</p>', record.http_response().content)
+
+
+    @print_test
+    def test_warc_round_trip_charset(self):
+        import tempfile
+        from newspaper import warc
+
+        body = '<html><head><meta charset="utf-8"><title>Café</title>' \
+            '</head><body><p>' + 'Crème brûlée au café. ' * 40 + \
+            '</p></body></html>'
+        routes = {'/a': (200, {'Content-Type': 'text/html; charset=ISO-8859-1'},
+                         body.encode('utf-8'))}
+        with tempfile.TemporaryDirectory() as directory, \
+                LocalServer(routes) as server:
+            for parse_bytes in (False, True):
+                config = Configuration()
+                config.parse_bytes = parse_bytes
+                config.fetch_images = False
+                config.warc_file = os.path.join(
+                    directory, 'crawl%d.warc' % parse_bytes)
+                live = Article(server.url + '/a', config=config)
+                live.download()
+                live.parse()
+                warc.close_warc_writers()
+
+                archived, = newspaper.read_warc(config.warc_file,
+                                                parse_bytes=parse_bytes)
+                archived.parse()
+                self.assertEqual('Café', archived.title)
+                self.assertIn('Crème brûlée', archived.text)
+                self.assertEqual((live.title, live.text),
+                                 (archived.title, archived.text))
+    @print_test
+    def test_dns_cache_and_prewarm(self):
+        from newspaper import network
+
+        config = Configuration()
+        config.dns_cache_ttl = 120
+        html = b'<html><body><p>resolved</p></body></html>'
+        routes = {'/a': (200, {'Content-Type': 'text/html; charset=utf-8'},
+                         html)}
+        with LocalServer(routes) as server:
+            port = server.httpd.server_port
+            url = 'http://localhost:%d/a' % port
+            network.prewarm([url, url], config)
+            self.assertEqual(1, server.wait_for_connections(1))
+            self.assertEqual([], server.requests)
+            self.assertIn(('localhost', port),
+                          network.get_dns_cache(config).records)
+
+            self.assertIn('resolved', network.get_html(url, config))
+            self.assertEqual(1, server.connections)
+
+    @print_test
+    def test_retries_and_circuit_breaker(self):
+        from newspaper import network
+
+        html = b'<html><body><p>retried</p></body></html>'
+        attempts = []
+
+        def flaky(handler):
+            attempts.append(handler.path)
+            if len(attempts) < 3:
+                return 503, {'Retry-After': '0'}, b''
+            return 200, {'Content-Type': 'text/html; charset=utf-8'}, html
+
+        config = Configuration()
+        self.assertEqual(0, config.max_retries)
+        self.assertIsNone(config.circuit_breaker_threshold)
+        config.max_retries = 2
+        config.retry_backoff = 0.01
+        config.number_threads = 1
+        routes = {'/flaky': flaky,
+                  '/down': (500, {}, b''),
+                  '/busy': (429, {'Retry-After': '3600'}, b'')}
+        with LocalServer(routes) as server:
+            self.assertIn('retried', network.get_html(
+                server.url + '/flaky', config))
+            self.assertEqual(3, len(attempts))
+
+            config.max_retries = 0
+            config.circuit_breaker_threshold = 2
+            reqs = network.multithread_request(
+                [server.url + '/down'] * 4, config)
+            self.assertEqual([500, 500, None, None],
+                             [getattr(req.resp, 'status_code', None)
+                              for req in reqs])
+            self.assertEqual(2, len([path for path, _ in server.requests
+                                     if path == '/down']))
+
+            config.max_retries = 1
+            config.circuit_breaker_threshold = 3
+            reqs = network.multithread_request(
+                [server.url + '/busy'] * 2, config)
+            self.assertEqual(1, len([path for path, _ in server.requests
+                                     if path == '/busy']))
+
+    @print_test
+    def test_retries_release_the_host_slot(self):
+        from newspaper import network
+
+        attempts = []
+
+        def flaky(handler):
+            attempts.append(handler.path)
+            if len(attempts) < 2:
+                return 503, {'Retry-After': '0.5'}, b''
+            return 200, {'Content-Type': 'text/html'}, b'flaky'
+
+        config = Configuration()
+        config.max_retries = 1
+        config.number_threads = 2
+        config.max_connections_per_host = 1
+        routes = {'/flaky': flaky,
+                  '/ok': (200, {'Content-Type': 'text/html'}, b'ok')}
+        with LocalServer(routes) as server:
+            reqs = network.multithread_request(
+                [server.url + '/flaky', server.url + '/ok'], config)
+            self.assertEqual([b'flaky', b'ok'],
+                             [req.resp.content for req in reqs])
+            # /ok went out while /flaky waited for its retry
+            self.assertEqual(['/flaky', '/ok', '/flaky'],
+                             [path for path, _ in server.requests])
+
+    @print_test
+    def test_async_retries_and_politeness(self):
+        import asyncio
+        from newspaper import network
+
+        html = b'<html><body><p>retried</p></body></html>'
+        attempts = []
+        active = []
+
+        def flaky(handler):
+            attempts.append(handler.path)
+            if len(attempts) < 3:
+                return 503, {'Retry-After': '0'}, b''
+            return 200, {'Content-Type': 'text/html; charset=utf-8'}, html
+
+        def slow(handler):
+            active.append(handler.path)
+            time.sleep(0.05)
+            peak = len(active)
+            active.remove(handler.path)
+            return 200, {'Content-Type': 'text/html; charset=utf-8'}, \
+                str(peak).encode()
+
+        config = Configuration()
+        config.max_retries = 2
+        config.retry_backoff = 0.01
+        routes = {'/flaky': flaky, '/slow': slow, '/down': (500, {}, b'')}
+        with LocalServer(routes) as server:
+            self.assertIn('retried', asyncio.run(network.aget_html(
+                server.url + '/flaky', config)))
+            self.assertEqual(3, len(attempts))
+
+            config.max_retries = 0
+            # a breaker of its own, the others may hold this host open
+            config.circuit_breaker_threshold = 2
+            config.circuit_breaker_reset = 30
+            for _ in range(2):
+                reqs = asyncio.run(network.async_request(
+                    [server.url + '/down'] * 2, config))
+            self.assertEqual([None, None], [req.resp for req in reqs])
+            self.assertEqual(2, len([path for path, _ in server.requests
+                                     if path == '/down']))
+
+            config.circuit_breaker_threshold = None
+            config.max_connections_per_host = 1
+            reqs = asyncio.run(network.async_request(
+                [server.url + '/slow'] * 4, config))
+            self.assertEqual([b'1'] * 4, [req.resp.content for req in reqs])
+
+
+
+
+class RenderersTestCase(unittest.TestCase):
+    class FakeDriver(object):
+        def __init__(self):
+            self.alive = True
+            self.quitted = False
+
+        def set_page_load_timeout(self, timeout):
+            self.timeout = timeout
+
+        @property
+        def current_url(self):
+            if not self.alive:
+                raise RuntimeError('browser crashed')
+            return 'about:blank'
+
+        def get(self, url):
+            self.url = url
+
+        @property
+        def page_source(self):
+            return '<html>%s</html>' % self.url
+
+        def quit(self):
+            self.quitted = True
+
+    @print_test
+    def test_browsers_are_reused_and_recycled(self):
+        from newspaper.renderers import BrowserPool
+
+        drivers = []
+
+        def factory():
+            drivers.append(self.FakeDriver())
+            return drivers[-1]
+
+        pool = BrowserPool(factory, size=1, max_pages=2, page_load_timeout=5)
+        self.assertEqual('<html>a</html>', pool.render('a'))
+        self.assertEqual('<html>b</html>', pool.render('b'))
+        self.assertEqual(1, len(drivers))
+        self.assertTrue(drivers[0].quitted)
+        self.assertEqual(5, drivers[0].timeout)
+
+        pool.render('c')
+        drivers[1].alive = False
+        pool.render('d')
+        self.assertEqual(3, len(drivers))
+        self.assertTrue(drivers[1].quitted)
+
+        with self.assertRaises(ValueError):
+            with pool.lease():
+                raise ValueError
+        self.assertTrue(drivers[2].quitted)
+        pool.close()
+
+    @print_test
+    def test_leases_are_bounded(self):
+        from newspaper.renderers import BrowserPool
+
+        pool = BrowserPool(self.FakeDriver, size=2)
+        leased = []
+        peak = []
+        lock = threading.Lock()
+
+        def render(url):
+            with pool.lease() as driver:
+                with lock:
+                    leased.append(driver)
+                    peak.append(len(leased))
+                time.sleep(0.01)
+                with lock:
+                    leased.remove(driver)
+
+        threads = [threading.Thread(target=render, args=(str(i),))
+                   for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(2, max(peak))
+        self.assertEqual(2, len(pool.idle))
+        pool.close()
+
+
+    @print_test
+    def test_casper_workers_are_restarted(self):
+        from newspaper.renderers import CasperPool, RenderError
+
+        # speaks the protocol of casperjs/render_worker.js
+        worker = (
+            'import json, sys, time\n'
+            'for url in sys.stdin:\n'
+            '    url = url.strip()\n'
+            '    if url == "crash":\n'
+            '        sys.exit(1)\n'
+            '    if url == "slow":\n'
+            '        time.sleep(5)\n'
+            '    print("warning: not json")\n'
+            '    print(json.dumps({"status": 200, "html": url}), flush=True)\n')
+        pool = CasperPool([sys.executable, '-c', worker], size=1)
+        self.assertEqual((200, 'a'), pool.render('a', 5))
+        first = pool.idle[0]
+        self.assertEqual((200, 'b'), pool.render('b', 5))
+        self.assertIs(first, pool.idle[0])
+
+        self.assertRaises(RenderError, pool.render, 'slow', 0.2)
+        self.assertFalse(first.is_alive())
+        self.assertRaises(RenderError, pool.render, 'crash', 5)
+        self.assertEqual((200, 'c'), pool.render('c', 5))
+        self.assertIsNot(first, pool.idle[0])
+        pool.close()
+
+
+    @print_test
+    def test_splash_client(self):
+        from urllib.parse import parse_qs, urlsplit
+        from newspaper import network
+        from newspaper.renderers import SplashClient
+
+        rendering = []
+        peak = []
+        lock = threading.Lock()
+
+        def render(handler):
+            url = parse_qs(urlsplit(handler.path).query)['url'][0]
+            with lock:
+                rendering.append(url)
+                peak.append(len(rendering))
+            time.sleep(0.02)
+            with lock:
+                rendering.remove(url)
+            if url.endswith('/slow'):
+                return 504, {}, b''
+            return 200, {'Content-Type': 'text/html; charset=utf-8'}, \
+                ('<html>rendered %s</html>' % url).encode('utf-8')
+
+        html = {'Content-Type': 'text/html; charset=utf-8'}
+        routes = {'/render.html': render,
+                  '/slow': (200, html, b'<html>plain</html>')}
+        with LocalServer(routes) as server:
+            client = SplashClient(server.url, slots=2)
+            results = client.render_many(
+                [str(i) for i in range(6)] + [server.url + '/slow'])
+            self.assertEqual((200, b'<html>rendered 0</html>'), results[0])
+            self.assertEqual(6, len([r for r in results
+                                     if isinstance(r, tuple)]))
+            self.assertEqual(2, max(peak))
+
+            config = Configuration()
+            config.content_strategy = {'name': 'splash',
+                                       'kwargs': {'host': server.url}}
+            self.assertEqual(b'<html>rendered a</html>',
+                             network.get_html('a', config))
+            self.assertEqual('<html>plain</html>',
+                             network.get_html(server.url + '/slow', config))
+            client.close()
+
+    @print_test
+    def test_render_article_requests_only(self):
+        from urllib.parse import parse_qs, urlsplit
+        from newspaper import network
+
+        def render(handler):
+            url = parse_qs(urlsplit(handler.path).query)['url'][0]
+            if url.endswith('/missing'):
+                return 404, {}, b'<html>not found</html>'
+            return 200, {'Content-Type': 'text/html; charset=utf-8'}, \
+                ('<html>rendered %s</html>' % url).encode('utf-8')
+
+        routes = {'/render.html': render,
+                  '/rss': (200, {'Content-Type': 'application/rss+xml'},
+                           b'<rss></rss>'),
+                  '/story': (200, {'Content-Type': 'text/html'},
+                             b'<html>plain</html>')}
+        with LocalServer(routes) as server:
+            config = Configuration()
+            config.content_strategy = {'name': 'splash',
+                                       'kwargs': {'host': server.url}}
+            # feeds and categories are downloaded as they are
+            reqs = network.multithread_request([server.url + '/rss'], config)
+            self.assertEqual(b'<rss></rss>', reqs[0].resp.content)
+
+            urls = [server.url + '/story', server.url + '/missing']
+            reqs = network.multithread_request(urls, config, render=True)
+            self.assertEqual(
+                ('<html>rendered %s/story</html>' % server.url).encode(),
+                reqs[0].resp.content)
+            # the status of the render is kept, not made a success
+            self.assertEqual(404, reqs[1].resp.status_code)
+            self.assertFalse(reqs[1].resp.ok)
+
+
 class ConfigBuildTestCase(unittest.TestCase):
     """Test if our **kwargs to config building setup actually works.
     NOTE: No need to mock responses as we are just initializing the
@@ -619,6 +1781,124 @@ class ConfigBuildTestCase(unittest.TestCase):
         self.assertFalse(s.config.use_meta_language)
 
 
+
+class CharsetsTestCase(unittest.TestCase):
+    @print_test
+    def test_decode_html(self):
+        from newspaper.charsets import decode_html
+
+        russian = '<html><body><p>Текст статьи о погоде</p></body></html>'
+        declared = '<html><head><meta charset="windows-1251"></head>' \
+            '<body>Привет</body></html>'
+        cases = [
+            (russian.encode('utf-16'), None, 'utf-16'),
+            (russian.encode('koi8-r'), 'KOI8-R', 'koi8-r'),
+            (declared.encode('cp1251'), None, 'cp1251'),
+            (russian.encode('utf-8'), None, 'utf-8'),
+        ]
+        for html, http_charset, encoding in cases:
+            markup, used = decode_html(html, http_charset)
+            self.assertEqual(encoding, used)
+            self.assertIn('<html>', markup)
+        self.assertEqual(
+            declared, decode_html(declared.encode('cp1251'))[0])
+
+        # declared latin-1 is read as its windows-1252 superset
+        latin = '<meta charset="iso-8859-1"><p>caf\xe9 \u201cquoted\u201d'
+        self.assertEqual(latin, decode_html(latin.encode('cp1252'))[0])
+
+        parser = Configuration().get_parser()
+        self.assertIn('Привет', parser.get_unicode_html(
+            declared.encode('cp1251')))
+
+
+class LanguageDetectionTestCase(unittest.TestCase):
+    @print_test
+    def test_script_language(self):
+        from newspaper.langdetection import get_script_language
+
+        cases = [
+            ('ko', '대통령은 국가 경제가 제재를 견뎌냈으며 정부는 올해도 '
+                   '중소기업 지원을 계속할 것이라고 말했다.'),
+            ('ja', '大統領は、国の経済は制裁に耐えたと述べ、政府は今年も'
+                   '中小企業への支援を続けると語った。'),
+            ('zh', '总统表示，国家经济经受住了制裁，政府今年将继续支持小企业'
+                   '的发展，并推动更多改革措施落地实施。'),
+            ('ru', 'Президент заявил, что экономика страны выдержала '
+                   'санкции, и правительство продолжит поддерживать бизнес.'),
+            ('uk', 'Президент заявив, що економіка країни витримала '
+                   'санкції, і уряд продовжить підтримувати бізнес.'),
+            ('fa', 'رئیس جمهور گفت که اقتصاد کشور در برابر تحریم‌ها مقاومت '
+                   'کرده و دولت به حمایت ادامه خواهد داد.'),
+            ('ar', 'قال الرئيس إن اقتصاد البلاد صمد أمام العقوبات وإن '
+                   'الحكومة ستواصل دعم الشركات الصغيرة.'),
+            # several languages are written in latin and devanagari
+            (None, 'The president said the economy withstood the '
+                   'sanctions and small businesses will get support.'),
+            (None, 'राष्ट्रपति ने कहा कि देश की अर्थव्यवस्था ने प्रतिबंधों '
+                   'का सामना किया है और सरकार समर्थन जारी रखेगी।'),
+            (None, 'Текст'),
+        ]
+        for language, text in cases:
+            self.assertEqual(language, get_script_language(text))
+
+    @print_test
+    def test_detect_language(self):
+        from newspaper import langdetection
+
+        class Detector(langdetection.LanguageDetector):
+            def __init__(self):
+                self.texts = []
+
+            def detect(self, text):
+                self.texts.append(text)
+                return 'en'
+
+        detector = Detector()
+        config = Configuration()
+        self.assertIsNone(config.language_cache_size)
+        config.language_detector = detector
+        config.language_cache_size = 10
+        parser = config.get_parser()
+        body = parser.fromstring(
+            '<html><body><script>var lang = "fr";</script>'
+            '<p>All of the <b>words</b> of this page are in english and '
+            'there is no doubt about it.</p><!-- commentaire --></body>'
+            '</html>').find('body')
+        sample = langdetection.get_node_sample(body)
+        self.assertEqual('All of the words of this page are in english '
+                         'and there is no doubt about it.', sample)
+        # past `size` the longest runs of text are kept
+        self.assertEqual(
+            'of this pa', langdetection.get_node_sample(body, size=10))
+
+        domain = 'cache.example.com'
+        self.assertEqual('en', langdetection.detect_language(
+            sample, config, 'en', domain))
+        self.assertEqual([sample], detector.texts)
+        # confirmed once for the domain and the language it declares
+        self.assertEqual('en', langdetection.detect_language(
+            sample, config, 'en', domain))
+        self.assertEqual('en', langdetection.detect_language(
+            sample, config, 'fr', domain))
+        self.assertEqual(2, len(detector.texts))
+
+        config.language_cache_size = None
+        config.trust_meta_language = True
+        self.assertEqual('en', langdetection.detect_language(
+            sample, config, 'en', domain))
+        self.assertEqual(2, len(detector.texts))
+        # its stopwords are not found, the detector decides
+        self.assertEqual('en', langdetection.detect_language(
+            sample, config, 'es', domain))
+        self.assertEqual(3, len(detector.texts))
+        # the script decides before the meta language
+        self.assertEqual('ru', langdetection.detect_language(
+            'Президент заявил, что экономика страны выдержала санкции.',
+            config, 'en', domain))
+        self.assertEqual(3, len(detector.texts))
+
+
 class MultiLanguageTestCase(unittest.TestCase):
     @print_test
     def test_chinese_fulltext_extract(self):